@@ -1,5 +1,6 @@
 // pages/api/favoritesApi.js
 import { MongoClient } from 'mongodb';
+import { attachPlaylistTitles } from '../lib/playlists.js';
 
 const uri = process.env.DB;
 const client = new MongoClient(uri);
@@ -27,6 +28,7 @@ export default async function handler(req, res) {
     const videos = await collection
       .find({ _id: { $in: videoIds } })
       .toArray();
+    await attachPlaylistTitles(db, videos);
 
     // クライアントが渡した順番を保つ
     const ordered = videoIds
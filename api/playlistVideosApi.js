@@ -1,5 +1,6 @@
 // pages/api/playlistVideosApi.js
 import { MongoClient } from 'mongodb';
+import { attachPlaylistTitles, playlistFilter } from '../lib/playlists.js';
 
 const uri = process.env.DB;
 const client = new MongoClient(uri);
@@ -28,11 +29,29 @@ export default async function handler(req, res) {
     const db = client.db('belmond_fan_data');
     const collection = db.collection('videos');
 
-    const filter = {
-      playlist_titles: decodedTitle   // 完全一致
-      // 大文字小文字を無視したい場合は以下のように変更可能：
-      // playlist_titles: { $regex: new RegExp(`^${decodedTitle}$`, 'i') }
-    };
+    // 既定の並び（新しい順）なら事前計算済みの再生リスト一覧を1件引くだけで返す（無ければ通常の検索）
+    // 一覧は再生リストIDごとなので、名前 → ID を playlists の title インデックスで引く
+    // （同じ名前の再生リストが複数ある場合は、通常の検索でまとめて返す）
+    if (sortBy === 'published_at' && sortOrder === '-1') {
+      const matched = await db.collection('playlists')
+        .find({ title: decodedTitle }, { projection: { _id: 1 } })
+        .limit(2)
+        .toArray();
+      const listDoc = matched.length === 1
+        ? await db.collection('playlist_video_lists').findOne({ _id: matched[0]._id })
+        : null;
+      if (listDoc) {
+        return res.status(200).json({
+          videos: listDoc.videos,
+          totalVideos: listDoc.total_videos,
+          currentPage: 1,
+          totalPages: 1
+        });
+      }
+    }
+
+    // 再生リスト名は完全一致（名前 → 再生リストID を引き、videos.playlist_ids で絞り込む）
+    const filter = await playlistFilter(db, [decodedTitle]);
 
     const sortDirection = sortOrder === '-1' ? -1 : 1;
     const sort = { [sortBy]: sortDirection };
@@ -42,6 +61,7 @@ export default async function handler(req, res) {
       .find(filter)
       .sort(sort)
       .toArray();
+    await attachPlaylistTitles(db, videos);
 
     const totalVideos = videos.length;
 
@@ -0,0 +1,60 @@
+// pages/api/videoStatsHistoryApi.js
+import { MongoClient } from 'mongodb';
+
+const uri = process.env.DB;
+const client = new MongoClient(uri);
+
+const MAX_DAYS = 365;
+const JST_OFFSET_MS = 9 * 60 * 60 * 1000;
+
+export default async function handler(req, res) {
+  res.setHeader('Access-Control-Allow-Origin', '*');
+  res.setHeader('Access-Control-Allow-Methods', 'GET, OPTIONS');
+
+  if (req.method === 'OPTIONS') return res.status(200).end();
+  if (req.method !== 'GET') return res.status(405).json({ error: 'Method Not Allowed' });
+
+  const { id = '', days = 30 } = req.query;
+
+  if (!id) {
+    return res.status(400).json({ error: 'id is required' });
+  }
+
+  const numDays = parseInt(days);
+  if (isNaN(numDays) || numDays <= 0) {
+    return res.status(400).json({ error: 'days must be a positive number' });
+  }
+
+  const since = new Date(Date.now() - Math.min(numDays, MAX_DAYS) * 24 * 60 * 60 * 1000);
+  // 日次集計の day は JST の日付（YYYY-MM-DD）
+  const sinceDay = new Date(since.getTime() + JST_OFFSET_MS).toISOString().slice(0, 10);
+  const fields = { _id: 0, at: 1, view_count: 1, like_count: 1, comment_count: 1 };
+
+  try {
+    await client.connect();
+    const db = client.db('belmond_fan_data');
+
+    // 日次にまとめ済みの期間は video_stats_daily、それ以降はまとめる前のスナップショットを返す
+    const daily = await db.collection('video_stats_daily')
+      .find({ video_id: id, day: { $gte: sinceDay } }, { projection: { ...fields, day: 1 } })
+      .sort({ day: 1 })
+      .toArray();
+
+    const rolledUntil = daily.length > 0 ? daily[daily.length - 1].at : since;
+    const recent = await db.collection('video_stats_history')
+      .find({ 'meta.video_id': id, at: { $gt: rolledUntil } }, { projection: fields })
+      .sort({ at: 1 })
+      .toArray();
+
+    res.status(200).json({
+      videoId: id,
+      days: Math.min(numDays, MAX_DAYS),
+      daily,
+      recent
+    });
+
+  } catch (error) {
+    console.error('StatsHistory API Error:', error);
+    res.status(500).json({ error: 'サーバーエラー', details: error.message });
+  }
+}
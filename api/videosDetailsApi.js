@@ -1,10 +1,15 @@
 // pages/api/videosDetailsApi.js
 
 import { MongoClient } from 'mongodb';
+import { findCandidateIds } from '../lib/titleSearch.js';
+import { attachPlaylistTitles, playlistFilter } from '../lib/playlists.js';
 
 const uri = process.env.DB;
 const client = new MongoClient(uri);
 
+// Python の同期が video_pages に事前計算している並び順（すべて降順）
+const PRECOMPUTED_SORTS = ['published_at', 'view_count', 'like_count', 'comment_count'];
+
 export default async function handler(req, res) {
   res.setHeader('Access-Control-Allow-Origin', '*');
   res.setHeader('Access-Control-Allow-Methods', 'GET, OPTIONS');
@@ -31,12 +36,28 @@ export default async function handler(req, res) {
     const db = client.db('belmond_fan_data');
     const collection = db.collection('videos');
 
+    // 検索・絞り込みが無ければ事前計算済みのページを1件引くだけで返す（無ければ通常の検索）
+    if (!search && !playlists && !startDate && !endDate && PRECOMPUTED_SORTS.includes(sortBy) && sortOrder === '-1') {
+      const pageDoc = await db.collection('video_pages').findOne({ _id: `${type || 'all'}|${sortBy}|-1|${parseInt(page)}` });
+      if (pageDoc) {
+        return res.status(200).json({
+          videos: pageDoc.videos,
+          currentPage: parseInt(page),
+          totalPages: pageDoc.total_pages,
+          totalVideos: pageDoc.total_videos
+        });
+      }
+    }
+
     const filter = {};
 
     // タイトル検索
     if (search) {
       const keywords = search.split(',').map(k => k.trim()).filter(Boolean);
       if (keywords.length > 0) {
+        // n-gram 索引で候補を絞ってから $regex で確かめる（全件の正規表現スキャンを避ける）
+        const candidateIds = await findCandidateIds(db, keywords);
+        if (candidateIds !== null) filter._id = { $in: candidateIds };
         filter.$and = keywords.map(kw => ({
           title: { $regex: kw, $options: 'i' }
         }));
@@ -49,8 +70,8 @@ export default async function handler(req, res) {
       console.log('Received playlists param:', playlists);               // ← Vercelログで確認用
       console.log('Decoded playlist titles:', playlistTitles);          
       if (playlistTitles.length > 0) {
-        filter.playlist_titles = { $in: playlistTitles };
-        console.log('Applied filter.playlist_titles:', filter.playlist_titles); // フィルタ適用ログ
+        Object.assign(filter, await playlistFilter(db, playlistTitles));
+        console.log('Applied playlist filter:', filter.playlist_ids || filter.playlist_titles); // フィルタ適用ログ
       }
     }
 
@@ -67,6 +88,7 @@ export default async function handler(req, res) {
 
     const totalCount = await collection.countDocuments(filter);
     const videos = await collection.find(filter).sort(sort).skip(skip).limit(limit).toArray();
+    await attachPlaylistTitles(db, videos);
 
     res.status(200).json({
       videos,
@@ -0,0 +1,43 @@
+// 再生リストの所属
+// Python の同期（python-src/playlist_members.py）は動画に所属する再生リストのID（playlist_ids）だけを持たせ、
+// 名前は playlists から引く。移行前の動画は従来どおり playlist_titles（名前の配列）を持つ
+
+let membershipReady = false;
+
+// 所属の移行（再生リスト更新の初回実行）が済んでいるか。済むまでは従来の playlist_titles で絞り込む
+async function hasPlaylistMembership(db) {
+  if (!membershipReady) {
+    membershipReady = (await db.collection('playlist_members').estimatedDocumentCount()) > 0;
+  }
+  return membershipReady;
+}
+
+// 再生リスト名での絞り込み条件（名前 → ID は playlists の title インデックスで引く）
+export async function playlistFilter(db, titles) {
+  if (!(await hasPlaylistMembership(db))) {
+    return { playlist_titles: { $in: titles } };
+  }
+  const docs = await db.collection('playlists')
+    .find({ title: { $in: titles } }, { projection: { _id: 1 } })
+    .toArray();
+  return { playlist_ids: { $in: docs.map(d => d._id) } };
+}
+
+// playlist_ids を持つ動画に表示用の playlist_titles（名前）を付ける
+export async function attachPlaylistTitles(db, videos) {
+  const ids = new Set();
+  for (const v of videos) {
+    for (const id of v.playlist_ids || []) ids.add(id);
+  }
+  if (ids.size === 0) return videos;
+
+  const docs = await db.collection('playlists')
+    .find({ _id: { $in: [...ids] } }, { projection: { title: 1 } })
+    .toArray();
+  const titles = new Map(docs.map(d => [d._id, d.title]));
+  for (const v of videos) {
+    if (!v.playlist_ids) continue;
+    v.playlist_titles = [...new Set(v.playlist_ids.map(id => titles.get(id)).filter(Boolean))].sort();
+  }
+  return videos;
+}
@@ -0,0 +1,48 @@
+// タイトル検索の候補絞り込み
+// Python の同期（python-src/search_index.py）が作る search_ngrams（2文字 → 動画IDの一覧）を使う
+
+// 正規表現の記号を含むキーワードは文字列として索引を引けないので、通常の $regex 検索に任せる
+const REGEX_META = /[.*+?^${}()|[\]\\]/;
+
+export function normalizeText(text) {
+  return text.normalize('NFKC').toLowerCase();
+}
+
+export function bigrams(text) {
+  const chars = Array.from(normalizeText(text));
+  const grams = new Set();
+  for (let i = 0; i + 1 < chars.length; i++) {
+    const gram = chars[i] + chars[i + 1];
+    if (!/\s/.test(gram)) grams.add(gram);
+  }
+  return grams;
+}
+
+// すべてのキーワードを含みうる動画IDの候補（postings の積集合）を返す。
+// 索引で絞り込めない場合（1文字のキーワードだけ・索引が未作成）は null。
+// 候補には余分なものが含まれうるので、呼び出し側で従来の $regex 条件も併用すること。
+export async function findCandidateIds(db, keywords) {
+  const grams = new Set();
+  for (const kw of keywords) {
+    if (REGEX_META.test(kw)) continue;
+    for (const gram of bigrams(kw)) grams.add(gram);
+  }
+  if (grams.size === 0) return null;
+
+  const collection = db.collection('search_ngrams');
+  const postings = await collection.find({ _id: { $in: [...grams] } }).toArray();
+  if (postings.length < grams.size) {
+    // 索引に無い2文字がある = 該当なし（索引自体がまだ無い場合は絞り込まない）
+    return (await collection.estimatedDocumentCount()) === 0 ? null : [];
+  }
+
+  // 短い一覧から順に積集合を取る
+  postings.sort((a, b) => a.ids.length - b.ids.length);
+  let candidates = postings[0].ids;
+  for (const posting of postings.slice(1)) {
+    const ids = new Set(posting.ids);
+    candidates = candidates.filter(id => ids.has(id));
+    if (candidates.length === 0) break;
+  }
+  return candidates;
+}
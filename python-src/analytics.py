@@ -0,0 +1,61 @@
+from datetime import date
+from typing import Container, Iterable, List
+
+from youtubedataapi import Weekday
+
+_WEEKDAYS: List[Weekday] = list(Weekday)
+
+
+def compute_broadcast_patterns(videos: Iterable, holidays: Container[date] = frozenset()) -> List:
+    """
+    配信傾向の分析フィールドをまとめて計算して各動画に書き込む。
+      is_holiday / weekday / same_day_broadcast_count / consecutive_broadcast_days /
+      was_broadcast_yesterday / days_since_last_broadcast
+    published_at で1回ソートしたあとは、日付ごとの連番・前日との差分・連続日数の累積を
+    1パスで求める（日付の index 検索をしないので動画数に対して線形）。
+    YouTube から取得した直後の動画でも、MongoDB から読み込んだ動画（VideoRow 含む）でも使える。
+    published_at が無い動画は計算対象外。計算した動画を公開日の昇順で返す。
+    """
+    # 同時刻の動画は入力順を保つ（安定ソート）
+    ordered = sorted((v for v in videos if v.published_at), key=lambda v: v.published_at)
+    if not ordered:
+        return ordered
+
+    # 1. 動画ごとの日付（序数）と、日付が変わる位置
+    dates = [v.published_at.date() for v in ordered]
+    ordinals = [d.toordinal() for d in dates]
+
+    day_starts: List[int] = [0]
+    for i in range(1, len(ordinals)):
+        if ordinals[i] != ordinals[i - 1]:
+            day_starts.append(i)
+    day_ordinals = [ordinals[i] for i in day_starts]
+    day_count = len(day_ordinals)
+
+    # 2. 前の配信日との差（diff）。最も古い日は 0 扱い
+    gaps = [0] + [day_ordinals[k] - day_ordinals[k - 1] for k in range(1, day_count)]
+
+    # 3. 連続配信日数: 新しい日から古い日へ、1日差が続く限り累積（差が開いたらリセット）
+    streaks = [1] * day_count
+    for k in range(day_count - 2, -1, -1):
+        if gaps[k + 1] == 1:
+            streaks[k] = streaks[k + 1] + 1
+
+    # 4. 日付ごとの値を各動画へ展開
+    day_starts.append(len(ordered))
+    for k in range(day_count):
+        day = dates[day_starts[k]]
+        is_holiday = day in holidays
+        weekday = _WEEKDAYS[day.weekday()]
+        was_yesterday = k > 0 and gaps[k] == 1
+        days_since = gaps[k] - 1 if k > 0 else 0
+        for idx, i in enumerate(range(day_starts[k], day_starts[k + 1]), 1):
+            v = ordered[i]
+            v.is_holiday = is_holiday
+            v.weekday = weekday
+            v.same_day_broadcast_count = idx
+            v.consecutive_broadcast_days = streaks[k]
+            v.was_broadcast_yesterday = was_yesterday
+            v.days_since_last_broadcast = days_since
+
+    return ordered
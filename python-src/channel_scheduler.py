@@ -0,0 +1,162 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+import json
+import math
+import threading
+import time
+import traceback
+
+from fetch_engine import QuotaBudget, QuotaExceededError, VIDEO_BATCH_SIZE
+from sync_logging import get_logger
+
+logger = get_logger("scheduler")
+
+
+@dataclass
+class ChannelTarget:
+    channel_id: str
+    db_name: str
+    # 優先度の計算に使う値（rank_channels で MongoDB から埋める）
+    known_videos: int = 0
+    recent_uploads: int = 0
+    last_synced_at: Optional[datetime] = None
+
+
+@dataclass
+class ChannelRunResult:
+    channel_id: str
+    status: str = "pending"     # ok / failed / skipped
+    message: str = ""
+    elapsed_sec: float = 0.0
+
+
+def load_channel_targets(
+    channel_id: Optional[str],
+    channel_ids: Optional[str],
+    channels_file: Optional[str],
+    default_db_name: str
+) -> List[ChannelTarget]:
+    """
+    --channel_id / --channel_ids（カンマ区切り）/ --channels_file（JSON）から同期対象を作る。
+    JSON はチャンネルIDの配列か、{"channel_id": ..., "db_name": ...} の配列。
+    同じチャンネルIDは1回だけ同期する。
+    """
+    targets: List[ChannelTarget] = []
+    if channel_id:
+        targets.append(ChannelTarget(channel_id.strip(), default_db_name))
+    if channel_ids:
+        targets.extend(ChannelTarget(cid.strip(), default_db_name) for cid in channel_ids.split(",") if cid.strip())
+    if channels_file:
+        with open(channels_file, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            if isinstance(entry, str):
+                targets.append(ChannelTarget(entry.strip(), default_db_name))
+            else:
+                targets.append(ChannelTarget(entry["channel_id"].strip(), entry.get("db_name") or default_db_name))
+
+    seen = set()
+    unique: List[ChannelTarget] = []
+    for target in targets:
+        if target.channel_id not in seen:
+            seen.add(target.channel_id)
+            unique.append(target)
+    return unique
+
+
+def rank_channels(client, targets: List[ChannelTarget], recent_days: int = 14) -> List[ChannelTarget]:
+    """
+    最近の投稿が多いチャンネルから順に並べる（まだ一度も同期していないチャンネルは最優先）。
+    同じ投稿数なら前回の同期が古いものを先にする。
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=recent_days)
+    for target in targets:
+        db = client[target.db_name]
+        target.known_videos = db["videos"].count_documents({"channel_id": target.channel_id})
+        target.recent_uploads = db["videos"].count_documents(
+            {"channel_id": target.channel_id, "published_at": {"$gte": since}}
+        )
+        channel_doc = db["channels"].find_one({"channel_id": target.channel_id}, {"last_updated": 1})
+        target.last_synced_at = channel_doc.get("last_updated") if channel_doc else None
+
+    oldest = datetime.min
+    return sorted(targets, key=lambda t: (
+        t.known_videos > 0,
+        -t.recent_uploads,
+        t.last_synced_at.replace(tzinfo=None) if t.last_synced_at else oldest
+    ))
+
+
+def estimate_sync_cost(target: ChannelTarget) -> int:
+    """
+    1チャンネルの同期で使うクォータの見積もり（ユニット）。
+    channels / playlists で数ユニット、アップロード3本分のページングと
+    保存済み動画の videos().list（統計の再取得を含む最大値）を見込む。
+    """
+    batches = math.ceil(target.known_videos / VIDEO_BATCH_SIZE)
+    return 5 + 2 * batches
+
+
+def run_channels(
+    targets: List[ChannelTarget],
+    sync_one: Callable[[ChannelTarget], bool],
+    budget: Optional[QuotaBudget] = None,
+    workers: int = 2
+) -> Dict[str, ChannelRunResult]:
+    """
+    targets の順（優先度順）に sync_one を並列実行する。sync_one は成功したら True を返す。
+    開始時点で残りの予算が見積もりに足りないチャンネルはスキップする。
+    途中で予算を使い切ったチャンネルは取得に失敗するので、保存されずに failed になる。
+    その後に開始するチャンネルは、見積もりにかかわらずスキップする。
+    """
+    results: Dict[str, ChannelRunResult] = {t.channel_id: ChannelRunResult(t.channel_id) for t in targets}
+    lock = threading.Lock()
+    quota_exhausted = threading.Event()
+
+    def run(target: ChannelTarget):
+        result = results[target.channel_id]
+        if quota_exhausted.is_set():
+            result.status = "skipped"
+            result.message = "クォータの予算を使い切ったため"
+            logger.warning("[%s] スキップ: %s", target.channel_id, result.message)
+            return
+        if budget is not None:
+            estimate = estimate_sync_cost(target)
+            if budget.remaining < estimate:
+                result.status = "skipped"
+                result.message = f"クォータ不足（残り {budget.remaining} / 見積もり {estimate} ユニット）"
+                logger.warning("[%s] スキップ: %s", target.channel_id, result.message)
+                return
+
+        start = time.perf_counter()
+        try:
+            result.status = "ok" if sync_one(target) else "failed"
+        except QuotaExceededError as e:
+            quota_exhausted.set()
+            result.status = "failed"
+            result.message = f"クォータ切れ: {e}"
+        except Exception as e:
+            result.status = "failed"
+            result.message = f"{type(e).__name__}: {e}"
+            traceback.print_exc()
+        finally:
+            result.elapsed_sec = time.perf_counter() - start
+            with lock:
+                logger.info("[%s] 同期終了: %s (%.1f 秒) %s", target.channel_id, result.status, result.elapsed_sec, result.message)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # 投入順に処理されるので、優先度の高いチャンネルから開始する
+        for future in [executor.submit(run, target) for target in targets]:
+            future.result()
+    return results
+
+
+def print_run_summary(results: Dict[str, ChannelRunResult], budget: Optional[QuotaBudget], elapsed_sec: float):
+    logger.info("\n=== チャンネル同期の結果 ===")
+    for result in results.values():
+        logger.info("  %s: %s (%.1f 秒) %s", result.channel_id, result.status, result.elapsed_sec, result.message)
+    if budget is not None:
+        logger.info("  APIクォータ: %d / %d ユニット使用", budget.used, budget.limit)
+    logger.info("  合計時間: %.1f 秒", elapsed_sec)
@@ -0,0 +1,343 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Dict, Hashable, List, Optional, Set, Tuple
+import threading
+
+from googleapiclient.errors import HttpError
+from pymongo.errors import PyMongoError
+
+from http_cache import CachingHttp, ResponseCache
+from instrumentation import InstrumentedHttp, quota_cost, run_metrics
+from request_masks import REQUEST_SHAPES
+from sync_logging import get_logger
+import retry_policy
+
+if TYPE_CHECKING:
+    from sync_progress import FetchProgress
+
+logger = get_logger("fetch")
+
+# videos().list に一度に渡せるIDの上限
+VIDEO_BATCH_SIZE = 50
+
+# videos().list の取得内容（request_masks.REQUEST_SHAPES のキー）
+DETAIL_SHAPE = "video_details"
+STATS_SHAPE = "video_stats"
+
+
+class QuotaExceededError(Exception):
+    """プロセス全体の API クォータ予算を使い切った"""
+
+
+class QuotaBudget:
+    """
+    複数チャンネルの同期で共有する YouTube API のクォータ予算（ユニット数）。
+    リクエストごとのコストは instrumentation.quota_cost（list 系は 304 を含めて1ユニット）。
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        self._lock = threading.Lock()
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self._used)
+
+    def charge(self, units: int = 1):
+        with self._lock:
+            if self._used + units > self.limit:
+                raise QuotaExceededError(f"APIクォータの予算（{self.limit} ユニット）を使い切りました")
+            self._used += units
+
+
+class BudgetedHttp:
+    """リクエストを送る前に QuotaBudget からそのリクエストのコストを差し引く http ラッパー"""
+
+    def __init__(self, http, budget: QuotaBudget):
+        self._http = http
+        self._budget = budget
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self._budget.charge(quota_cost(uri))
+        return self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+
+_discovery_lock = threading.Lock()
+_discovery_document: Optional[str] = None
+
+_pool_lock = threading.Lock()
+_client_pools: Dict[Tuple[str, int, int], "YoutubeClientPool"] = {}
+
+
+def youtube_discovery_document() -> Optional[str]:
+    """
+    googleapiclient に同梱されている YouTube Data API v3 の静的ディスカバリ文書。
+    プロセス内で1回だけ読み込む（同梱されていない版では None）。
+    """
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            from googleapiclient import discovery_cache
+            _discovery_document = discovery_cache.get_static_doc("youtube", "v3") or ""
+    return _discovery_document or None
+
+
+def build_youtube_client(api_key: str, http=None):
+    """
+    YouTube API クライアントを作る。googleapiclient.discovery は重いので、
+    実際にクライアントが必要になったときに初めて import する。
+    build_from_document は渡した dict を書き換えるので、文書は文字列のまま渡す。
+    """
+    from googleapiclient.discovery import build, build_from_document
+
+    document = youtube_discovery_document()
+    if document:
+        return build_from_document(document, developerKey=api_key, http=http)
+    return build('youtube', 'v3', developerKey=api_key, http=http, static_discovery=False)
+
+
+class YoutubeClientPool:
+    """
+    スレッドごとに YouTube API クライアントを1つずつ持つ。
+    googleapiclient のクライアント（httplib2）はスレッドセーフではないため共有しない。
+    cache を渡した場合は全スレッドで同じレスポンスキャッシュを使い、
+    budget を渡した場合は全スレッドのリクエストを同じクォータ予算から差し引く。
+    429 / 5xx などは retry_policy の設定で再試行し、全スレッド共通のレート制限をかける。
+    プロセス内では get_client_pool() で同じプールを使い回す。
+    """
+
+    def __init__(self, api_key: str, cache: Optional[ResponseCache] = None, budget: Optional[QuotaBudget] = None):
+        self.api_key = api_key
+        self.cache = cache
+        self.budget = budget
+        self._local = threading.local()
+
+    def get(self):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            from googleapiclient.http import build_http
+            http = InstrumentedHttp(build_http(), run_metrics)
+            if self.cache:
+                http = CachingHttp(http, self.cache)
+            if self.budget:
+                http = BudgetedHttp(http, self.budget)
+            # 一時的なエラーの再試行は一番外側（再試行した分もクォータ予算に数える）
+            http = retry_policy.RetryingHttp(http, retry_policy.default_retry_policy, retry_policy.request_limiter)
+            client = build_youtube_client(self.api_key, http)
+            self._local.client = client
+        return client
+
+
+def get_client_pool(
+    api_key: str,
+    cache: Optional[ResponseCache] = None,
+    budget: Optional[QuotaBudget] = None
+) -> YoutubeClientPool:
+    """APIキー・レスポンスキャッシュ・クォータ予算の組み合わせごとに、プロセス内で1つのプールを返す"""
+    key = (api_key, id(cache), id(budget))
+    with _pool_lock:
+        pool = _client_pools.get(key)
+        if pool is None:
+            pool = YoutubeClientPool(api_key, cache, budget)
+            _client_pools[key] = pool
+        return pool
+
+
+@dataclass
+class UploadsFetchResult:
+    # キー（カテゴリ）→ そのプレイリストで見つかった新着動画ID（プレイリスト順）
+    playlist_video_ids: Dict[Hashable, List[str]] = field(default_factory=dict)
+    # playlistId → 先頭の動画ID（既知の動画で打ち切った場合も記録する）
+    playlist_heads: Dict[str, str] = field(default_factory=dict)
+    # videoId → videos().list の生レスポンス（詳細 / 統計のみ）
+    detail_items: Dict[str, dict] = field(default_factory=dict)
+    stats_items: Dict[str, dict] = field(default_factory=dict)
+    # 統計のみで問い合わせたID（レスポンスに無ければ削除/非公開）
+    stats_requested: Set[str] = field(default_factory=set)
+    # 再試行しても途中で失敗したプレイリスト（結果が欠けているので削除判定に使ってはいけない）
+    failed_playlists: List[str] = field(default_factory=list)
+    # 再試行しても videos().list が失敗したバッチの動画ID（同上。削除・非公開とみなしてはいけない）
+    failed_video_ids: List[str] = field(default_factory=list)
+
+
+class _VideoBatcher:
+    """IDが50件たまった時点で videos().list をワーカーに投入する"""
+
+    def __init__(self, executor: ThreadPoolExecutor, fetch: Callable[[List[str], str], List[dict]], shape: str,
+                 skip_ids: Optional[Set[str]] = None):
+        self._executor = executor
+        self._fetch = fetch
+        self._shape = shape
+        self._lock = threading.Lock()
+        self._pending: List[str] = []
+        # 取得済み（途中経過から復元したもの）は問い合わせない
+        self._seen: Set[str] = set(skip_ids or ())
+        self.futures: List[Future] = []
+
+    def add(self, video_ids: List[str]):
+        with self._lock:
+            for vid in video_ids:
+                if vid in self._seen:
+                    continue
+                self._seen.add(vid)
+                self._pending.append(vid)
+                if len(self._pending) >= VIDEO_BATCH_SIZE:
+                    self._submit_locked()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._submit_locked()
+
+    def _submit_locked(self):
+        batch, self._pending = self._pending, []
+        self.futures.append(self._executor.submit(self._fetch, batch, self._shape))
+
+
+def fetch_uploads_concurrently(
+    pool: YoutubeClientPool,
+    playlists: List[Tuple[Hashable, str]],
+    stop_ids: Set[str],
+    max_results: int = 0,
+    extra_detail_ids: Optional[List[str]] = None,
+    stats_only_ids: Optional[List[str]] = None,
+    workers: int = 4,
+    progress: Optional["FetchProgress"] = None
+) -> UploadsFetchResult:
+    """
+    アップロード系プレイリストを並列にページングし、IDが50件たまるごとに
+    videos().list を同じワーカープールで先行実行する。
+    stop_ids に含まれる動画に到達したプレイリストはそこでページングを打ち切る。
+    max_results > 0 のときは各プレイリストをその件数まで取得し、合計の切り詰めは呼び出し側で行う。
+    progress を渡した場合、ページ・バッチごとに途中経過を保存し、
+    復元した途中経過があればそのページトークンから続きを取得する。
+    途中経過の保存に失敗した場合は、以降は記録せずに取得を続ける（続きから再開できなくなるだけ）。
+    """
+    result = UploadsFetchResult()
+    heads_lock = threading.Lock()
+    checkpointing = progress is not None
+
+    def save_progress(save: Callable, *args):
+        nonlocal checkpointing
+        if not checkpointing:
+            return
+        try:
+            save(*args)
+        except PyMongoError as e:
+            with heads_lock:
+                if checkpointing:
+                    checkpointing = False
+                    logger.warning("途中経過を保存できないため、以降は記録せずに取得を続けます: %s", e)
+
+    def fetch_videos(batch: List[str], shape: str) -> List[dict]:
+        youtube = pool.get()
+        try:
+            with run_metrics.phase("detail_batches" if shape == DETAIL_SHAPE else "stats_batches"):
+                resp = youtube.videos().list(id=",".join(batch), **REQUEST_SHAPES[shape]).execute()
+        except HttpError as e:
+            logger.error("動画の取得中にエラー発生（%d 本は今回取得できません）: %s", len(batch), e)
+            with heads_lock:
+                result.failed_video_ids.extend(batch)
+            return []
+        items = resp.get("items", [])
+        if progress is not None:
+            save_progress(progress.save_items, shape, items)
+        return items
+
+    def page_playlist(playlist_id: str, batcher: _VideoBatcher) -> List[str]:
+        youtube = pool.get()
+        found: List[str] = []
+        next_page_token: Optional[str] = None
+        state = progress.playlist_state(playlist_id) if progress is not None else None
+        if state:
+            found = list(state.get("ids", []))
+            next_page_token = state.get("cursor")
+            batcher.add(found)
+            if state.get("head"):
+                with heads_lock:
+                    result.playlist_heads[playlist_id] = state["head"]
+            if state.get("done"):
+                return found
+        while True:
+            try:
+                if max_results > 0 and len(found) >= max_results:
+                    break
+
+                with run_metrics.phase("playlist_paging"):
+                    pl_resp = youtube.playlistItems().list(
+                        playlistId=playlist_id,
+                        maxResults=50,
+                        pageToken=next_page_token,
+                        **REQUEST_SHAPES["playlist_items"]
+                    ).execute()
+
+                page_ids: List[str] = []
+                reached_known = False
+                for item in pl_resp.get("items", []):
+                    if max_results > 0 and len(found) + len(page_ids) >= max_results:
+                        break
+                    vid = item["contentDetails"]["videoId"]
+                    if next_page_token is None and not page_ids and not found:
+                        with heads_lock:
+                            result.playlist_heads[playlist_id] = vid
+                    if vid in stop_ids:
+                        reached_known = True
+                        break
+                    page_ids.append(vid)
+
+                found.extend(page_ids)
+                next_page_token = pl_resp.get("nextPageToken")
+                done = reached_known or not next_page_token or (max_results > 0 and len(found) >= max_results)
+                # 先に途中経過を保存する（再開時は保存済みのIDをもう一度バッチに入れ、未取得のものだけ問い合わせる）
+                if progress is not None:
+                    save_progress(progress.save_page, playlist_id, next_page_token, page_ids, done,
+                                  result.playlist_heads.get(playlist_id))
+                batcher.add(page_ids)
+                if done:
+                    break
+            except HttpError as e:
+                logger.error("プレイリスト取得中にエラー発生（%s は途中までの結果になります）: %s", playlist_id, e)
+                with heads_lock:
+                    result.failed_playlists.append(playlist_id)
+                break
+        return found
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        restored_details = progress.fetched_items(DETAIL_SHAPE) if progress is not None else {}
+        restored_stats = progress.fetched_items(STATS_SHAPE) if progress is not None else {}
+        result.detail_items.update(restored_details)
+        result.stats_items.update(restored_stats)
+        detail_batcher = _VideoBatcher(executor, fetch_videos, DETAIL_SHAPE, set(restored_details))
+        stats_batcher = _VideoBatcher(executor, fetch_videos, STATS_SHAPE, set(restored_stats))
+
+        # 差分同期で最初から分かっているIDは先に投入しておく
+        detail_batcher.add(extra_detail_ids or [])
+        stats_batcher.add(stats_only_ids or [])
+        stats_batcher.flush()
+        result.stats_requested = set(stats_only_ids or [])
+
+        paging = [
+            (key, executor.submit(page_playlist, playlist_id, detail_batcher))
+            for key, playlist_id in playlists
+        ]
+        # 結果はプレイリストの定義順で受け取る（完了順に依存しない）
+        for key, future in paging:
+            result.playlist_video_ids[key] = future.result()
+
+        detail_batcher.flush()
+        for future in detail_batcher.futures:
+            for item in future.result():
+                result.detail_items[item["id"]] = item
+        for future in stats_batcher.futures:
+            for item in future.result():
+                result.stats_items[item["id"]] = item
+
+    return result
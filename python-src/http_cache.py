@@ -0,0 +1,203 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+
+from sync_logging import get_logger
+
+if TYPE_CHECKING:
+    import httplib2
+
+logger = get_logger("http_cache")
+
+# キャッシュキーから除外するクエリパラメータ（APIキーが変わっても同じキャッシュを使う）
+_IGNORED_PARAMS = {"key"}
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0          # 304 でローカルのレスポンスを返した件数
+    misses: int = 0        # キャッシュなし → 通常取得した件数
+    refreshed: int = 0     # キャッシュはあったが内容が変わっていた件数
+    evicted: int = 0
+
+    def summary(self) -> str:
+        total = self.hits + self.misses + self.refreshed
+        rate = (self.hits / total * 100) if total else 0.0
+        return (f"HTTPキャッシュ: ヒット {self.hits} / 更新 {self.refreshed} / ミス {self.misses}"
+                f"（ヒット率 {rate:.1f}%、削除 {self.evicted} 件）")
+
+
+class ResponseCache(ABC):
+    """レスポンスキャッシュのインターフェース（別の保存先に差し替える場合はこれを継承）"""
+
+    def __init__(self):
+        self.stats = CacheStats()
+        self._stats_lock = threading.Lock()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, entry: dict):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def evict(self):
+        """期限切れ・容量超過のエントリを削除（実行の最後に呼ぶ）"""
+
+    def count(self, field_name: str):
+        with self._stats_lock:
+            setattr(self.stats, field_name, getattr(self.stats, field_name) + 1)
+
+
+class DiskResponseCache(ResponseCache):
+    """
+    1リクエスト = 1ファイルのディスクキャッシュ。
+    ttl_seconds を過ぎたエントリは使わず、evict() で合計 max_bytes を超えた分を古い順に削除する。
+    """
+
+    def __init__(self, directory: str, ttl_seconds: float = 3 * 24 * 3600, max_bytes: int = 200 * 1024 * 1024):
+        super().__init__()
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                self.delete(key)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, entry: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("HTTPキャッシュ書き込みエラー（無視します）: %s", e)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        now = time.time()
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.ttl_seconds or name.endswith(".tmp"):
+                self._remove(path)
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path: str):
+        """同じキャッシュを使う別のチャンネル・プロセスが先に消した場合も失敗にしない"""
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        self.count("evicted")
+
+
+def cache_key(uri: str) -> str:
+    """リクエストURL（クエリパラメータはソート済み、APIキー除外）をキーにする"""
+    parts = urlsplit(uri)
+    params = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in _IGNORED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(params), ""))
+
+
+class CachingHttp:
+    """
+    httplib2.Http のラッパー。GET のレスポンスを ETag 付きで保存し、
+    次回は If-None-Match を送って 304 ならローカルの内容を返す。
+    googleapiclient の build(http=...) にそのまま渡せる。
+    """
+
+    def __init__(self, http: "httplib2.Http", cache: ResponseCache):
+        self._http = http
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        if method != "GET":
+            return self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        key = cache_key(uri)
+        cached = self._cache.get(key)
+        headers = dict(headers or {})
+        if cached and cached.get("etag"):
+            headers["if-none-match"] = cached["etag"]
+
+        resp, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+
+        if resp.status == 304 and cached:
+            import httplib2  # build_http() 経由で読み込み済み
+
+            self._cache.count("hits")
+            local = httplib2.Response(cached["headers"])
+            local.status = cached["status"]
+            local.fromcache = True
+            return local, base64.b64decode(cached["body"])
+
+        if resp.status == 200:
+            self._cache.count("refreshed" if cached else "misses")
+            etag = resp.get("etag") or _body_etag(content)
+            if etag:
+                self._cache.set(key, {
+                    "uri": key,
+                    "etag": etag,
+                    "status": resp.status,
+                    "headers": dict(resp),
+                    "body": base64.b64encode(content).decode("ascii"),
+                })
+        return resp, content
+
+
+def _body_etag(content: bytes) -> Optional[str]:
+    """レスポンスヘッダーに ETag が無い場合は JSON 本文の etag を使う"""
+    try:
+        etag = json.loads(content).get("etag")
+    except (ValueError, AttributeError):
+        return None
+    return f'"{etag}"' if etag and not etag.startswith('"') else etag
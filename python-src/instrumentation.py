@@ -0,0 +1,212 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+from urllib.parse import urlsplit
+import json
+import threading
+import time
+
+# エンドポイント（リソース名）ごとのクォータコスト。載っていない list 系は 1 ユニット
+QUOTA_COSTS: Dict[str, int] = {
+    "search": 100,
+}
+
+# レイテンシのヒストグラムの境界（秒）。Prometheus の le ラベルと同じ累積カウント
+LATENCY_BUCKETS: List[float] = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def endpoint_name(uri: str, method: str = "GET") -> str:
+    """https://youtube.googleapis.com/youtube/v3/playlistItems?... → "playlistItems.list" """
+    resource = urlsplit(uri).path.rstrip("/").rsplit("/", 1)[-1] or "unknown"
+    verb = {"GET": "list", "POST": "insert", "PUT": "update", "DELETE": "delete"}.get(method, method.lower())
+    return f"{resource}.{verb}"
+
+
+def quota_cost(uri: str) -> int:
+    resource = urlsplit(uri).path.rstrip("/").rsplit("/", 1)[-1]
+    return QUOTA_COSTS.get(resource, 1)
+
+
+@dataclass
+class EndpointStats:
+    requests: int = 0           # 送ったリクエスト数（list 系は1回 = 1ページ）
+    quota_units: int = 0
+    response_bytes: int = 0
+    not_modified: int = 0       # 304（レスポンスキャッシュで返したもの）
+    errors: int = 0             # ステータス 400 以上と接続エラー
+    latency_sum: float = 0.0
+    latency_buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+
+    def observe(self, latency: float):
+        self.latency_sum += latency
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.latency_buckets[i] += 1
+                return
+        self.latency_buckets[-1] += 1
+
+    def to_dict(self) -> dict:
+        cumulative, running = {}, 0
+        for bound, count in zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.latency_buckets):
+            running += count
+            cumulative[bound] = running
+        return {
+            "requests": self.requests,
+            "quota_units": self.quota_units,
+            "response_bytes": self.response_bytes,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+            "latency_sum_sec": round(self.latency_sum, 6),
+            "latency_buckets": cumulative,
+        }
+
+
+@dataclass
+class PhaseStats:
+    runs: int = 0
+    seconds: float = 0.0
+
+
+class RunMetrics:
+    """
+    1回の実行で YouTube API に送ったリクエストと、処理フェーズごとの所要時間を集計する。
+    複数スレッド（並列取得・複数チャンネル同期）から同時に記録してよい。
+    フェーズの時間はスレッドごとの実時間の合計なので、並列に走るフェーズは実行時間より長くなる。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now(timezone.utc)
+        self.endpoints: Dict[str, EndpointStats] = {}
+        self.phases: Dict[str, PhaseStats] = {}
+
+    def record_request(self, endpoint: str, units: int, status: int, nbytes: int, latency: float):
+        with self._lock:
+            stats = self.endpoints.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.quota_units += units
+            stats.response_bytes += nbytes
+            if status == 304:
+                stats.not_modified += 1
+            elif status >= 400 or status == 0:
+                stats.errors += 1
+            stats.observe(latency)
+
+    def record_phase(self, name: str, seconds: float):
+        with self._lock:
+            stats = self.phases.setdefault(name, PhaseStats())
+            stats.runs += 1
+            stats.seconds += seconds
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_phase(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "finished_at": datetime.now(timezone.utc).isoformat(),
+                "quota_units_total": sum(s.quota_units for s in self.endpoints.values()),
+                "requests_total": sum(s.requests for s in self.endpoints.values()),
+                "endpoints": {name: s.to_dict() for name, s in sorted(self.endpoints.items())},
+                "phases": {
+                    name: {"runs": s.runs, "seconds": round(s.seconds, 6)}
+                    for name, s in sorted(self.phases.items())
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self) -> str:
+        """Prometheus のテキスト形式（node_exporter の textfile collector などでそのまま読める）"""
+        data = self.to_dict()
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help_text: str, samples: List[str]):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        endpoints = data["endpoints"]
+        for key, name, help_text in [
+            ("requests", "youtube_api_requests_total", "YouTube API requests (pages)"),
+            ("quota_units", "youtube_api_quota_units_total", "YouTube API quota units"),
+            ("response_bytes", "youtube_api_response_bytes_total", "YouTube API response body bytes"),
+            ("not_modified", "youtube_api_not_modified_total", "YouTube API 304 responses"),
+            ("errors", "youtube_api_errors_total", "YouTube API responses with status >= 400"),
+        ]:
+            metric(name, "counter", help_text,
+                   [f'{name}{{endpoint="{ep}"}} {s[key]}' for ep, s in endpoints.items()])
+
+        histogram: List[str] = []
+        for ep, s in endpoints.items():
+            for bound, count in s["latency_buckets"].items():
+                histogram.append(f'youtube_api_request_duration_seconds_bucket{{endpoint="{ep}",le="{bound}"}} {count}')
+            histogram.append(f'youtube_api_request_duration_seconds_sum{{endpoint="{ep}"}} {s["latency_sum_sec"]}')
+            histogram.append(f'youtube_api_request_duration_seconds_count{{endpoint="{ep}"}} {s["requests"]}')
+        metric("youtube_api_request_duration_seconds", "histogram", "YouTube API request latency", histogram)
+
+        phases = data["phases"]
+        metric("sync_phase_seconds_total", "counter", "Time spent per sync phase (summed over threads)",
+               [f'sync_phase_seconds_total{{phase="{p}"}} {s["seconds"]}' for p, s in phases.items()])
+        metric("sync_phase_runs_total", "counter", "Number of times each sync phase ran",
+               [f'sync_phase_runs_total{{phase="{p}"}} {s["runs"]}' for p, s in phases.items()])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """拡張子が .prom ならPrometheusテキスト、それ以外はJSONで書き出す"""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def summary(self) -> str:
+        data = self.to_dict()
+        parts = [f"APIリクエスト {data['requests_total']} 回 / クォータ {data['quota_units_total']} ユニット"]
+        for ep, s in data["endpoints"].items():
+            parts.append(f"  {ep}: {s['requests']} 回, {s['quota_units']} ユニット, "
+                         f"{s['response_bytes'] / 1024:.1f} KB, 平均 {s['latency_sum_sec'] / max(1, s['requests']) * 1000:.0f} ms")
+        for name, s in data["phases"].items():
+            parts.append(f"  [{name}] {s['seconds']:.2f} 秒（{s['runs']} 回）")
+        return "\n".join(parts)
+
+
+class InstrumentedHttp:
+    """
+    リクエストごとにエンドポイント・クォータ・バイト数・レイテンシを RunMetrics に記録する http ラッパー。
+    CachingHttp の内側に置き、実際に通信した結果（304 を含む）を記録する。
+    """
+
+    def __init__(self, http, metrics: RunMetrics):
+        self._http = http
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        start = time.perf_counter()
+        try:
+            resp, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+        except Exception:
+            # 接続エラーなどはステータス 0 として記録する
+            self._metrics.record_request(endpoint_name(uri, method), quota_cost(uri), 0, 0, time.perf_counter() - start)
+            raise
+        self._metrics.record_request(
+            endpoint_name(uri, method),
+            quota_cost(uri),
+            resp.status,
+            len(content or b""),
+            time.perf_counter() - start
+        )
+        return resp, content
+
+
+# プロセス全体で共有する計測（main の終了時にまとめて出力する）
+run_metrics = RunMetrics()
@@ -0,0 +1,136 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Optional
+import csv
+import io
+import json
+import os
+import threading
+import urllib.request
+
+from sync_logging import get_logger
+
+logger = get_logger("holidays")
+
+HOLIDAY_CSV_URL = "https://www8.cao.go.jp/chosei/shukujitsu/syukujitsu.csv"
+
+# 内閣府の祝日CSVを保存しておく場所と、取り直す間隔（祝日は年1回程度しか更新されない）
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "jp_holidays.json")
+DEFAULT_REFRESH_INTERVAL = timedelta(days=30)
+
+
+def parse_holiday_csv(text: str) -> list[date]:
+    """内閣府CSV（1列目が YYYY/M/D）の本文から祝日の日付を取り出す"""
+    holidays = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row:
+            continue
+        try:
+            ymd = [int(x) for x in row[0].strip().split("/")]
+        except ValueError:
+            continue  # 見出し行など
+        if len(ymd) == 3:
+            holidays.append(date(ymd[0], ymd[1], ymd[2]))
+    return holidays
+
+
+class JapaneseHolidayCalendar:
+    """
+    日本の祝日カレンダー。最初に問い合わせたときに読み込む（import 時には何もしない）。
+      1. ディスクキャッシュが refresh_interval 以内ならそれを使う
+      2. 古い/無い場合は内閣府CSVを取得してキャッシュを更新
+      3. 取得に失敗したら古いキャッシュを使い、それも無ければ警告して祝日なしとして扱う
+    判定は日付の序数を添字にしたビット列で O(1)。
+    """
+
+    def __init__(
+        self,
+        cache_path: str = DEFAULT_CACHE_PATH,
+        refresh_interval: timedelta = DEFAULT_REFRESH_INTERVAL,
+        url: str = HOLIDAY_CSV_URL,
+        timeout: float = 10
+    ):
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+        self.url = url
+        self.timeout = timeout
+        self.available = False      # 祝日データを1件でも読めたか
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._first_ordinal = 0
+        self._bits = bytearray()
+        self._count = 0
+
+    def __contains__(self, day: date) -> bool:
+        if not self._loaded:
+            self.load()
+        offset = day.toordinal() - self._first_ordinal
+        return 0 <= offset < len(self._bits) and self._bits[offset] == 1
+
+    def __len__(self) -> int:
+        if not self._loaded:
+            self.load()
+        return self._count
+
+    def load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            cached_dates, fetched_at = self._read_cache()
+            now = datetime.now(timezone.utc)
+            dates = cached_dates
+            if cached_dates is None or fetched_at is None or now - fetched_at >= self.refresh_interval:
+                fresh = self._fetch()
+                if fresh:
+                    dates = fresh
+                    self._write_cache(fresh, now)
+                elif cached_dates:
+                    logger.warning("祝日CSVの取得に失敗したため、前回のキャッシュを使用します（%d件）", len(cached_dates))
+
+            if dates:
+                self._set_dates(dates)
+                self.available = True
+            else:
+                logger.warning("警告: 祝日データがありません。すべての日を平日として扱います（is_holiday は False になります）")
+            self._loaded = True
+
+    def _set_dates(self, dates: Iterable[date]):
+        ordinals = sorted({d.toordinal() for d in dates})
+        self._first_ordinal = ordinals[0]
+        self._bits = bytearray(ordinals[-1] - ordinals[0] + 1)
+        for ordinal in ordinals:
+            self._bits[ordinal - self._first_ordinal] = 1
+        self._count = len(ordinals)
+
+    def _read_cache(self) -> tuple[Optional[list[date]], Optional[datetime]]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            dates = [date.fromisoformat(s) for s in data["dates"]]
+            return dates, datetime.fromisoformat(data["fetched_at"])
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def _write_cache(self, dates: list[date], fetched_at: datetime):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": fetched_at.isoformat(), "dates": [d.isoformat() for d in dates]}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning("祝日キャッシュの保存に失敗しました（無視します）: %s", e)
+
+    def _fetch(self) -> Optional[list[date]]:
+        try:
+            with urllib.request.urlopen(self.url, timeout=self.timeout) as resp:
+                text = resp.read().decode("shift_jis", errors="replace")
+            dates = parse_holiday_csv(text)
+            logger.info("内閣府祝日データをロード完了: %d件", len(dates))
+            return dates
+        except Exception as e:
+            logger.error("祝日CSV取得エラー: %s", e)
+            return None
+
+
+# プロセス全体で共有する祝日カレンダー
+japanese_holidays = JapaneseHolidayCalendar()
@@ -0,0 +1,260 @@
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+import time
+
+from googleapiclient.errors import HttpError
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from channel_scheduler import ChannelTarget
+from fetch_engine import DETAIL_SHAPE, QuotaBudget, QuotaExceededError, VIDEO_BATCH_SIZE, get_client_pool
+from http_cache import ResponseCache
+from instrumentation import run_metrics
+from mongo_writer import content_hash, ensure_timeseries_collection, normalize_value, write_docs_in_chunks
+from read_models import ReadModelChanges, refresh_read_models
+from request_masks import REQUEST_SHAPES
+from sync_logging import get_logger
+from youtubedataapi import YoutubeContentType, YoutubeVideoDetail, _build_video_detail
+
+logger = get_logger("live")
+
+# 監視対象にする live_status
+ACTIVE_LIVE_STATUSES = ("upcoming", "live")
+# videos().list が返さなくなった（削除・非公開になった）配信に付ける live_status（監視対象から外す）
+UNAVAILABLE_LIVE_STATUS = "none"
+
+# ライブ監視で書き換える videos のフィールド（それ以外は通常の同期に任せる）
+LIVE_FIELDS = (
+    "live_status",
+    "is_live_now",
+    "concurrent_viewers",
+    "scheduled_start_time",
+    "actual_start_time",
+    "actual_end_time",
+)
+
+# 同時視聴者数の時系列（1件 = ある時点の1配信の視聴者数）
+VIEWERS_COLLECTION = "live_viewers"
+
+# 新しい配信枠を見つけるために読む UULV の先頭件数
+LIVE_HEAD_SIZE = 5
+
+
+@dataclass
+class LivePollStats:
+    ticks: int = 0
+    tracked: int = 0            # 直近の tick で監視した配信数
+    updated: int = 0
+    inserted: int = 0
+    samples: int = 0
+    errors: int = 0
+
+
+class LivePoller:
+    """
+    配信予定・配信中の動画だけを短い間隔で問い合わせ、ライブ関連のフィールドだけを書き換える。
+    1回（tick）あたりの API 呼び出しはチャンネルごとに
+      1. UULV プレイリストの先頭（新しい配信枠の検出）
+      2. 監視中 + 新しい配信枠の videos().list（対象が無ければ呼ばない）
+    の最大2回（2ユニット）。
+    見つけた新しい配信枠は build_doc で作ったドキュメントとして保存し、分析フィールドなどは次回の通常の同期で埋める。
+    ライブ関連のフィールドを書き換えるときは content_hash も計算し直す（通常の同期の差分判定がずれないように）。
+    """
+
+    def __init__(
+        self,
+        client,
+        api_key: str,
+        targets: List[ChannelTarget],
+        build_doc: Callable[[YoutubeVideoDetail, str, str], dict],
+        cache: Optional[ResponseCache] = None,
+        budget: Optional[QuotaBudget] = None
+    ):
+        self._client = client
+        self._pool = get_client_pool(api_key, cache, budget)
+        self._targets = targets
+        self._build_doc = build_doc
+        # 通常の同期が content_hash を計算するフィールド（build_doc が作るドキュメントのキー）
+        self._doc_fields = tuple(build_doc(YoutubeVideoDetail(title="", video_id=""), "", ""))
+        self._jst = ZoneInfo("Asia/Tokyo")
+        self._channel_names: Dict[str, str] = {}
+        self._viewer_colls: Dict[str, object] = {}
+        self.stats = LivePollStats()
+
+    def run(self, interval_sec: float, duration_sec: float,
+            clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """interval_sec ごとに tick する。duration_sec を過ぎたら終了（0 なら1回だけ）"""
+        deadline = clock() + duration_sec
+        while True:
+            started = clock()
+            try:
+                self.tick()
+            except QuotaExceededError as e:
+                logger.error("ライブ監視を終了します: %s", e)
+                return
+            next_at = started + interval_sec
+            if next_at > deadline:
+                return
+            sleep(max(0.0, next_at - clock()))
+
+    def tick(self):
+        self.stats.ticks += 1
+        self.stats.tracked = 0
+        # 読み取り用コレクションはチャンネルごとではなく、tick の最後に DB ごとに変わった分をまとめて1回だけ
+        refresh_dbs: Dict[str, Tuple[object, ReadModelChanges]] = {}
+        with run_metrics.phase("live_poll"):
+            for target in self._targets:
+                _, changes = refresh_dbs.setdefault(
+                    target.db_name, (self._client[target.db_name], ReadModelChanges())
+                )
+                try:
+                    self._poll_channel(target, changes)
+                except HttpError as e:
+                    self.stats.errors += 1
+                    logger.error("[%s] ライブ状態の取得に失敗しました: %s", target.channel_id, e)
+                except PyMongoError as e:
+                    self.stats.errors += 1
+                    logger.error("[%s] ライブ状態の保存に失敗しました: %s", target.channel_id, e)
+            for db_name, (db, changes) in refresh_dbs.items():
+                if not changes:
+                    continue
+                try:
+                    refresh_read_models(db, changes=changes)
+                except PyMongoError as e:
+                    self.stats.errors += 1
+                    logger.error("%s: 読み取り用コレクションの更新に失敗しました: %s", db_name, e)
+
+    def _poll_channel(self, target: ChannelTarget, changes: ReadModelChanges):
+        """
+        1チャンネル分を問い合わせて保存する。一覧のカードに載るフィールドが変わった動画を changes に記録する
+        （視聴者数だけが変わった動画は記録されないので、読み取り用コレクションは作り直さない）。
+        """
+        db = self._client[target.db_name]
+        videos_coll = db["videos"]
+        youtube = self._pool.get()
+
+        # content_hash を計算し直すため、監視中の動画（数本）はドキュメント全体を読む
+        tracked = {
+            doc["_id"]: doc for doc in videos_coll.find(
+                {"channel_id": target.channel_id, "live_status": {"$in": list(ACTIVE_LIVE_STATUSES)}}
+            )
+        }
+
+        head_ids = self._live_head(youtube, target.channel_id)
+        new_ids: List[str] = []
+        unseen = [vid for vid in head_ids if vid not in tracked]
+        if unseen:
+            stored = {doc["_id"] for doc in videos_coll.find({"_id": {"$in": unseen}}, {"_id": 1})}
+            new_ids = [vid for vid in unseen if vid not in stored]
+
+        ids = list(tracked) + new_ids
+        if len(ids) > VIDEO_BATCH_SIZE:
+            logger.warning("[%s] 監視対象が %d 本あるため先頭 %d 本だけ問い合わせます",
+                           target.channel_id, len(ids), VIDEO_BATCH_SIZE)
+            ids = ids[:VIDEO_BATCH_SIZE]
+        self.stats.tracked += len(ids)
+        if not ids:
+            logger.debug("[%s] 配信予定・配信中の動画はありません", target.channel_id)
+            return
+
+        response = youtube.videos().list(id=",".join(ids), **REQUEST_SHAPES[DETAIL_SHAPE]).execute()
+
+        now = datetime.now(timezone.utc)
+        channel_name = self._channel_name(db, target.channel_id)
+        updates: List[UpdateOne] = []
+        new_docs: List[dict] = []
+        samples: List[InsertOne] = []
+        returned = set()
+        for item in response.get("items", []):
+            video = _build_video_detail(item, YoutubeContentType.LIVE, self._jst)
+            doc = self._build_doc(video, target.channel_id, channel_name)
+            returned.add(video.video_id)
+
+            stored = tracked.get(video.video_id)
+            if stored is None:
+                new_docs.append(doc)
+            else:
+                changed = {
+                    field: doc[field] for field in LIVE_FIELDS
+                    if normalize_value(doc[field]) != normalize_value(stored.get(field))
+                }
+                if changed:
+                    updates.append(self._live_update(stored, changed))
+                    changes.add_video(video.video_id, changed)
+
+            if video.is_live_now:
+                samples.append(InsertOne({
+                    "at": now,
+                    "meta": {"video_id": video.video_id, "channel_id": target.channel_id},
+                    "concurrent_viewers": video.concurrent_viewers,
+                }))
+
+        # 問い合わせたのに返ってこなかった配信は監視対象から外す（動画自体の整理は次回の通常の同期で行う）
+        missing = [vid for vid in ids if vid in tracked and vid not in returned]
+        for vid in missing:
+            stored = tracked[vid]
+            logger.info("[%s] %s は取得できませんでした（削除・非公開の可能性）。ライブ監視の対象から外します",
+                        target.channel_id, vid)
+            changed = {"live_status": UNAVAILABLE_LIVE_STATUS, "is_live_now": False, "concurrent_viewers": 0}
+            updates.append(self._live_update(stored, changed))
+            changes.add_video(vid, changed)
+
+        if updates:
+            videos_coll.bulk_write(updates, ordered=False)
+        if new_docs:
+            write_docs_in_chunks(videos_coll, new_docs, on_changes=changes.record_videos)
+        if samples:
+            self._viewers(db).bulk_write(samples, ordered=False)
+        self.stats.updated += len(updates)
+        self.stats.inserted += len(new_docs)
+        self.stats.samples += len(samples)
+        logger.info("[%s] ライブ監視: 対象 %d 本 / 更新 %d / 新しい配信枠 %d / 視聴者数 %d 件",
+                    target.channel_id, len(ids), len(updates), len(new_docs), len(samples),
+                    extra={"fields": {"channel_id": target.channel_id, "tracked": len(ids), "updated": len(updates),
+                                      "inserted": len(new_docs), "samples": len(samples)}})
+
+    def _live_update(self, stored: dict, changed: dict) -> UpdateOne:
+        """
+        changed（ライブ関連のフィールド）を $set する UpdateOne。content_hash は保存済みの内容に changed を
+        重ねたものから計算する（ライブ監視で作るドキュメントは分析フィールドが未計算なので、そのハッシュは使わない）。
+        """
+        merged = {**stored, **changed}
+        return UpdateOne({"_id": stored["_id"]}, {"$set": {
+            **changed,
+            "content_hash": content_hash({key: merged.get(key) for key in self._doc_fields}),
+            "last_updated": datetime.now(),
+        }})
+
+    def _live_head(self, youtube, channel_id: str) -> List[str]:
+        """UULV（ライブ配信のアップロード）の先頭の動画ID。プレイリストが無いチャンネルは空"""
+        try:
+            response = youtube.playlistItems().list(
+                playlistId=channel_id.replace("UC", "UULV", 1),
+                maxResults=LIVE_HEAD_SIZE,
+                **REQUEST_SHAPES["playlist_items"]
+            ).execute()
+        except HttpError as e:
+            if getattr(e, "status_code", None) == 404 or getattr(e.resp, "status", None) == 404:
+                return []
+            raise
+        return [item["contentDetails"]["videoId"] for item in response.get("items", [])]
+
+    def _channel_name(self, db, channel_id: str) -> str:
+        if channel_id not in self._channel_names:
+            doc = db["channels"].find_one({"channel_id": channel_id}, {"name": 1})
+            self._channel_names[channel_id] = doc.get("name", "") if doc else ""
+        return self._channel_names[channel_id]
+
+    def _viewers(self, db):
+        coll = self._viewer_colls.get(db.name)
+        if coll is None:
+            coll = ensure_timeseries_collection(db, VIEWERS_COLLECTION, "at", "meta")
+            self._viewer_colls[db.name] = coll
+        return coll
+
+    def summary(self) -> str:
+        s = self.stats
+        return (f"ライブ監視の結果: {s.ticks} 回 / 更新 {s.updated} 件 / 新しい配信枠 {s.inserted} 件 / "
+                f"視聴者数 {s.samples} 件 / エラー {s.errors} 回")
@@ -1,14 +1,38 @@
 from zoneinfo import ZoneInfo
 
-from youtubedataapi import Weekday, YoutubeContentType, YoutubeDataFind,YoutubeUser, YoutubeOrder, YoutubeVideoDetail,get_youtube_data,YoutubePlayData,match_videos_to_playlists
+from youtubedataapi import HOLIDAYS_CACHE, Weekday, YoutubeContentType, YoutubeDataFind,YoutubeUser, YoutubeOrder, YoutubeVideoDetail,get_youtube_data,YoutubePlayData,scan_playlist_members
 import argparse
 from pymongo import MongoClient, UpdateOne,DeleteOne
 from pymongo.server_api import ServerApi
 from pymongo.errors import ConfigurationError, PyMongoError
 import urllib.parse
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+from contextlib import contextmanager
 import traceback
+import os
+import copy
+import threading
+import time
+
+from http_cache import DiskResponseCache
+from video_table import VideoTable
+from analytics import compute_broadcast_patterns
+from mongo_writer import channel_scope, delete_stale_docs, write_docs_in_chunks
+from fetch_engine import QuotaBudget
+from instrumentation import run_metrics
+from channel_scheduler import ChannelTarget, load_channel_targets, print_run_summary, rank_channels, run_channels
+from sync_logging import configure_logging, get_logger
+from retry_policy import configure_retry
+from sync_progress import FetchProgress, ensure_progress_indexes, find_resumable_progress
+# ライブ監視・統計の集計・読み取り用コレクション・静的JSON・サムネイル・再生リストの所属は
+# そのモード / 処理でだけ使うので、使う関数の中で読み込む（起動時間を抑える。startup_check.py）
+
+logger = get_logger("main")
+
+# 複数チャンネルの同期中に作り直しを保留している DB（DB名 → (db, chunk_size)）。None なら保留せずその場で作り直す
+_deferred_read_models: Optional[Dict[str, tuple]] = None
+_deferred_read_models_lock = threading.Lock()
 
 class ArgsKey:
     api_key: str = "None"
@@ -18,6 +42,33 @@ class ArgsKey:
     mongo_password: str = "None"
     db_name: str = "youtube_data"
     is_playlist_update : bool = False
+    recompute_analytics : bool = False
+    incremental : bool = False
+    full_sync_interval_hours : float = 24
+    workers : int = 4
+    write_chunk_size : int = 500
+    http_cache_dir : str = ".cache/youtube_api"
+    http_cache_ttl_hours : float = 72
+    http_cache_max_mb : int = 200
+    channel_ids : str = ""
+    channels_file : str = ""
+    channel_workers : int = 2
+    quota_budget : int = 0
+    metrics_file : str = ""
+    log_level : str = "INFO"
+    log_json : str = ""
+    max_retries : int = 5
+    api_rate_limit : float = 0
+    max_delete_ratio : float = 0.2
+    live_poll : bool = False
+    poll_interval_sec : float = 60
+    poll_duration_min : float = 40
+    rollup_stats : bool = False
+    rollup_days : int = 3
+    export_dir : str = ""
+    thumbnail_dir : str = ""
+    thumbnail_workers : int = 8
+    resume : bool = False
 
 def build_mongo_uri(base_uri: str, user: str, password: str) -> str:
     """mongodb+srv:// 形式のベースURIにユーザー名・パスワードを安全に挿入"""
@@ -30,7 +81,7 @@ def build_mongo_uri(base_uri: str, user: str, password: str) -> str:
     # mongodb+srv://[user:pass@]host...
     if "@" in base_uri:
         # 既にユーザー情報が入っている場合は警告
-        print("警告: mongo_base_uri に既にユーザー名/パスワードが含まれているようです。base_uriはユーザー抜きで指定してください。")
+        logger.warning("警告: mongo_base_uri に既にユーザー名/パスワードが含まれているようです。base_uriはユーザー抜きで指定してください。")
     
     # ホスト部分の前に挿入
     uri = base_uri.replace("mongodb+srv://", f"mongodb+srv://{encoded_user}:{encoded_pass}@", 1)
@@ -53,13 +104,13 @@ def get_mongo_client(uri: str) -> Optional[MongoClient]:
         )
         # 接続テスト
         client.admin.command('ping')
-        print("MongoDB Atlas に接続成功しました")
+        logger.info("MongoDB Atlas に接続成功しました")
         return client
     except ConfigurationError as e:
-        print(f"接続設定エラー（URIやネットワークを確認）: {e}")
+        logger.error("接続設定エラー（URIやネットワークを確認）: %s", e)
         return None
     except Exception as e:
-        print(f"MongoDB接続中に予期しないエラー: {e}")
+        logger.error("MongoDB接続中に予期しないエラー: %s", e)
         traceback.print_exc()
         return None
 
@@ -68,97 +119,173 @@ def ensure_indexes(db):
     try:
         videos_coll = db["videos"]
         videos_coll.create_index([("channel_name", 1), ("published_at", -1)])
+        videos_coll.create_index([("channel_id", 1), ("published_at", -1)])
+        videos_coll.create_index([("channel_id", 1), ("live_status", 1)])
         videos_coll.create_index("_id", unique=True)
         
         channels_coll = db["channels"]
         channels_coll.create_index("channel_id", 
                                    unique=True)
+
+        videos_coll.create_index([("playlist_ids", 1), ("published_at", -1)])
+
+        db["playlists"].create_index("channel_id")
+        db["playlists"].create_index("title")
+
+        # 再生リストXの動画を並び順で / 動画Yが入っている再生リストを引く
+        from playlist_members import MEMBERS_COLLECTION
+        members_coll = db[MEMBERS_COLLECTION]
+        members_coll.create_index([("playlist_id", 1), ("position", 1)])
+        members_coll.create_index("video_id")
+        members_coll.create_index("channel_id")
+
+        # カードを差し替えるページ・再生リスト一覧を動画IDで引く（read_models._patch_cards）
+        from read_models import PAGES_COLLECTION, PLAYLIST_LISTS_COLLECTION
+        db[PAGES_COLLECTION].create_index("videos._id")
+        db[PLAYLIST_LISTS_COLLECTION].create_index("videos._id")
+
+        ensure_progress_indexes(db)
         
-        print("インデックス作成/確認完了")
+        logger.info("インデックス作成/確認完了")
     except PyMongoError as e:
-        print(f"インデックス作成中にエラー（既存なら無視可）: {e}")
+        logger.error("インデックス作成中にエラー（既存なら無視可）: %s", e)
 
-def load_from_mongodb(
+def to_jst(dt: Optional[datetime]) -> Optional[datetime]:
+    """MongoDBから読んだnaive(UTC)なdatetimeをJSTのaware datetimeに揃える"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(ZoneInfo("Asia/Tokyo"))
+
+def load_sync_checkpoint(client: MongoClient, db_name: str, channel_id: str) -> Optional[dict]:
+    """channels コレクションから前回の同期チェックポイントを取得"""
+    channel_doc = client[db_name]["channels"].find_one(
+        {"channel_id": channel_id},
+        {"sync_checkpoint": 1}
+    )
+    if not channel_doc:
+        return None
+    return channel_doc.get("sync_checkpoint")
+
+def video_from_doc(doc: dict) -> YoutubeVideoDetail:
+    """videos コレクションのドキュメント → YoutubeVideoDetail（射影で省かれたフィールドは既定値）"""
+    # Enumはvalueから逆引き（存在しない場合はUNKNOWN）
+    content_cat = YoutubeContentType.UNKNOWN
+    content_str = YoutubeContentType(doc.get("content_category", "unknown"))
+    if content_str.name == "LIVE":
+        content_cat = YoutubeContentType.LIVE
+    elif content_str.name == "NORMAL_VIDEO":
+        content_cat = YoutubeContentType.NORMAL_VIDEO
+    elif content_str.name == "SHORTS":
+        content_cat = YoutubeContentType.SHORTS
+        
+    weekday_val = doc.get("weekday")
+    weekday = Weekday(weekday_val) if weekday_val is not None else None
+
+    return YoutubeVideoDetail(
+        title=doc.get("title", ""),
+        video_id=doc["_id"],
+        published_at=to_jst(doc.get("published_at")),
+        view_count=doc.get("view_count", 0),
+        like_count=doc.get("like_count", 0),
+        comment_count=doc.get("comment_count", 0),
+        duration_sec=doc.get("duration_sec", 0.0),
+        thumbnail_url=doc.get("thumbnail_url", ""),
+        playlist_titles=doc.get("playlist_titles", []),  # ← ここに所属再生リストが入る
+
+        # ライブ関連（NoneのままでもOK）
+        is_live_now=doc.get("is_live_now", False),
+        live_status=doc.get("live_status", "none"),
+        scheduled_start_time=to_jst(doc.get("scheduled_start_time")),
+        actual_start_time=to_jst(doc.get("actual_start_time")),
+        actual_end_time=to_jst(doc.get("actual_end_time")),
+        concurrent_viewers=doc.get("concurrent_viewers", 0),
+
+        # 分析フィールド
+        is_holiday=doc.get("is_holiday", False),
+        weekday=weekday,
+        consecutive_broadcast_days=doc.get("consecutive_broadcast_days", 1),
+        same_day_broadcast_count=doc.get("same_day_broadcast_count", 1),
+        days_since_last_broadcast=doc.get("days_since_last_broadcast", 0),
+        was_broadcast_yesterday=doc.get("was_broadcast_yesterday", False),
+
+        # Enum
+        content_category=content_cat
+    )
+
+def iter_videos_from_mongodb(
     client: MongoClient,
     db_name: str = "youtube_data",
-    channel_id: Optional[str] = None
-) -> tuple[List[YoutubeVideoDetail], List[YoutubePlayData],YoutubeUser]:
+    channel_id: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    batch_size: int = 500
+) -> Iterator[YoutubeVideoDetail]:
     """
-    MongoDB から videos と playlists コレクションを読み込み、
-    YoutubeVideoDetail と YoutubePlayData のリストに変換して返す
+    videos コレクションを公開日の新しい順に1件ずつ YoutubeVideoDetail にして返す（遅延読み込み）。
+    fields を指定するとそのフィールドだけを転送する（_id は常に含まれる）。
+    channel_id を指定するとそのチャンネルの動画だけを読む。
     """
-    db = client[db_name]
-    jst = ZoneInfo("Asia/Tokyo")
-
-    # 1. 動画リスト
-    videos_coll = db["videos"]
-    video_docs = videos_coll.find().sort("published_at", -1)
-
-    video_list: List[YoutubeVideoDetail] = []
-
-    for doc in video_docs:
-        # Enumはvalueから逆引き（存在しない場合はUNKNOWN）
-        content_cat = YoutubeContentType.UNKNOWN
-        content_str = YoutubeContentType(doc.get("content_category", "unknown"))
-        if content_str.name == "LIVE":
-            content_cat = YoutubeContentType.LIVE
-        elif content_str.name == "NORMAL_VIDEO":
-            content_cat = YoutubeContentType.NORMAL_VIDEO
-        elif content_str.name == "SHORTS":
-            content_cat = YoutubeContentType.SHORTS
-            
-        weekday_val = doc.get("weekday")
-        weekday = Weekday(weekday_val) if weekday_val is not None else None
-
-        video = YoutubeVideoDetail(
-            title=doc.get("title", ""),
-            video_id=doc["_id"],
-            published_at=doc.get("published_at"),
-            view_count=doc.get("view_count", 0),
-            like_count=doc.get("like_count", 0),
-            comment_count=doc.get("comment_count", 0),
-            duration_sec=doc.get("duration_sec", 0.0),
-            thumbnail_url=doc.get("thumbnail_url", ""),
-            playlist_titles=doc.get("playlist_titles", []),  # ← ここに所属再生リストが入る
-
-            # ライブ関連（NoneのままでもOK）
-            is_live_now=doc.get("is_live_now", False),
-            live_status=doc.get("live_status", "none"),
-            scheduled_start_time=doc.get("scheduled_start_time"),
-            actual_start_time=doc.get("actual_start_time"),
-            actual_end_time=doc.get("actual_end_time"),
-            concurrent_viewers=doc.get("concurrent_viewers", 0),
-
-            # 分析フィールド
-            is_holiday=doc.get("is_holiday", False),
-            weekday=weekday,
-            consecutive_broadcast_days=doc.get("consecutive_broadcast_days", 1),
-            same_day_broadcast_count=doc.get("same_day_broadcast_count", 1),
-            days_since_last_broadcast=doc.get("days_since_last_broadcast", 0),
-            was_broadcast_yesterday=doc.get("was_broadcast_yesterday", False),
-
-            # Enum
-            content_category=content_cat
-        )
-        video_list.append(video)
-
-    # 2. プレイリストリスト
-    playlists_coll = db["playlists"]
-    pl_docs = playlists_coll.find({}).sort("published_at", -1)
+    videos_coll = client[db_name]["videos"]
+    query = channel_scope(channel_id) if channel_id else {}
+    projection = {name: 1 for name in fields} if fields else None
 
-    playlist_list: List[YoutubePlayData] = []
+    cursor = videos_coll.find(query, projection).sort("published_at", -1).batch_size(batch_size)
+    for doc in cursor:
+        yield video_from_doc(doc)
 
-    for doc in pl_docs:
-        pl = YoutubePlayData(
+def load_playlists_from_mongodb(
+    client: MongoClient,
+    db_name: str = "youtube_data",
+    channel_id: Optional[str] = None
+) -> List[YoutubePlayData]:
+    """MongoDB の playlists コレクションを YoutubePlayData のリストとして読み込む（公開日の新しい順）"""
+    pl_query = channel_scope(channel_id) if channel_id else {}
+    return [
+        YoutubePlayData(
             title=doc.get("title", ""),
             playlist_id=doc["_id"],
             video_count=doc.get("video_count", 0),
             published_at=doc.get("published_at"),
-            thumbnails=doc.get("thumbnails", "")
+            thumbnails=doc.get("thumbnails", ""),
+            etag=doc.get("etag", ""),
+            scanned_etag=doc.get("scanned_etag", ""),
+            scanned_video_count=doc.get("scanned_video_count"),
+            member_video_ids=doc.get("member_video_ids", [])
         )
-        playlist_list.append(pl)
+        for doc in client[db_name]["playlists"].find(pl_query).sort("published_at", -1)
+    ]
+
+def load_from_mongodb(
+    client: MongoClient,
+    db_name: str = "youtube_data",
+    channel_id: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    lazy: bool = False,
+    as_table: bool = False
+) -> tuple[Iterable[YoutubeVideoDetail], List[YoutubePlayData],YoutubeUser]:
+    """
+    MongoDB から videos と playlists コレクションを読み込み、
+    YoutubeVideoDetail と YoutubePlayData のリストに変換して返す。
+    lazy=True の場合、動画はリストではなく遅延イテレータで返す（件数の表示は省略）。
+    as_table=True の場合、動画は列指向の VideoTable で返す（dataclass のリストを作らない）。
+    """
+    db = client[db_name]
+
+    # 1. 動画リスト
+    video_iter = iter_videos_from_mongodb(client, db_name, channel_id, fields)
+    if as_table:
+        video_list = VideoTable.from_details(video_iter)
+    else:
+        video_list = video_iter if lazy else list(video_iter)
+
+    # 2. プレイリストリスト
+    playlist_list = load_playlists_from_mongodb(client, db_name, channel_id)
 
-    print(f"動画: {len(video_list)}件、プレイリスト: {len(playlist_list)}件 読み込み完了")
+    if lazy:
+        logger.info("プレイリスト: %d件 読み込み完了（動画は遅延読み込み）", len(playlist_list))
+    else:
+        logger.info("動画: %d件、プレイリスト: %d件 読み込み完了", len(video_list), len(playlist_list))
     
     # 3. チャンネル情報（必要に応じて）
     channel_info = None
@@ -170,27 +297,65 @@ def load_from_mongodb(
                     name=channel_doc.get("name", ""),
                     followers=channel_doc.get("followers", 0)
                 )
-                print(f"チャンネル情報も読み込みました: {channel_info.name} ({channel_info.followers} subscribers)")
+                logger.info("チャンネル情報も読み込みました: %s (%s subscribers)", channel_info.name, channel_info.followers)
             else:
-                print(f"チャンネルID {channel_id} に対応する情報が見つかりませんでした")
+                logger.warning("チャンネルID %s に対応する情報が見つかりませんでした", channel_id)
 
     return video_list, playlist_list, channel_info
     
+def build_video_doc(video: YoutubeVideoDetail, channel_id: str, channel_name: str) -> dict:
+    """YoutubeVideoDetail → videos コレクションのドキュメント（None値は0などに揃える）"""
+    doc = {
+        "_id": video.video_id,
+        "channel_id": channel_id,
+        "channel_name": channel_name,
+        "title": video.title,
+        "published_at": video.published_at,
+        "view_count": video.view_count if video.view_count is not None else 0,
+        "like_count": video.like_count if video.like_count is not None else 0,
+        "comment_count": video.comment_count if video.comment_count is not None else 0,
+        "duration_sec": video.duration_sec if video.duration_sec is not None else 0.0,
+        "url": video.url,
+        "content_category": video.content_category.value if video.content_category else "unknown",
+        "is_holiday": video.is_holiday,
+        "weekday": video.weekday.value if video.weekday else None,
+        "consecutive_broadcast_days": video.consecutive_broadcast_days,
+        "same_day_broadcast_count": video.same_day_broadcast_count,
+        "days_since_last_broadcast": video.days_since_last_broadcast,
+        "was_broadcast_yesterday": video.was_broadcast_yesterday,
+        "live_status": video.live_status,
+        "is_live_now": video.is_live_now,
+        "concurrent_viewers": video.concurrent_viewers if video.concurrent_viewers is not None else 0,
+        "scheduled_start_time": video.scheduled_start_time,
+        "actual_start_time": video.actual_start_time,
+        "actual_end_time": video.actual_end_time,
+        "thumbnail_url": video.thumbnail_url,
+    }
+    # 所属再生リストは分かっている場合だけ保存（空なら既存の値を残す）
+    if video.playlist_titles:
+        doc["playlist_titles"] = video.playlist_titles
+    return doc
+
 def save_to_mongodb(
     
     client: MongoClient,
     channel_id: str,
     db_name: str,
     youtubeuser,
-    videos: List[YoutubeVideoDetail],
-    playList : List[YoutubePlayData]
-):
+    videos: Iterable[YoutubeVideoDetail],
+    playList : List[YoutubePlayData],
+    sync_checkpoint: Optional[dict] = None,
+    chunk_size: int = 500,
+    max_delete_ratio: Optional[float] = 0.2
+) -> bool:
+    """チャンネル・動画・再生リストを保存する。書き込みに失敗した部分があれば False を返す"""
     if not client:
-        print("MongoDBクライアントが無効です。保存をスキップします")
-        return
+        logger.warning("MongoDBクライアントが無効です。保存をスキップします")
+        return False
 
     db = client[db_name]
     ensure_indexes(db)  # 初回実行時にインデックス作成
+    saved = True
 
     # ── 1. チャンネル情報保存 ──
     channels_coll = db["channels"]
@@ -205,141 +370,204 @@ def save_to_mongodb(
         "last_fetched": datetime.utcnow()
     }
 
+    # 取得が欠けている場合は不要データの削除を行わない（欠けた分を削除と誤認しないため）
+    partial = bool(sync_checkpoint and sync_checkpoint.get("partial"))
+
+    # 差分同期のチェックポイント（フルスキャン時刻は欠けのない full 実行時だけ更新する）
+    if sync_checkpoint:
+        for key, value in sync_checkpoint.items():
+            channel_doc[f"sync_checkpoint.{key}"] = value
+        if sync_checkpoint.get("mode") == "full" and not partial:
+            channel_doc["sync_checkpoint.last_full_sync_at"] = sync_checkpoint.get("synced_at")
+
     channels_coll.update_one(
         channel_filter,
         {"$set": channel_doc},
         upsert=True
     )
     
-    print(f"チャンネル情報を保存/更新しました: {youtubeuser.name} ({youtubeuser.followers} subscribers)")
+    logger.info("チャンネル情報を保存/更新しました: %s (%s subscribers)", youtubeuser.name, youtubeuser.followers)
 
 
-    # ── 2. 動画情報保存（Bulkで効率的に） ──
+    # ── 2. 動画情報保存（保存済みの内容と比較し、変わったフィールドだけチャンク単位で Bulk 更新） ──
+    # videos はジェネレータでもよい（全件をリストにためない）
     videos_coll = db["videos"]
-    operations = []
-
-    for video in videos:
-        # None値を適切に扱う
-        doc = None
-        if len(video.playlist_titles) == 0:
-            doc = {
-                "_id": video.video_id,
-                "channel_name": youtubeuser.name,
-                "title": video.title,
-                "published_at": video.published_at,
-                "view_count": video.view_count if video.view_count is not None else 0,
-                "like_count": video.like_count if video.like_count is not None else 0,
-                "comment_count": video.comment_count if video.comment_count is not None else 0,
-                "duration_sec": video.duration_sec if video.duration_sec is not None else 0.0,
-                "url": video.url,
-                "content_category": video.content_category.value if video.content_category else "unknown",
-                "is_holiday": video.is_holiday,
-                "weekday": video.weekday.value if video.weekday else None,
-                "consecutive_broadcast_days": video.consecutive_broadcast_days,
-                "same_day_broadcast_count": video.same_day_broadcast_count,
-                "days_since_last_broadcast": video.days_since_last_broadcast,
-                "was_broadcast_yesterday": video.was_broadcast_yesterday,
-                "live_status": video.live_status,
-                "is_live_now": video.is_live_now,
-                "concurrent_viewers": video.concurrent_viewers if video.concurrent_viewers is not None else 0,
-                "scheduled_start_time": video.scheduled_start_time,
-                "actual_start_time": video.actual_start_time,
-                "actual_end_time": video.actual_end_time,
-                "thumbnail_url": video.thumbnail_url,
-                "last_updated": datetime.now(),
-            }
-        else:
-            doc = {
-                "_id": video.video_id,
-                "channel_name": youtubeuser.name,
-                "title": video.title,
-                "published_at": video.published_at,
-                "view_count": video.view_count if video.view_count is not None else 0,
-                "like_count": video.like_count if video.like_count is not None else 0,
-                "comment_count": video.comment_count if video.comment_count is not None else 0,
-                "duration_sec": video.duration_sec if video.duration_sec is not None else 0.0,
-                "url": video.url,
-                "content_category": video.content_category.value if video.content_category else "unknown",
-                "is_holiday": video.is_holiday,
-                "weekday": video.weekday.value if video.weekday else None,
-                "consecutive_broadcast_days": video.consecutive_broadcast_days,
-                "same_day_broadcast_count": video.same_day_broadcast_count,
-                "days_since_last_broadcast": video.days_since_last_broadcast,
-                "was_broadcast_yesterday": video.was_broadcast_yesterday,
-                "live_status": video.live_status,
-                "is_live_now": video.is_live_now,
-                "concurrent_viewers": video.concurrent_viewers if video.concurrent_viewers is not None else 0,
-                "scheduled_start_time": video.scheduled_start_time,
-                "actual_start_time": video.actual_start_time,
-                "actual_end_time": video.actual_end_time,
-                "thumbnail_url": video.thumbnail_url,
-                "playlist_titles": video.playlist_titles,  # ← 所属再生リストも保存
-                "last_updated": datetime.now(),
-                
-            }
-
-        operations.append(
-            UpdateOne(
-                {"_id": video.video_id},
-                {"$set": doc},
-                upsert=True
-            )
-        )
-        
-    latest_video_ids = [video.video_id for video in videos]
+    docs = (build_video_doc(video, channel_id, youtubeuser.name) for video in videos)
 
-    if operations:
-        try:
-            result = videos_coll.bulk_write(operations, ordered=False)
-            delete_result = videos_coll.delete_many({
-                                "_id": {"$nin": latest_video_ids}
-                            })
-
-            
-            print(f"動画保存結果:")
-            print(f"  - 挿入（新規）   : {result.upserted_count} 件")
-            print(f"  - 更新（既存）   : {result.modified_count} 件")
-            print(f"  - 削除（不要）   : {delete_result.deleted_count} 件")
-        except PyMongoError as e:
-            print(f"Bulk write エラー: {e}")
-            traceback.print_exc()
-    else:
-        print("保存する動画がありません")
+    # 変わった動画・再生リストを記録し、読み取り用コレクションはその分だけ作り直す
+    from read_models import ReadModelChanges
+    changes = ReadModelChanges()
+    try:
+        # 統計値が変わった動画だけ履歴（video_stats_history）にスナップショットを追記する
+        from stats_history import StatsHistoryRecorder
+        history = StatsHistoryRecorder(db, channel_id)
+
+        def on_video_changes(batch):
+            history(batch)
+            changes.record_videos(batch)
+
+        latest_video_ids, counts = write_docs_in_chunks(videos_coll, docs, chunk_size, on_changes=on_video_changes)
+        if latest_video_ids:
+            deleted_count = 0
+            if partial:
+                logger.warning("取得結果が欠けているため、動画の削除はスキップします")
+            else:
+                deleted_count = delete_stale_docs(videos_coll, channel_scope(channel_id), latest_video_ids,
+                                                  max_delete_ratio=max_delete_ratio)
+
+            logger.info("動画保存結果:")
+            logger.info("  - 挿入（新規）   : %d 件", counts['inserted'])
+            logger.info("  - 更新（変更あり）: %d 件", counts['updated'])
+            logger.info("  - 変更なし       : %d 件", counts['unchanged'])
+            logger.info("  - 削除（不要）   : %d 件", deleted_count)
+            logger.info("  - 統計の履歴     : %d 件", history.recorded)
+            # 削除した動画がどの一覧に載っていたかは分からないので全体を作り直す
+            changes.full = changes.full or bool(deleted_count)
+        else:
+            logger.info("保存する動画がありません")
+    except PyMongoError as e:
+        saved = False
+        # 書き込めたチャンクのどれが記録されたか分からないので全体を作り直す
+        changes.full = True
+        logger.error("Bulk write エラー: %s", e)
+        traceback.print_exc()
     
-    videos_coll = db["playlists"]
-    operations = []
-    for playlist in playList:
-        doc = {
+    playlists_coll = db["playlists"]
+    docs = (
+        {
             "_id": playlist.playlist_id,
+            "channel_id": channel_id,
             "title": playlist.title,
             "video_count": playlist.video_count,
             "published_at": playlist.published_at,
             "thumbnails": playlist.thumbnails,
-            "last_updated": datetime.now()
+            "etag": playlist.etag,
         }
-        operations.append(
-            UpdateOne(
-                {"_id": playlist.playlist_id},
-                {"$set": doc},
-                upsert=True
-            )
+        for playlist in playList
+    )
+    try:
+        latest_playlist_ids, counts = write_docs_in_chunks(playlists_coll, docs, chunk_size,
+                                                           on_changes=changes.record_playlists)
+        if latest_playlist_ids:
+            deleted_count = delete_stale_docs(playlists_coll, channel_scope(channel_id), latest_playlist_ids,
+                                              max_delete_ratio=max_delete_ratio)
+            logger.info("プレイリスト保存結果:")
+            logger.info("  - 挿入（新規）   : %d 件", counts['inserted'])
+            logger.info("  - 更新（変更あり）: %d 件", counts['updated'])
+            logger.info("  - 変更なし       : %d 件", counts['unchanged'])
+            logger.info("  - 削除（不要）   : %d 件", deleted_count)
+            changes.full = changes.full or bool(deleted_count)
+        else:
+            logger.info("保存するプレイリストがありません")
+    except PyMongoError as e:
+        saved = False
+        changes.full = True
+        logger.error("Bulk write エラー: %s", e)
+        traceback.print_exc()
+
+    # 動画か再生リスト（名前の変更を含む）が変わったときだけ一覧ページ・再生リスト一覧・チャンネル集計を作り直す
+    if changes:
+        update_read_models(db, chunk_size, changes)
+    return saved
+
+def update_read_models(db, chunk_size: int = 500, changes=None):
+    """
+    読み取り用コレクション（read_models）を作り直す。失敗しても同期は続ける。
+    changes（read_models.ReadModelChanges）を渡すと、変わった動画・再生リストの分だけ作り直す（None = 全体）。
+    defer_read_models() の中では作り直さず、DB ごとに変更をまとめて記録し、抜けるときに1回だけ作り直す。
+    """
+    with _deferred_read_models_lock:
+        if _deferred_read_models is not None:
+            pending = _deferred_read_models.get(db.name)
+            if pending is not None:
+                pending_changes = pending[2]
+                if pending_changes is None or changes is None:
+                    changes = None
+                else:
+                    pending_changes.merge(changes)
+                    changes = pending_changes
+            _deferred_read_models[db.name] = (db, chunk_size, changes)
+            return
+    _refresh_read_models(db, chunk_size, changes)
+
+def _refresh_read_models(db, chunk_size: int, changes=None):
+    from read_models import refresh_read_models
+    try:
+        with run_metrics.phase("read_models"):
+            refresh_read_models(db, chunk_size, changes)
+    except PyMongoError as e:
+        logger.error("読み取り用コレクションの更新に失敗しました: %s", e)
+        traceback.print_exc()
+
+@contextmanager
+def defer_read_models():
+    """
+    この中で要求された読み取り用コレクションの作り直しを、抜けるときに DB ごと1回にまとめる。
+    refresh_read_models は一覧を DB 全体の動画から作り直し、どのチャンネルにも無いページを削除するので、
+    同じ DB のチャンネルを並行して同期している間に実行すると、別のチャンネルの書き込みと競合する。
+    """
+    global _deferred_read_models
+    with _deferred_read_models_lock:
+        _deferred_read_models = {}
+    try:
+        yield
+    finally:
+        with _deferred_read_models_lock:
+            pending, _deferred_read_models = _deferred_read_models, None
+        for db, chunk_size, changes in pending.values():
+            _refresh_read_models(db, chunk_size, changes)
+
+def save_playlist_members(
+    client: MongoClient,
+    db_name: str,
+    channel_id: Optional[str],
+    playlists: List[YoutubePlayData],
+    chunk_size: int = 500
+):
+    """
+    再生リスト更新モード用: 所属（playlist_members）と videos.playlist_ids の変わったものだけを書き込む。
+    射影で読み込んだ動画を save_to_mongodb に渡すと省いたフィールドが既定値で上書きされるため、こちらを使う。
+    """
+    from playlist_members import save_playlist_membership
+    from read_models import ReadModelChanges
+    db = client[db_name]
+    changes = ReadModelChanges()
+    try:
+        counts = save_playlist_membership(db, channel_id, playlists, chunk_size,
+                                          on_video_change=changes.record_membership)
+        logger.info("再生リストの所属: 新規 %d / 更新 %d / 削除 %d 件",
+                    counts["members_inserted"], counts["members_updated"], counts["members_deleted"])
+        logger.info("所属再生リストを更新した動画: %d 件", counts['videos_updated'])
+        # 一覧は videos.playlist_ids から作るので、所属の位置だけが変わった場合は作り直さない
+        if changes:
+            update_read_models(db, chunk_size, changes)
+    except PyMongoError as e:
+        logger.error("Bulk write エラー: %s", e)
+        traceback.print_exc()
+
+def save_playlist_scan_state(client: MongoClient, db_name: str, playlists: List[YoutubePlayData]):
+    """scan_playlist_members で走査し直した再生リストの所属動画IDを保存（次回の再利用用）"""
+    operations = [
+        UpdateOne(
+            {"_id": pl.playlist_id},
+            {"$set": {
+                "member_video_ids": pl.member_video_ids,
+                "scanned_etag": pl.scanned_etag,
+                "scanned_video_count": pl.scanned_video_count,
+                "members_scanned_at": datetime.utcnow(),
+            }}
         )
-    latest_playlist_ids = [playlist.playlist_id for playlist in playList]
-    if operations:
-        try:
-            result = videos_coll.bulk_write(operations, ordered=False)
-            delete_result = videos_coll.delete_many({
-                                "_id": {"$nin": latest_playlist_ids}
-                            })
-            print(f"プレイリスト保存結果:")
-            print(f"  - 挿入（新規）   : {result.upserted_count} 件")
-            print(f"  - 更新（既存）   : {result.modified_count} 件")
-            print(f"  - 削除（不要）   : {delete_result.deleted_count} 件")
-        except PyMongoError as e:
-            print(f"Bulk write エラー: {e}")
-            traceback.print_exc()
-    else:
-        print("保存するプレイリストがありません")
+        for pl in playlists if pl.member_scan_updated
+    ]
+    if not operations:
+        logger.info("走査し直した再生リストはありません")
+        return
+    try:
+        result = client[db_name]["playlists"].bulk_write(operations, ordered=False)
+        logger.info("再生リストの走査結果を保存しました: %d 件", result.modified_count)
+    except PyMongoError as e:
+        logger.error("Bulk write エラー: %s", e)
+        traceback.print_exc()
 
 def main():
     
@@ -348,7 +576,11 @@ def main():
         description="YouTube Data API で動画情報を取得し、MongoDB Atlas に保存します（URIを短く保つ設計）"
     )
     parser.add_argument("--api_key", "-api", type=str, required=True, help="YouTube Data APIキー")
-    parser.add_argument("--channel_id", "-c", type=str, required=True, help="対象のYouTubeチャンネルID")
+    parser.add_argument("--channel_id", "-c", type=str, default=None, help="対象のYouTubeチャンネルID")
+    parser.add_argument("--channel_ids", "-cs", type=str, default=None,
+                        help="複数チャンネルをまとめて同期する場合のチャンネルID（カンマ区切り）")
+    parser.add_argument("--channels_file", "-cf", type=str, default=None,
+                        help="同期対象チャンネルのJSONファイル（IDの配列、または {channel_id, db_name} の配列）")
     
     parser.add_argument("--mongo_base_uri", "-mu", type=str, required=True,
                         help="MongoDB AtlasのベースURI（ユーザー/パスワード抜き）例: mongodb+srv://cluster0.abcde.mongodb.net/")
@@ -357,72 +589,318 @@ def main():
     
     parser.add_argument("--db_name", "-dbn", type=str, default="youtube_data", help="使用するデータベース名（デフォルト: youtube_data）")
     parser.add_argument("--is_playlist_update", "-plu", action="store_true",default=False,help="プレイリスト情報も更新する場合はこのフラグを付ける")
+    parser.add_argument("--recompute_analytics", "-ra", action="store_true", default=False,
+                        help="YouTube APIを呼ばず、MongoDBの動画から配信傾向の分析フィールドだけ再計算して保存する")
+    parser.add_argument("--incremental", "-inc", action="store_true", default=False,
+                        help="差分同期（新着動画の詳細と再取得時期が来た動画の統計だけ取得）")
+    parser.add_argument("--full_sync_interval_hours", "-fsi", type=float, default=24,
+                        help="差分同期でも前回のフル同期からこの時間が経過していればフル同期する（デフォルト: 24）")
+    parser.add_argument("--write_chunk_size", "-wcs", type=int, default=500,
+                        help="MongoDB への bulk_write を何件ずつ行うか（デフォルト: 500）")
+    parser.add_argument("--workers", "-w", type=int, default=4,
+                        help="YouTube API を並列に呼び出すワーカー数（デフォルト: 4）")
+    parser.add_argument("--http_cache_dir", "-hcd", type=str, default=".cache/youtube_api",
+                        help="YouTube API レスポンスキャッシュの保存先（空文字でキャッシュ無効）")
+    parser.add_argument("--http_cache_ttl_hours", "-hct", type=float, default=72,
+                        help="レスポンスキャッシュの有効期間（時間、デフォルト: 72）")
+    parser.add_argument("--http_cache_max_mb", "-hcm", type=int, default=200,
+                        help="レスポンスキャッシュの最大サイズ（MB、デフォルト: 200）")
+    parser.add_argument("--channel_workers", "-cw", type=int, default=2,
+                        help="複数チャンネルを同時に同期する数（デフォルト: 2）")
+    parser.add_argument("--quota_budget", "-qb", type=int, default=0,
+                        help="この実行で使ってよいAPIクォータ（ユニット、全チャンネル共通。0 = 制限なし）")
+    parser.add_argument("--metrics_file", "-mf", type=str, default=None,
+                        help="APIリクエストとフェーズ時間の集計を書き出すファイル（.prom ならPrometheus形式、それ以外はJSON）")
+    parser.add_argument("--max_retries", "-mr", type=int, default=5,
+                        help="429 / 5xx / 接続エラー時の最大試行回数（初回を含む、デフォルト: 5）")
+    parser.add_argument("--api_rate_limit", "-arl", type=float, default=0,
+                        help="YouTube API への全スレッド合計のリクエスト数の上限（件/秒、0 = 制限なし）")
+    parser.add_argument("--max_delete_ratio", "-mdr", type=float, default=0.2,
+                        help="保存済みのうちこの割合を超えて削除対象になった場合は削除を中止する（デフォルト: 0.2）")
+    parser.add_argument("--log_level", "-ll", type=str, default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                        help="ログレベル（DEBUG で動画・再生リストごとのログも出す。デフォルト: INFO）")
+    parser.add_argument("--log_json", "-lj", type=str, default=None,
+                        help="ログを JSON Lines でも書き出すファイル")
+    parser.add_argument("--live_poll", "-lp", action="store_true", default=False,
+                        help="配信予定・配信中の動画のライブ状態と同時視聴者数だけを短い間隔で更新する（通常の同期はしない）")
+    parser.add_argument("--poll_interval_sec", "-pis", type=float, default=60,
+                        help="ライブ監視の間隔（秒、デフォルト: 60）")
+    parser.add_argument("--poll_duration_min", "-pdm", type=float, default=40,
+                        help="ライブ監視を続ける時間（分、0 = 1回だけ。デフォルト: 40）")
+    parser.add_argument("--rollup_stats", "-rs", action="store_true", default=False,
+                        help="統計の履歴を日次にまとめる（YouTube APIは使用しません）")
+    parser.add_argument("--rollup_days", "-rd", type=int, default=3,
+                        help="日次にまとめ直す日数（今日を含む、デフォルト: 3）")
+    parser.add_argument("--export_dir", "-ed", type=str, default=None,
+                        help="同期後に一覧・再生リスト・チャンネル集計の静的JSONを書き出すディレクトリ（DBごとにサブディレクトリを作る）")
+    parser.add_argument("--thumbnail_dir", "-td", type=str, default=None,
+                        help="サムネイルを取得して幅ごとの WebP / AVIF を保存するディレクトリ"
+                             "（thumbnail_url が変わった動画と、条件付き GET で差し替えが分かった動画だけ）")
+    parser.add_argument("--thumbnail_workers", "-tw", type=int, default=8,
+                        help="サムネイル取得の同時接続数（デフォルト: 8）")
+    parser.add_argument("--resume", "-res", action="store_true", default=False,
+                        help="フル同期の途中経過（ページトークン・取得済みの詳細）をページ・バッチごとに保存し、"
+                             "中断した途中経過があれば続きから取得する（付けない場合は途中経過を記録しない）")
 
     args = parser.parse_args()
+    configure_logging(args.log_level, args.log_json)
+    configure_retry(args.max_retries, args.api_rate_limit)
+
+    targets = load_channel_targets(args.channel_id, args.channel_ids, args.channels_file, args.db_name)
+    if not targets:
+        parser.error("--channel_id / --channel_ids / --channels_file のいずれかで同期対象を指定してください")
 
     # MongoDB URI 構築
     try:
         full_uri = build_mongo_uri(args.mongo_base_uri, args.mongo_user, args.mongo_password)
-        print(f"構築したURI（パスワード部分は隠蔽）: {full_uri.replace(args.mongo_password, '********')}")
+        logger.info("構築したURI（パスワード部分は隠蔽）: %s", full_uri.replace(args.mongo_password, '********'))
     except ValueError as e:
-        print(f"URI構築エラー: {e}")
+        logger.error("URI構築エラー: %s", e)
         return
 
     client = get_mongo_client(full_uri)
     if not client:
         return
 
+    response_cache = None
+    if args.http_cache_dir:
+        response_cache = DiskResponseCache(
+            args.http_cache_dir,
+            ttl_seconds=args.http_cache_ttl_hours * 3600,
+            max_bytes=args.http_cache_max_mb * 1024 * 1024
+        )
+
+    budget = QuotaBudget(args.quota_budget) if args.quota_budget > 0 else None
+
+    try:
+        if args.rollup_stats:
+            run_stats_rollup(args, client, targets)
+        elif args.live_poll:
+            run_live_poll(args, client, targets, response_cache, budget)
+        elif len(targets) == 1 and budget is None:
+            run_sync(args, client, response_cache)
+        else:
+            sync_channels(args, client, targets, response_cache, budget)
+        if args.export_dir and not args.rollup_stats:
+            run_static_export(args, client, targets)
+    finally:
+        client.close()
+        if response_cache:
+            response_cache.evict()
+            logger.info(response_cache.stats.summary())
+        logger.info(run_metrics.summary())
+        if args.metrics_file:
+            run_metrics.write(args.metrics_file)
+            logger.info("計測結果を書き出しました: %s", args.metrics_file)
+
+def run_stats_rollup(args, client: MongoClient, targets: List[ChannelTarget]):
+    """統計の履歴を動画×日ごとにまとめる（同じDBのチャンネルはまとめて1回）"""
+    from stats_history import rollup_daily_stats
+    for db_name in dict.fromkeys(t.db_name for t in targets):
+        try:
+            with run_metrics.phase("stats_rollup"):
+                count = rollup_daily_stats(client[db_name], args.rollup_days)
+            logger.info("%s: 直近 %d 日の統計を日次にまとめました（%d 件）", db_name, args.rollup_days, count)
+        except PyMongoError as e:
+            logger.error("%s: 統計の日次集計に失敗しました: %s", db_name, e)
+
+def run_thumbnail_mirror(args, client: MongoClient):
+    """保存した動画のうちサムネイルが新しい・変わったものだけを取得・変換し、カードを作り直す"""
+    from thumbnail_mirror import mirror_thumbnails
+    db = client[args.db_name]
+    try:
+        with run_metrics.phase("thumbnails"):
+            stats = mirror_thumbnails(db, args.thumbnail_dir, args.channel_id,
+                                      workers=args.thumbnail_workers, chunk_size=args.write_chunk_size)
+        logger.info(stats.summary())
+        if stats.updated_ids:
+            from read_models import ReadModelChanges
+            from thumbnail_mirror import VARIANTS_FIELD
+            changes = ReadModelChanges()
+            for video_id in stats.updated_ids:
+                changes.add_video(video_id, [VARIANTS_FIELD])
+            update_read_models(db, args.write_chunk_size, changes)
+    except (PyMongoError, OSError) as e:
+        logger.error("サムネイルの保存に失敗しました: %s", e)
+
+def run_static_export(args, client: MongoClient, targets: List[ChannelTarget]):
+    """読み取り用コレクションを静的JSONとして書き出す（中身が変わったファイルだけ。同じDBのチャンネルはまとめて1回）"""
+    from static_export import export_static_snapshot
+    for db_name in dict.fromkeys(t.db_name for t in targets):
+        try:
+            with run_metrics.phase("static_export"):
+                stats = export_static_snapshot(client[db_name], os.path.join(args.export_dir, db_name))
+            logger.info("%s: %s", db_name, stats.summary())
+        except (PyMongoError, OSError) as e:
+            logger.error("%s: 静的JSONの書き出しに失敗しました: %s", db_name, e)
+
+def run_live_poll(
+    args,
+    client: MongoClient,
+    targets: List[ChannelTarget],
+    response_cache: Optional[DiskResponseCache],
+    budget: Optional[QuotaBudget]
+):
+    """ライブ監視モード。通常の同期の合間に、配信中の視聴者数などを短い間隔で更新する"""
+    from live_poller import LivePoller
+    for target in targets:
+        ensure_indexes(client[target.db_name])
+    poller = LivePoller(client, args.api_key, targets, build_video_doc, cache=response_cache, budget=budget)
+    logger.info("ライブ監視を開始します（%d チャンネル / %.0f 秒間隔 / %.0f 分間）",
+                len(targets), args.poll_interval_sec, args.poll_duration_min)
+    poller.run(args.poll_interval_sec, args.poll_duration_min * 60)
+    logger.info(poller.summary())
+
+def sync_channels(
+    args,
+    client: MongoClient,
+    targets: List[ChannelTarget],
+    response_cache: Optional[DiskResponseCache],
+    budget: Optional[QuotaBudget]
+):
+    """
+    複数チャンネルを1プロセスで同期する。MongoClient・YouTube クライアントプール・
+    レスポンスキャッシュ・クォータ予算は全チャンネルで共有し、最近の投稿が多いチャンネルから開始する。
+    """
+    start = time.perf_counter()
+    targets = rank_channels(client, targets)
+    logger.info("同期順: " + ", ".join(f"{t.channel_id}（直近の投稿 {t.recent_uploads} 本）" for t in targets))
+
+    def sync_one(target: ChannelTarget) -> bool:
+        channel_args = copy.copy(args)
+        channel_args.channel_id = target.channel_id
+        channel_args.db_name = target.db_name
+        return run_sync(channel_args, client, response_cache, budget)
+
+    # 読み取り用コレクションは全チャンネルの同期が終わってから DB ごとに1回だけ作り直す
+    with defer_read_models():
+        results = run_channels(targets, sync_one, budget, args.channel_workers)
+    print_run_summary(results, budget, time.perf_counter() - start)
+
+def run_sync(
+    args,
+    client: MongoClient,
+    response_cache: Optional[DiskResponseCache],
+    budget: Optional[QuotaBudget] = None
+) -> bool:
+    """1チャンネル分の同期。成功したら True を返す（MongoClient は閉じない）"""
     # YouTube データ取得
     find = YoutubeDataFind(
         Api=args.api_key,
         ChannelId=args.channel_id,
-        MaxResults=0  # 0 = 制限なし（全部取得）
+        MaxResults=0,  # 0 = 制限なし（全部取得）
+        Workers=args.workers,
+        Cache=response_cache,
+        Budget=budget
     )
     
+    if args.recompute_analytics:
+        logger.info("\n配信傾向の分析フィールドを再計算します（YouTube APIは使用しません）...")
+        videos, _, channel_info = load_from_mongodb(client, args.db_name, args.channel_id, as_table=True)
+        if channel_info is None or not len(videos):
+            logger.warning("再計算対象の動画またはチャンネル情報が見つかりませんでした")
+            return False
+        with run_metrics.phase("analysis"):
+            compute_broadcast_patterns(videos, HOLIDAYS_CACHE)
+        # 再生リストは渡さない（既存のプレイリストはそのまま）
+        with run_metrics.phase("mongo_write"):
+            save_to_mongodb(client, args.channel_id, args.db_name, channel_info, videos, [],
+                            chunk_size=args.write_chunk_size, max_delete_ratio=args.max_delete_ratio)
+        logger.info("\n分析フィールドの再計算が完了しました")
+        return True
+
     if args.is_playlist_update:
-        print("\nプレイリストの更新を開始します...")
-        result = load_from_mongodb(client, args.db_name, args.channel_id) 
-        if result is None or not isinstance(result, tuple) or len(result) != 3:
-            print("プレイリストの読み込みに失敗しました")
-            return
+        logger.info("\nプレイリストの更新を開始します...")
+        # 動画は読まない（所属は playlist_members と videos.playlist_ids にだけ書く）
+        from playlist_members import force_rescan_without_members
+        playlists_from_db = load_playlists_from_mongodb(client, args.db_name, args.channel_id)
+        logger.info("MongoDBから読み込んだプレイリスト数: %d 件", len(playlists_from_db))
+        force_rescan_without_members(client[args.db_name], playlists_from_db)
+        scan_playlist_members(playlists_from_db, args.api_key, 0, workers=args.workers,
+                              cache=response_cache, budget=budget)
+
+        with run_metrics.phase("mongo_write"):
+            save_playlist_members(client, args.db_name, args.channel_id, playlists_from_db, args.write_chunk_size)
+            save_playlist_scan_state(client, args.db_name, playlists_from_db)
+
+        logger.info("\nプレイリストの更新も完了しました")
+        return True
+
+
+    db = client[args.db_name]
+    resuming = args.resume and find_resumable_progress(db, args.channel_id) is not None
+    if resuming:
+        logger.info("中断したフル同期の続きを取得します（差分同期は行いません）")
+    elif args.incremental:
+        checkpoint = load_sync_checkpoint(client, args.db_name, args.channel_id)
+        last_full = to_jst(checkpoint.get("last_full_sync_at")) if checkpoint else None
+        full_interval = timedelta(hours=args.full_sync_interval_hours)
+        if last_full is None or datetime.now(timezone.utc) - last_full >= full_interval:
+            logger.info("前回のフル同期が見つからないか期限切れのため、フル同期を実行します")
         else:
-            youtube_list, playlists_from_db, channel_info = result
-            update_data = match_videos_to_playlists(youtube_list, playlists_from_db,args.api_key,0)
-            
-            print(f"MongoDBから読み込んだプレイリスト数: {len(playlists_from_db)} 件")
-            save_to_mongodb(client, args.channel_id, args.db_name, channel_info, update_data,[])  # チャンネル情報と動画は更新しないのでNoneと空リストを渡す
-            
-            print("\nプレイリストの更新も完了しました")
-            return
-
+            known_videos, _, _ = load_from_mongodb(client, args.db_name, args.channel_id, as_table=True)
+            if known_videos:
+                find.Incremental = True
+                find.KnownVideos = known_videos
+                find.TierRefreshedAt = {
+                    name: to_jst(at) for name, at in checkpoint.get("tier_refreshed_at", {}).items()
+                }
+                logger.info("差分同期を実行します（保存済み動画: %d 本）", len(known_videos))
+
+    # --resume のときだけ、フル同期の途中経過をページ・バッチごとに保存する（中断しても次の --resume で続きから取得できる）
+    # 途中経過の書き込みはページ・バッチごとに MongoDB へ1回ずつ増えるので、再開しない実行では記録しない
+    if args.resume and not find.Incremental:
+        try:
+            find.Progress = FetchProgress(db, args.channel_id, resume=resuming)
+        except PyMongoError as e:
+            logger.warning("途中経過を保存できないため、記録せずに同期します: %s", e)
 
     result = get_youtube_data(find)
     
     if result is None or not isinstance(result, tuple) or len(result) != 3:
-        print("YouTube データ取得に失敗しました")
-        client.close()
-        return
+        logger.warning("YouTube データ取得に失敗しました")
+        if find.Progress is not None:
+            logger.info("途中経過は保存済みです。--resume を付けて実行すると続きから取得します")
+        return False
     
 
     youtubeuser, videos, playList = result
     
     if youtubeuser is None:
-        print("チャンネル情報が取得できませんでした（channel_idを確認）")
-        client.close()
-        return
+        logger.warning("チャンネル情報が取得できませんでした（channel_idを確認）")
+        return False
     
     if not videos:
-        print("動画が1件も見つかりませんでした")
-        client.close()
-        return
+        logger.warning("動画が1件も見つかりませんでした")
+        return True
 
-    print(f"\n取得完了: {len(videos)} 本の動画データ")
+    logger.info("\n取得完了: %d 本の動画データ", len(videos))
 
     # MongoDB に保存
-    save_to_mongodb(client, args.channel_id, args.db_name, youtubeuser, videos, playList)
+    with run_metrics.phase("mongo_write"):
+        saved = save_to_mongodb(client, args.channel_id, args.db_name, youtubeuser, videos, playList,
+                                find.Checkpoint, chunk_size=args.write_chunk_size,
+                                max_delete_ratio=args.max_delete_ratio)
+
+    # 途中経過は保存まで終わったときだけ削除する（保存に失敗した場合は --resume で取得し直さずに保存し直せる）
+    if not saved:
+        if find.Progress is not None:
+            logger.info("保存に失敗したため途中経過を残します。--resume を付けて実行すると取得済みの結果から保存し直します")
+        return False
+    if find.Progress is not None:
+        if find.Checkpoint.get("partial"):
+            logger.info("取得が一部欠けています。--resume を付けて実行すると欠けた分を取得します")
+        else:
+            try:
+                find.Progress.clear()
+            except PyMongoError as e:
+                logger.warning("途中経過を削除できませんでした: %s", e)
+
+    if args.thumbnail_dir:
+        run_thumbnail_mirror(args, client)
     
-    client.close()
-    print("\nすべての処理が完了しました")
+    logger.info("\nすべての処理が完了しました")
+    return True
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
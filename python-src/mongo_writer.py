@@ -0,0 +1,234 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import hashlib
+import json
+
+from pymongo import UpdateOne
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from sync_logging import get_logger
+
+logger = get_logger("mongo")
+
+# 内容ハッシュに含めないフィールド（別経路で更新される / 比較対象外）
+UNHASHED_FIELDS = ("_id", "playlist_titles", "content_hash", "last_updated")
+
+# $in に渡すIDの件数（1クエリのBSONを小さく保つ）
+ID_QUERY_CHUNK = 500
+
+# 削除割合の上限チェックをかける最小件数（数件の削除は割合が大きくても通す）
+MIN_GUARDED_DELETES = 10
+
+
+def normalize_value(value):
+    """
+    MongoDBに保存された値と比較できる形にそろえる。
+    datetime は UTC の naive・ミリ秒精度（BSONの精度）に変換する。
+    """
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    if isinstance(value, list):
+        return [normalize_value(v) for v in value]
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def content_hash(doc: dict) -> str:
+    """比較対象フィールドの内容ハッシュ（キー順に依存しない）"""
+    payload = {k: normalize_value(v) for k, v in doc.items() if k not in UNHASHED_FIELDS}
+    encoded = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _chunks(items: List, size: int) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def build_delta_operations(
+    coll,
+    docs: List[dict],
+    changes: Optional[List[Tuple[dict, dict]]] = None
+) -> Tuple[List[UpdateOne], Dict[str, int]]:
+    """
+    docs（_id 付きの完全なドキュメント）を保存済みの内容と比較し、
+    変わったフィールドだけを $set する UpdateOne を作る。
+      1. 保存済みの content_hash（と playlist_titles）だけを読み、変化がないものは書き込まない
+      2. ハッシュが違うものだけ保存済みドキュメントを読み、フィールド単位で差分を取る
+    playlist_titles は doc に含まれている場合だけ比較・更新する。
+    changes を渡した場合、新規・内容が変わったドキュメントについて (doc, 変わったフィールド) を追加する
+    （新規は doc 全体が変わったものとして扱う）。
+    """
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    if not docs:
+        return [], counts
+
+    ids = [doc["_id"] for doc in docs]
+    stored_heads: Dict[str, dict] = {}
+    for chunk in _chunks(ids, ID_QUERY_CHUNK):
+        for stored in coll.find({"_id": {"$in": chunk}}, {"content_hash": 1, "playlist_titles": 1}):
+            stored_heads[stored["_id"]] = stored
+
+    now = datetime.now()
+    operations: List[UpdateOne] = []
+    needs_diff: List[Tuple[dict, str]] = []
+
+    for doc in docs:
+        new_hash = content_hash(doc)
+        stored = stored_heads.get(doc["_id"])
+        if stored is None:
+            operations.append(UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {**doc, "content_hash": new_hash, "last_updated": now}},
+                upsert=True
+            ))
+            counts["inserted"] += 1
+            if changes is not None:
+                changes.append((doc, doc))
+            continue
+
+        titles_changed = "playlist_titles" in doc and doc["playlist_titles"] != stored.get("playlist_titles")
+        if stored.get("content_hash") == new_hash:
+            if titles_changed:
+                operations.append(UpdateOne(
+                    {"_id": doc["_id"]},
+                    {"$set": {"playlist_titles": doc["playlist_titles"], "last_updated": now}}
+                ))
+                counts["updated"] += 1
+                if changes is not None:
+                    changes.append((doc, {"playlist_titles": doc["playlist_titles"]}))
+            else:
+                counts["unchanged"] += 1
+            continue
+
+        needs_diff.append((doc, new_hash))
+
+    # ハッシュが変わったドキュメントだけ中身を読んでフィールド単位の差分を取る
+    diff_ids = [doc["_id"] for doc, _ in needs_diff]
+    stored_docs: Dict[str, dict] = {}
+    for chunk in _chunks(diff_ids, ID_QUERY_CHUNK):
+        for stored in coll.find({"_id": {"$in": chunk}}):
+            stored_docs[stored["_id"]] = stored
+
+    for doc, new_hash in needs_diff:
+        stored = stored_docs.get(doc["_id"], {})
+        changed = {
+            key: value for key, value in doc.items()
+            if key != "_id" and normalize_value(value) != normalize_value(stored.get(key))
+        }
+        if changes is not None:
+            changes.append((doc, dict(changed)))
+        changed["content_hash"] = new_hash
+        changed["last_updated"] = now
+        operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": changed}))
+        counts["updated"] += 1
+
+    return operations, counts
+
+
+def channel_scope(channel_id: str) -> dict:
+    """チャンネル単位の絞り込み条件（channel_id を持たない旧ドキュメントも対象に含める）"""
+    return {"$or": [{"channel_id": channel_id}, {"channel_id": {"$exists": False}}]}
+
+
+def write_docs_in_chunks(
+    coll,
+    docs: Iterable[dict],
+    chunk_size: int = 500,
+    on_changes: Optional[Callable[[List[Tuple[dict, dict]]], None]] = None
+) -> Tuple[Set[str], Dict[str, int]]:
+    """
+    docs をジェネレータのまま受け取り、chunk_size 件ごとに差分を取って bulk_write する。
+    保持するのは現在のチャンクと書き込んだIDの集合だけなので、件数が増えてもメモリは一定。
+    on_changes を渡した場合、チャンクを書き込んだ後に (doc, 変わったフィールド) の一覧で呼ぶ。
+    """
+    seen_ids: Set[str] = set()
+    totals = {"inserted": 0, "updated": 0, "unchanged": 0}
+    chunk: List[dict] = []
+
+    def flush():
+        changes: Optional[List[Tuple[dict, dict]]] = [] if on_changes else None
+        operations, counts = build_delta_operations(coll, chunk, changes)
+        if operations:
+            coll.bulk_write(operations, ordered=False)
+        if changes:
+            on_changes(changes)
+        for key, value in counts.items():
+            totals[key] += value
+        chunk.clear()
+
+    for doc in docs:
+        seen_ids.add(doc["_id"])
+        chunk.append(doc)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    return seen_ids, totals
+
+
+def delete_stale_docs(
+    coll,
+    scope_filter: dict,
+    keep_ids: Set[str],
+    chunk_size: int = ID_QUERY_CHUNK,
+    max_delete_ratio: Optional[float] = None
+) -> int:
+    """
+    scope_filter の範囲で keep_ids に含まれないドキュメントを削除する。
+    巨大な $nin を送らず、_id だけを読んで差集合を取り、$in で小分けに削除する。
+    max_delete_ratio を指定した場合、範囲内の件数に対して削除がその割合を超えるときは
+    取得が欠けたとみなして1件も削除しない（MIN_GUARDED_DELETES 件以下の削除は対象外）。
+    """
+    scoped_ids = [doc["_id"] for doc in coll.find(scope_filter, {"_id": 1})]
+    stale_ids = [doc_id for doc_id in scoped_ids if doc_id not in keep_ids]
+    if (
+        max_delete_ratio is not None
+        and len(stale_ids) > MIN_GUARDED_DELETES
+        and len(stale_ids) > len(scoped_ids) * max_delete_ratio
+    ):
+        logger.warning(
+            "%s: 保存済み %d 件中 %d 件が削除対象になったため、削除を中止しました（上限 %.0f%%）",
+            coll.name, len(scoped_ids), len(stale_ids), max_delete_ratio * 100
+        )
+        return 0
+
+    deleted = 0
+    for chunk in _chunks(stale_ids, chunk_size):
+        deleted += coll.delete_many({"_id": {"$in": chunk}}).deleted_count
+    return deleted
+
+
+def ensure_timeseries_collection(
+    db,
+    name: str,
+    time_field: str,
+    meta_field: str,
+    granularity: str = "minutes",
+    expire_after_seconds: Optional[int] = None
+):
+    """
+    時系列コレクションを作る（既にあれば何もしない）。
+    時系列コレクションを作れないサーバーでは通常のコレクションにして (meta, time) のインデックスを張る。
+    expire_after_seconds を指定すると、その秒数より古いデータはサーバーが自動で削除する。
+    """
+    if name in db.list_collection_names():
+        return db[name]
+    options = {}
+    if expire_after_seconds:
+        options["expireAfterSeconds"] = expire_after_seconds
+    try:
+        db.create_collection(name, timeseries={
+            "timeField": time_field, "metaField": meta_field, "granularity": granularity
+        }, **options)
+    except CollectionInvalid:
+        pass  # 並行して作成された
+    except PyMongoError as e:
+        logger.warning("%s: 時系列コレクションを作成できないため通常のコレクションを使います: %s", name, e)
+        db[name].create_index([(meta_field, 1), (time_field, 1)])
+        if expire_after_seconds:
+            db[name].create_index(time_field, expireAfterSeconds=expire_after_seconds)
+    return db[name]
@@ -0,0 +1,158 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from mongo_writer import channel_scope, delete_stale_docs, write_docs_in_chunks
+from sync_logging import get_logger
+from youtubedataapi import YoutubePlayData
+
+logger = get_logger("playlist_members")
+
+# 再生リストの所属（1件 = 再生リスト × 動画）
+# {_id: "playlist_id:video_id", playlist_id, video_id, position, added_at, channel_id}
+MEMBERS_COLLECTION = "playlist_members"
+
+# 動画側には所属する再生リストのIDだけを持つ（名前は playlists から引くので、名前の変更は1件の更新で済む）
+PLAYLIST_IDS_FIELD = "playlist_ids"
+# 以前の形式（再生リスト名の配列）。移行が済むまでの読み取り用
+LEGACY_TITLES_FIELD = "playlist_titles"
+
+
+def member_doc_id(playlist_id: str, video_id: str) -> str:
+    return f"{playlist_id}:{video_id}"
+
+
+def force_rescan_without_members(db, playlists: List[YoutubePlayData]) -> int:
+    """
+    playlist_members にまだ1件も無い再生リストは、前回の走査結果を使わずに走査し直させる
+    （所属の位置・追加日時は走査し直したときにしか得られないため。初回の移行用）。
+    """
+    ids = [pl.playlist_id for pl in playlists if pl.video_count]
+    if not ids:
+        return 0
+    stored = set(db[MEMBERS_COLLECTION].distinct("playlist_id", {"playlist_id": {"$in": ids}}))
+    forced = 0
+    for pl in playlists:
+        if pl.video_count and pl.playlist_id not in stored and pl.scanned_etag:
+            pl.scanned_etag = ""
+            forced += 1
+    if forced:
+        logger.info("所属が未保存の再生リスト %d 件を走査し直します", forced)
+    return forced
+
+
+def save_playlist_membership(
+    db,
+    channel_id: Optional[str],
+    playlists: List[YoutubePlayData],
+    chunk_size: int = 500,
+    on_video_change: Optional[Callable[[str, Optional[List[str]], List[str]], None]] = None
+) -> Dict[str, int]:
+    """
+    scan_playlist_members（youtubedataapi.py）の走査結果を保存する。
+      1. 走査し直した再生リストの所属（位置・追加日時）を playlist_members に差分で書き、
+         無くなった所属と、消えた再生リストの所属を削除する
+      2. videos.playlist_ids（所属する再生リストID）が変わった動画だけ $set し、
+         以前の playlist_titles は $unset する
+    on_video_change を渡した場合、2 で書き換えた動画ごとに (動画ID, 以前の playlist_ids, 新しい playlist_ids) で呼ぶ
+    （移行前の動画は以前の所属が再生リスト名でしか分からないので None）。件数の内訳を返す。
+    """
+    members_coll = db[MEMBERS_COLLECTION]
+    scope = channel_scope(channel_id) if channel_id else {}
+
+    scanned = [pl for pl in playlists if pl.member_scan_updated]
+    written_ids, counts = write_docs_in_chunks(members_coll, _member_docs(scanned, channel_id), chunk_size)
+    deleted = 0
+    if scanned:
+        deleted += delete_stale_docs(
+            members_coll, {"playlist_id": {"$in": [pl.playlist_id for pl in scanned]}}, written_ids
+        )
+    deleted += members_coll.delete_many(
+        {**scope, "playlist_id": {"$nin": [pl.playlist_id for pl in playlists]}}
+    ).deleted_count
+
+    ids_by_video: Dict[str, List[str]] = defaultdict(list)
+    for pl in playlists:
+        for video_id in pl.member_video_ids:
+            ids_by_video[video_id].append(pl.playlist_id)
+
+    videos_coll = db["videos"]
+    operations: List[UpdateOne] = []
+    updated = 0
+    for doc in videos_coll.find(scope, {PLAYLIST_IDS_FIELD: 1, LEGACY_TITLES_FIELD: 1}):
+        playlist_ids = sorted(set(ids_by_video.get(doc["_id"], [])))
+        if doc.get(PLAYLIST_IDS_FIELD) == playlist_ids and LEGACY_TITLES_FIELD not in doc:
+            continue
+        operations.append(UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {PLAYLIST_IDS_FIELD: playlist_ids, "last_updated": datetime.now()},
+             "$unset": {LEGACY_TITLES_FIELD: ""}}
+        ))
+        if on_video_change:
+            on_video_change(doc["_id"], None if LEGACY_TITLES_FIELD in doc else doc.get(PLAYLIST_IDS_FIELD) or [],
+                            playlist_ids)
+        if len(operations) >= chunk_size:
+            updated += videos_coll.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += videos_coll.bulk_write(operations, ordered=False).modified_count
+
+    return {
+        "members_inserted": counts["inserted"],
+        "members_updated": counts["updated"],
+        "members_deleted": deleted,
+        "videos_updated": updated,
+    }
+
+
+def _member_docs(playlists: List[YoutubePlayData], channel_id: Optional[str]) -> Iterator[dict]:
+    """同じ動画が1つの再生リストに複数回入っている場合は最初の位置だけを使う"""
+    for pl in playlists:
+        seen = set()
+        for member in pl.members:
+            if member.video_id in seen:
+                continue
+            seen.add(member.video_id)
+            yield {
+                "_id": member_doc_id(pl.playlist_id, member.video_id),
+                "playlist_id": pl.playlist_id,
+                "video_id": member.video_id,
+                "position": member.position,
+                "added_at": member.added_at,
+                "channel_id": channel_id,
+            }
+
+
+def playlist_title_map(db) -> Dict[str, str]:
+    """再生リストID → 名前"""
+    return {doc["_id"]: doc.get("title", "") for doc in db["playlists"].find({}, {"title": 1})}
+
+
+def video_playlist_titles(doc: dict, titles: Dict[str, str]) -> List[str]:
+    """動画ドキュメントの所属再生リスト名（playlist_ids から引く。移行前の動画は playlist_titles をそのまま使う）"""
+    if PLAYLIST_IDS_FIELD in doc:
+        return sorted({titles[pid] for pid in doc[PLAYLIST_IDS_FIELD] or [] if titles.get(pid)})
+    return list(doc.get(LEGACY_TITLES_FIELD) or [])
+
+
+def playlist_ids_by_title(db) -> Dict[Tuple[Optional[str], str], str]:
+    """(チャンネルID, 名前) → 再生リストID（移行前の動画の playlist_titles を ID に直す用。チャンネル不明は None）"""
+    ids: Dict[Tuple[Optional[str], str], str] = {}
+    for doc in db["playlists"].find({}, {"title": 1, "channel_id": 1}).sort("_id", 1):
+        ids.setdefault((doc.get("channel_id"), doc.get("title", "")), doc["_id"])
+        ids.setdefault((None, doc.get("title", "")), doc["_id"])
+    return ids
+
+
+def video_playlist_ids(doc: dict, ids_by_title: Dict[Tuple[Optional[str], str], str]) -> List[str]:
+    """動画ドキュメントの所属再生リストID（移行前の動画は playlist_titles の名前から同じチャンネルの再生リストを引く）"""
+    if PLAYLIST_IDS_FIELD in doc:
+        return sorted(set(doc[PLAYLIST_IDS_FIELD] or []))
+    ids = set()
+    for title in doc.get(LEGACY_TITLES_FIELD) or []:
+        playlist_id = ids_by_title.get((doc.get("channel_id"), title)) or ids_by_title.get((None, title))
+        if playlist_id:
+            ids.add(playlist_id)
+    return sorted(ids)
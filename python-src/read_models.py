@@ -0,0 +1,435 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+import math
+
+from pymongo import UpdateMany
+
+from mongo_writer import ID_QUERY_CHUNK, delete_stale_docs, write_docs_in_chunks
+from playlist_members import (LEGACY_TITLES_FIELD, PLAYLIST_IDS_FIELD, playlist_ids_by_title, playlist_title_map,
+                              video_playlist_ids, video_playlist_titles)
+from search_index import NGRAMS_COLLECTION, update_search_index
+from sync_logging import get_logger
+
+logger = get_logger("read_models")
+
+# 一覧ページ（videosDetailsApi / videosApi）の1ページの件数（JS 側の limit と同じ）
+PAGE_SIZE = 20
+
+# 事前に作る並び順（サイトの並び替えの選択肢）と種類（"" = すべて）
+PAGE_SORTS: List[Tuple[str, int]] = [
+    ("published_at", -1),
+    ("view_count", -1),
+    ("like_count", -1),
+    ("comment_count", -1),
+]
+PAGE_CATEGORIES = ["", "live", "shorts", "normal_video"]
+
+# 一覧のカードに載せる videos のフィールド
+CARD_FIELDS = [
+    "title",
+    "thumbnail_url",
+    "published_at",
+    "view_count",
+    "like_count",
+    "comment_count",
+    "content_category",
+    "live_status",
+    "scheduled_start_time",
+    "actual_end_time",
+    "playlist_titles",      # playlist_ids から引いた再生リスト名
+    "thumbnail_variants",   # 保存済みサムネイル（thumbnail_mirror.py）
+]
+# チャンネル集計にだけ使うフィールド
+SUMMARY_FIELDS = [
+    "channel_id",
+    "channel_name",
+    "weekday",
+    "is_holiday",
+    "duration_sec",
+    "consecutive_broadcast_days",
+    "same_day_broadcast_count",
+]
+
+# カード・集計の元になる videos のフィールド（これ以外だけが変わった動画では作り直さない）
+CARD_SOURCE_FIELDS = set(CARD_FIELDS) | {PLAYLIST_IDS_FIELD, LEGACY_TITLES_FIELD}
+_SUMMARY_SOURCE_FIELDS = set(SUMMARY_FIELDS) | {"content_category", "published_at", "view_count"}
+READ_MODEL_SOURCE_FIELDS = CARD_SOURCE_FIELDS | _SUMMARY_SOURCE_FIELDS
+# タイトル検索の索引に使う videos のフィールド
+_SEARCH_SOURCE_FIELDS = {"title", PLAYLIST_IDS_FIELD, LEGACY_TITLES_FIELD}
+_ROW_PROJECTION = {field: 1 for field in CARD_FIELDS + SUMMARY_FIELDS + [PLAYLIST_IDS_FIELD, LEGACY_TITLES_FIELD]}
+
+PAGES_COLLECTION = "video_pages"
+PLAYLIST_LISTS_COLLECTION = "playlist_video_lists"
+SUMMARIES_COLLECTION = "channel_summaries"
+# 作り直しの途中で失敗したかどうか（{_id: "refresh", pending: bool}）
+STATE_COLLECTION = "read_models_state"
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def page_id(category: str, sort_by: str, sort_order: int, page: int) -> str:
+    """video_pages の _id（JS 側でも同じ形式で組み立てる）"""
+    return f"{category or 'all'}|{sort_by}|{sort_order}|{page}"
+
+
+@dataclass
+class ReadModelChanges:
+    """
+    前回の作り直しから変わったもの。refresh_read_models に渡すと、影響する一覧・再生リスト・チャンネルだけを作り直す。
+    videos は動画ID → 変わったフィールド（None = 新規）。カード・集計に使わないフィールドは記録しない。
+    削除など影響する範囲を絞れない変更があったときは full にする（全体を作り直す）。
+    """
+    videos: Dict[str, Optional[Set[str]]] = field(default_factory=dict)
+    playlists: Set[str] = field(default_factory=set)           # 所属する動画が変わった再生リスト
+    renamed_playlists: Set[str] = field(default_factory=set)   # 名前が変わった・新しく保存した再生リスト
+    full: bool = False
+
+    def __bool__(self) -> bool:
+        return bool(self.full or self.videos or self.playlists or self.renamed_playlists)
+
+    def add_video(self, video_id: str, fields: Optional[Iterable[str]]):
+        if fields is None or (video_id in self.videos and self.videos[video_id] is None):
+            self.videos[video_id] = None
+            return
+        relevant = set(fields) & READ_MODEL_SOURCE_FIELDS
+        if relevant:
+            self.videos.setdefault(video_id, set()).update(relevant)
+
+    def record_videos(self, changes: List[Tuple[dict, dict]]):
+        """videos を書いた write_docs_in_chunks の on_changes 用"""
+        for doc, changed in changes:
+            self.add_video(doc["_id"], None if changed is doc else changed)
+
+    def record_playlists(self, changes: List[Tuple[dict, dict]]):
+        """playlists を書いた write_docs_in_chunks の on_changes 用"""
+        for doc, changed in changes:
+            if changed is doc or "title" in changed:
+                self.renamed_playlists.add(doc["_id"])
+
+    def record_membership(self, video_id: str, old_ids: Optional[List[str]], new_ids: List[str]):
+        """save_playlist_membership の on_video_change 用（old_ids が None = 移行前の動画で、以前の所属が分からない）"""
+        if old_ids is None:
+            self.full = True
+            return
+        self.add_video(video_id, [PLAYLIST_IDS_FIELD])
+        self.playlists.update(set(old_ids) ^ set(new_ids))
+
+    def merge(self, other: "ReadModelChanges"):
+        self.full = self.full or other.full
+        for video_id, fields in other.videos.items():
+            self.add_video(video_id, fields)
+        self.playlists |= other.playlists
+        self.renamed_playlists |= other.renamed_playlists
+
+
+def _sorted_cards(cards: List[dict], sort_by: str, sort_order: int) -> List[dict]:
+    """MongoDB の sort と同じく値の無いもの（null）を最小として並べる。同じ値は _id 順で固定する"""
+    present = [c for c in cards if c.get(sort_by) is not None]
+    missing = [c for c in cards if c.get(sort_by) is None]
+    present.sort(key=lambda c: c["_id"])
+    present.sort(key=lambda c: c[sort_by], reverse=sort_order < 0)
+    missing.sort(key=lambda c: c["_id"])
+    return present + missing if sort_order < 0 else missing + present
+
+
+def build_page_docs(cards: List[dict], lists: Optional[Set[Tuple[str, str]]] = None) -> Iterator[dict]:
+    """種類 × 並び順 × ページごとのドキュメント（lists を渡した場合は その (種類, 並び順) だけ）"""
+    for sort_by, sort_order in PAGE_SORTS:
+        if lists is not None and not any(s == sort_by for _, s in lists):
+            continue
+        ordered = _sorted_cards(cards, sort_by, sort_order)
+        for category in PAGE_CATEGORIES:
+            if lists is not None and (category, sort_by) not in lists:
+                continue
+            selected = [c for c in ordered if c.get("content_category") == category] if category else ordered
+            total_pages = math.ceil(len(selected) / PAGE_SIZE)
+            for page in range(1, total_pages + 1):
+                yield {
+                    "_id": page_id(category, sort_by, sort_order, page),
+                    "category": category or "all",
+                    "sort_by": sort_by,
+                    "sort_order": sort_order,
+                    "page": page,
+                    "total_pages": total_pages,
+                    "total_videos": len(selected),
+                    "videos": selected[(page - 1) * PAGE_SIZE:page * PAGE_SIZE],
+                }
+
+
+def build_playlist_docs(
+    cards: List[dict],
+    playlist_ids: Dict[str, List[str]],
+    titles: Dict[str, str]
+) -> Iterator[dict]:
+    """
+    再生リストIDごとの動画一覧（公開日の新しい順。playlistVideosApi の既定の並び）。
+    playlist_ids は動画ID → 所属再生リストID。_id は再生リストID なので、名前が変わっても同じドキュメントを更新し、
+    同じ名前の再生リスト（別チャンネルなど）もまとめない。
+    """
+    by_id: Dict[str, List[dict]] = defaultdict(list)
+    for card in _sorted_cards(cards, "published_at", -1):
+        for playlist_id in playlist_ids.get(card["_id"], []):
+            by_id[playlist_id].append(card)
+    for playlist_id, videos in by_id.items():
+        yield {"_id": playlist_id, "playlist_id": playlist_id, "title": titles.get(playlist_id, ""),
+               "total_videos": len(videos), "videos": videos}
+
+
+def build_channel_summaries(rows: List[dict]) -> Iterator[dict]:
+    """
+    チャンネルごとの集計（曜日・祝日・配信開始時刻の分布、種類ごとの本数と平均など）。
+    曜日・祝日は同期時に計算済みの分析フィールドを使う。
+    """
+    by_channel: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_channel[row.get("channel_id") or ""].append(row)
+
+    for channel_id, videos in by_channel.items():
+        categories: Dict[str, dict] = {}
+        for category in sorted({v.get("content_category") or "unknown" for v in videos}):
+            selected = [v for v in videos if (v.get("content_category") or "unknown") == category]
+            weekdays = Counter(v["weekday"] for v in selected if v.get("weekday") is not None)
+            hours = Counter(_jst_hour(v["published_at"]) for v in selected if v.get("published_at"))
+            categories[category] = {
+                "videos": len(selected),
+                "total_views": sum(v.get("view_count") or 0 for v in selected),
+                "avg_views": round(sum(v.get("view_count") or 0 for v in selected) / len(selected), 1),
+                "avg_duration_sec": round(sum(v.get("duration_sec") or 0 for v in selected) / len(selected), 1),
+                # 曜日は 0 = 月曜 … 6 = 日曜
+                "weekday_distribution": [weekdays.get(d, 0) for d in range(7)],
+                "holiday_videos": sum(1 for v in selected if v.get("is_holiday")),
+                "hour_distribution": [hours.get(h, 0) for h in range(24)],
+            }
+        published = [v["published_at"] for v in videos if v.get("published_at")]
+        yield {
+            "_id": channel_id,
+            "channel_id": channel_id,
+            "channel_name": next((v["channel_name"] for v in videos if v.get("channel_name")), ""),
+            "total_videos": len(videos),
+            "total_views": sum(v.get("view_count") or 0 for v in videos),
+            "last_published_at": max(published) if published else None,
+            "longest_streak_days": max((v.get("consecutive_broadcast_days") or 0 for v in videos), default=0),
+            "multi_broadcast_days": sum(1 for v in videos if (v.get("same_day_broadcast_count") or 0) == 2),
+            "categories": categories,
+        }
+
+
+def _jst_hour(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(JST).hour
+
+
+def refresh_read_models(
+    db,
+    chunk_size: int = 500,
+    changes: Optional[ReadModelChanges] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    videos から一覧ページ・再生リストごとの一覧・チャンネル集計を作り直し、タイトル検索の索引を更新する。
+    changes を渡した場合は、変わった動画・再生リストが載る一覧・再生リスト・チャンネルだけを作り直す。
+    初めての場合、前回の作り直しが途中で失敗していた場合、changes.full の場合は全体を作り直す。
+    コレクション名 → 件数の内訳を返す。
+    """
+    state_coll = db[STATE_COLLECTION]
+    previous = state_coll.find_one_and_update({"_id": "refresh"}, {"$set": {"pending": True}}, upsert=True)
+    results = None
+    if changes is not None and not changes.full and previous is not None and not previous.get("pending"):
+        results = _refresh_changed(db, chunk_size, changes)
+    if results is None:
+        results = _refresh_all(db, chunk_size)
+    state_coll.update_one({"_id": "refresh"}, {"$set": {"pending": False, "refreshed_at": datetime.now(timezone.utc)}})
+    return results
+
+
+def _refresh_all(db, chunk_size: int) -> Dict[str, Dict[str, int]]:
+    """
+    全体の作り直し。カードに必要なフィールドだけを1回読み、内容が変わったドキュメントだけを書き込む
+    （差分書き込みなので、1本増えてずれたページだけが更新される）。無くなったページ・再生リストは削除する。
+    """
+    rows = list(db["videos"].find({}, _ROW_PROJECTION))
+    titles = playlist_title_map(db)
+    ids_by_title = playlist_ids_by_title(db) if any(PLAYLIST_IDS_FIELD not in row for row in rows) else {}
+    playlist_ids = {row["_id"]: video_playlist_ids(row, ids_by_title) for row in rows}
+    cards = [_card(row, titles) for row in rows]
+
+    results: Dict[str, Dict[str, int]] = {}
+    for name, docs in [
+        (PAGES_COLLECTION, build_page_docs(cards)),
+        (PLAYLIST_LISTS_COLLECTION, build_playlist_docs(cards, playlist_ids, titles)),
+        (SUMMARIES_COLLECTION, build_channel_summaries(rows)),
+    ]:
+        coll = db[name]
+        written_ids, counts = write_docs_in_chunks(coll, docs, chunk_size)
+        counts["deleted"] = delete_stale_docs(coll, {}, written_ids)
+        results[name] = _log_counts(name, counts)
+
+    results[NGRAMS_COLLECTION] = _update_search_index(db, chunk_size, titles)
+    return results
+
+
+def _refresh_changed(db, chunk_size: int, changes: ReadModelChanges) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    変わったものだけの作り直し。
+      - 並び順の値（公開日・再生数など）や種類が変わった・新しい動画: その (種類, 並び順) の一覧だけ作り直す
+      - それ以外のカードの値（配信状態・サムネイル・タイトルなど）だけが変わった動画:
+        その動画が載っているページのカードだけを差し替える（videos は読まない）
+      - 所属・名前・公開日が変わった再生リスト: その再生リストの一覧だけ作り直す
+      - 集計に使う値が変わった動画のチャンネル: そのチャンネルの集計だけ作り直す
+    移行前（playlist_titles）の動画が含まれる・消えた動画がある場合は None を返す（全体を作り直す）。
+    """
+    videos_coll = db["videos"]
+    titles = playlist_title_map(db)
+    rows = _rows_by_id(videos_coll, list(changes.videos))
+    if len(rows) < len(changes.videos) or any(_is_legacy(row) for row in rows.values()):
+        return None
+
+    sort_keys = [sort_by for sort_by, _ in PAGE_SORTS]
+    lists: Set[Tuple[str, str]] = set()
+    rebuild_playlists = changes.playlists | changes.renamed_playlists
+    channels: Set[str] = set()
+    patch_ids: Set[str] = set()
+    search_ids: Set[str] = set()
+    for video_id, fields in changes.videos.items():
+        row = rows[video_id]
+        categories = {"", row.get("content_category") or ""} & set(PAGE_CATEGORIES)
+        if fields is None:
+            lists.update((category, sort_by) for category in categories for sort_by in sort_keys)
+        elif "content_category" in fields:
+            # 以前の種類は分からないので、すべての種類を作り直す
+            lists.update((category, sort_by) for category in PAGE_CATEGORIES for sort_by in sort_keys)
+        else:
+            lists.update((category, sort_by) for category in categories for sort_by in sort_keys if sort_by in fields)
+        if fields is None or "published_at" in fields:
+            rebuild_playlists.update(row.get(PLAYLIST_IDS_FIELD) or [])
+        if fields is None or fields & _SUMMARY_SOURCE_FIELDS:
+            channels.add(row.get("channel_id") or "")
+        if fields is not None and fields & CARD_SOURCE_FIELDS:
+            patch_ids.add(video_id)
+        if fields is None or fields & _SEARCH_SOURCE_FIELDS:
+            search_ids.add(video_id)
+
+    results: Dict[str, Dict[str, int]] = {}
+
+    # 再生リストごとの一覧（名前が変わった再生リストの動画は、カードの再生リスト名も差し替える）
+    playlist_rows = list(videos_coll.find(
+        {PLAYLIST_IDS_FIELD: {"$in": sorted(rebuild_playlists)}}, _ROW_PROJECTION
+    )) if rebuild_playlists else []
+    for row in playlist_rows:
+        if set(row.get(PLAYLIST_IDS_FIELD) or []) & changes.renamed_playlists:
+            rows.setdefault(row["_id"], row)
+            patch_ids.add(row["_id"])
+            search_ids.add(row["_id"])
+    playlist_ids = {
+        row["_id"]: [pid for pid in row.get(PLAYLIST_IDS_FIELD) or [] if pid in rebuild_playlists]
+        for row in playlist_rows
+    }
+    coll = db[PLAYLIST_LISTS_COLLECTION]
+    written_ids, counts = write_docs_in_chunks(
+        coll, build_playlist_docs([_card(row, titles) for row in playlist_rows], playlist_ids, titles), chunk_size
+    )
+    counts["deleted"] = delete_stale_docs(
+        coll, {"_id": {"$in": sorted(rebuild_playlists)}}, written_ids
+    ) if rebuild_playlists else 0
+    counts["patched"] = _patch_cards(
+        coll, rows, patch_ids, titles, {"_id": {"$nin": sorted(rebuild_playlists)}}, chunk_size
+    )
+    results[PLAYLIST_LISTS_COLLECTION] = _log_counts(PLAYLIST_LISTS_COLLECTION, counts)
+
+    # 一覧ページ（すべてを含む種類があれば videos を1回だけ読み、ほかの種類もそこから作る）
+    coll = db[PAGES_COLLECTION]
+    list_rows: List[dict] = []
+    if lists:
+        categories = {category for category, _ in lists}
+        query = {} if "" in categories else {"content_category": {"$in": sorted(categories)}}
+        list_rows = list(videos_coll.find(query, _ROW_PROJECTION))
+        if any(_is_legacy(row) for row in list_rows):
+            return None
+    rebuilt_lists = [{"category": category or "all", "sort_by": sort_by} for category, sort_by in sorted(lists)]
+    written_ids, counts = write_docs_in_chunks(
+        coll, build_page_docs([_card(row, titles) for row in list_rows], lists), chunk_size
+    )
+    counts["deleted"] = delete_stale_docs(coll, {"$or": rebuilt_lists}, written_ids) if rebuilt_lists else 0
+    counts["patched"] = _patch_cards(
+        coll, rows, patch_ids, titles, {"$nor": rebuilt_lists} if rebuilt_lists else {}, chunk_size
+    )
+    results[PAGES_COLLECTION] = _log_counts(PAGES_COLLECTION, counts)
+
+    # チャンネル集計（channel_id の無い旧ドキュメントが変わった場合は全チャンネル）
+    summary_rows: List[dict] = []
+    if channels:
+        query = {} if "" in channels else {"channel_id": {"$in": sorted(channels)}}
+        summary_rows = list(videos_coll.find(query, _ROW_PROJECTION))
+    _, counts = write_docs_in_chunks(db[SUMMARIES_COLLECTION], build_channel_summaries(summary_rows), chunk_size)
+    counts["deleted"] = 0
+    results[SUMMARIES_COLLECTION] = _log_counts(SUMMARIES_COLLECTION, counts)
+
+    results[NGRAMS_COLLECTION] = _update_search_index(db, chunk_size, titles, search_ids)
+    return results
+
+
+def _card(row: dict, titles: Dict[str, str]) -> dict:
+    """一覧のカード（再生リスト名は playlist_ids から playlists の現在の名前を引く）"""
+    card = {"_id": row["_id"], **{field: row.get(field) for field in CARD_FIELDS}}
+    card["playlist_titles"] = video_playlist_titles(row, titles)
+    return card
+
+
+def _is_legacy(row: dict) -> bool:
+    return PLAYLIST_IDS_FIELD not in row and LEGACY_TITLES_FIELD in row
+
+
+def _rows_by_id(videos_coll, ids: List[str]) -> Dict[str, dict]:
+    rows: Dict[str, dict] = {}
+    for i in range(0, len(ids), ID_QUERY_CHUNK):
+        for row in videos_coll.find({"_id": {"$in": ids[i:i + ID_QUERY_CHUNK]}}, _ROW_PROJECTION):
+            rows[row["_id"]] = row
+    return rows
+
+
+def _patch_cards(
+    coll,
+    rows: Dict[str, dict],
+    video_ids: Set[str],
+    titles: Dict[str, str],
+    scope: dict,
+    chunk_size: int
+) -> int:
+    """
+    video_ids の動画が載っているドキュメントのカードを今の値に差し替える（scope で作り直したものは除く）。
+    content_hash は外す（次に同じドキュメントを書くときに中身を比べ直させる）。差し替えたドキュメント数を返す。
+    """
+    operations = [
+        UpdateMany({**scope, "videos._id": video_id},
+                   {"$set": {"videos.$": _card(rows[video_id], titles)}, "$unset": {"content_hash": ""}})
+        for video_id in sorted(video_ids)
+    ]
+    patched = 0
+    for i in range(0, len(operations), chunk_size):
+        patched += coll.bulk_write(operations[i:i + chunk_size], ordered=False).modified_count
+    return patched
+
+
+def _log_counts(name: str, counts: Dict[str, int]) -> Dict[str, int]:
+    logger.info("%s: 新規 %d / 更新 %d / 変更なし %d / 削除 %d / カード差し替え %d",
+                name, counts["inserted"], counts["updated"], counts["unchanged"], counts["deleted"],
+                counts.get("patched", 0), extra={"fields": {"read_model": name, **counts}})
+    return counts
+
+
+def _update_search_index(
+    db,
+    chunk_size: int,
+    titles: Dict[str, str],
+    video_ids: Optional[Set[str]] = None
+) -> Dict[str, int]:
+    if video_ids is not None and not video_ids:
+        return {"videos": 0, "grams_added": 0, "grams_removed": 0, "grams_deleted": 0}
+    counts = update_search_index(db, chunk_size, titles, video_ids)
+    logger.info("%s: 動画 %d 本の差分 / n-gram 追加 %d / 除去 %d / 削除 %d",
+                NGRAMS_COLLECTION, counts["videos"], counts["grams_added"], counts["grams_removed"],
+                counts["grams_deleted"], extra={"fields": {"read_model": NGRAMS_COLLECTION, **counts}})
+    return counts
@@ -0,0 +1,264 @@
+"""
+YouTube API の呼び出し箇所ごとに、実際に読むフィールドから最小の part と fields（部分レスポンス）を作る。
+読むフィールドを増やしたら CONSUMED_FIELDS にも追加すること。
+
+    python request_masks.py
+
+で、各マスクを通したサンプルレスポンスから読むフィールドが欠けていないか、
+各呼び出し箇所の変換結果（チャンネル・再生リスト・所属・動画詳細・ライブ監視・統計の更新）が
+マスク前と変わらないかを確認する（欠けていれば終了コード 1）。
+"""
+from typing import Callable, Dict, List, Tuple
+from zoneinfo import ZoneInfo
+import copy
+
+# 呼び出し箇所 → items 内で読むフィールド（ドット区切り）
+CONSUMED_FIELDS: Dict[str, List[str]] = {
+    "channels": [
+        "snippet.title",
+        "statistics.subscriberCount",
+        "contentDetails.relatedPlaylists.uploads",
+    ],
+    # アップロード系プレイリストのページング
+    "playlist_items": [
+        "contentDetails.videoId",
+    ],
+    # カスタム再生リストの所属動画の走査（位置と、再生リストに追加された日時も保存する）
+    "playlist_members": [
+        "contentDetails.videoId",
+        "snippet.position",
+        "snippet.publishedAt",
+    ],
+    "video_details": [
+        "id",
+        "snippet.title",
+        "snippet.publishedAt",
+        "snippet.liveBroadcastContent",
+        "snippet.thumbnails.maxres.url",
+        "snippet.thumbnails.high.url",
+        "snippet.thumbnails.standard.url",
+        "snippet.thumbnails.medium.url",
+        "snippet.thumbnails.default.url",
+        "statistics.viewCount",
+        "statistics.likeCount",
+        "statistics.commentCount",
+        "liveStreamingDetails.scheduledStartTime",
+        "liveStreamingDetails.actualStartTime",
+        "liveStreamingDetails.actualEndTime",
+        "liveStreamingDetails.concurrentViewers",
+        "contentDetails.duration",
+    ],
+    "video_stats": [
+        "id",
+        "statistics.viewCount",
+        "statistics.likeCount",
+        "statistics.commentCount",
+    ],
+    "playlists": [
+        "id",
+        "etag",
+        "snippet.title",
+        "snippet.publishedAt",
+        "snippet.thumbnails.high.url",
+        "contentDetails.itemCount",
+        "status.privacyStatus",
+    ],
+}
+
+# すべての list 呼び出しで残すトップレベルのフィールド（ページングとレスポンスキャッシュの ETag 用）
+TOP_LEVEL_FIELDS = ["etag", "nextPageToken"]
+
+# part として指定するリソースの区分（id / etag は part に関係なく返る）
+_PARTS = {"snippet", "statistics", "contentDetails", "liveStreamingDetails", "status"}
+
+
+def _build_tree(paths: List[str]) -> dict:
+    tree: dict = {}
+    for path in paths:
+        node = tree
+        for key in path.split("."):
+            node = node.setdefault(key, {})
+    return tree
+
+
+def _render(tree: dict) -> str:
+    return ",".join(f"{key}({_render(child)})" if child else key for key, child in tree.items())
+
+
+def build_request_shape(paths: List[str]) -> Dict[str, str]:
+    """読むフィールドの一覧から list() に渡す part / fields を作る"""
+    parts = sorted({path.split(".", 1)[0] for path in paths} & _PARTS)
+    fields = ",".join(TOP_LEVEL_FIELDS) + f",items({_render(_build_tree(paths))})"
+    return {"part": ",".join(parts), "fields": fields}
+
+
+# 呼び出し箇所 → {"part": ..., "fields": ...}（import 時に1回だけ作る）
+REQUEST_SHAPES: Dict[str, Dict[str, str]] = {
+    name: build_request_shape(paths) for name, paths in CONSUMED_FIELDS.items()
+}
+
+
+def parse_fields(fields: str) -> dict:
+    """fields の文字列（a,b/c,d(e,f)）を木にする。apply_fields での確認用"""
+    def parse_list(text: str, pos: int) -> Tuple[dict, int]:
+        tree: dict = {}
+        while pos < len(text):
+            start = pos
+            while pos < len(text) and text[pos] not in ",()":
+                pos += 1
+            node = tree
+            for key in text[start:pos].split("/"):
+                node = node.setdefault(key, {})
+            if pos < len(text) and text[pos] == "(":
+                child, pos = parse_list(text, pos + 1)
+                node.update(child)
+                pos += 1  # ")"
+            if pos < len(text) and text[pos] == ",":
+                pos += 1
+                continue
+            if pos < len(text) and text[pos] == ")":
+                break
+        return tree, pos
+
+    return parse_list(fields.replace(" ", ""), 0)[0]
+
+
+def apply_fields(value, tree: dict):
+    """部分レスポンスと同じ規則でレスポンスを絞り込む（API と同じ結果になるかの確認用）"""
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [apply_fields(v, tree) for v in value]
+    if isinstance(value, dict):
+        return {k: apply_fields(value[k], child) for k, child in tree.items() if k in value}
+    return value
+
+
+def missing_paths(item: dict, paths: List[str]) -> List[str]:
+    """item に存在しないパスを返す"""
+    missing = []
+    for path in paths:
+        node = item
+        for key in path.split("."):
+            if not isinstance(node, dict) or key not in node:
+                missing.append(path)
+                break
+            node = node[key]
+    return missing
+
+
+def _sample_responses() -> Dict[str, dict]:
+    """各呼び出し箇所のフルレスポンス（読まないフィールドも含む）の見本"""
+    thumbs = {q: {"url": f"https://i.ytimg.com/vi/abc/{q}.jpg", "width": 1, "height": 1}
+              for q in ["default", "medium", "high", "standard", "maxres"]}
+    video = {
+        "kind": "youtube#video", "etag": "v-etag", "id": "abc",
+        "snippet": {
+            "publishedAt": "2025-03-01T12:00:00Z", "channelId": "UCx", "title": "配信",
+            "description": "長い概要欄" * 100, "thumbnails": thumbs, "channelTitle": "ch",
+            "tags": ["a", "b"], "categoryId": "20", "liveBroadcastContent": "none",
+            "localized": {"title": "配信", "description": "長い概要欄"},
+        },
+        "contentDetails": {"duration": "PT1H2M3S", "dimension": "2d", "definition": "hd", "caption": "false"},
+        "statistics": {"viewCount": "100", "likeCount": "10", "favoriteCount": "0", "commentCount": "2"},
+        "liveStreamingDetails": {
+            "actualStartTime": "2025-03-01T12:00:00Z", "actualEndTime": "2025-03-01T13:02:03Z",
+            "scheduledStartTime": "2025-03-01T11:55:00Z", "concurrentViewers": "50",
+        },
+    }
+    playlist_items = {"etag": "p", "nextPageToken": "t", "items": [{
+        "id": "pi", "etag": "pi1",
+        "snippet": {"publishedAt": "2025-03-02T00:00:00Z", "title": "配信", "description": "長い概要欄",
+                    "thumbnails": thumbs, "position": 0},
+        "contentDetails": {"videoId": "abc", "videoPublishedAt": "2025-03-01T12:00:00Z"},
+    }]}
+    return {
+        "channels": {"etag": "c", "items": [{
+            "id": "UCx", "etag": "c1",
+            "snippet": {"title": "ch", "description": "概要", "thumbnails": thumbs},
+            "contentDetails": {"relatedPlaylists": {"likes": "", "uploads": "UUx"}},
+            "statistics": {"viewCount": "1", "subscriberCount": "1000", "videoCount": "5"},
+        }]},
+        "playlist_items": playlist_items,
+        "playlist_members": playlist_items,
+        "video_details": {"etag": "v", "items": [video]},
+        "video_stats": {"etag": "v", "items": [video]},
+        "playlists": {"etag": "l", "nextPageToken": "t", "items": [{
+            "id": "PL1", "etag": "pl1",
+            "snippet": {"publishedAt": "2025-01-01T00:00:00Z", "title": "歌枠", "description": "説明", "thumbnails": thumbs},
+            "status": {"privacyStatus": "public"},
+            "contentDetails": {"itemCount": 12},
+        }]},
+    }
+
+
+def check_request_shapes() -> List[str]:
+    """マスクを通したサンプルで、読むフィールドが欠けていないか・変換結果が変わらないかを確認する"""
+    problems: List[str] = []
+    for name, sample in _sample_responses().items():
+        shape = REQUEST_SHAPES[name]
+        masked = apply_fields(sample, parse_fields(shape["fields"]))
+        for key in TOP_LEVEL_FIELDS:
+            if key in sample and key not in masked:
+                problems.append(f"{name}: {key} がマスクで落ちています")
+        for path in missing_paths(masked["items"][0], CONSUMED_FIELDS[name]):
+            problems.append(f"{name}: {path} がマスクで落ちています")
+        for path in CONSUMED_FIELDS[name]:
+            head = path.split(".", 1)[0]
+            if head in _PARTS and head not in shape["part"].split(","):
+                problems.append(f"{name}: part に {head} がありません")
+        full_bytes, masked_bytes = len(repr(sample)), len(repr(masked))
+        print(f"{name:15s} part={shape['part']:50s} {full_bytes:6d} → {masked_bytes:5d} 文字")
+
+    # 各呼び出し箇所の変換はマスク前後で結果が同じであること
+    for label, name, response, convert in _conversions():
+        masked = apply_fields(response, parse_fields(REQUEST_SHAPES[name]["fields"]))
+        if convert(response["items"][0]) != convert(masked["items"][0]):
+            problems.append(f"{label}: マスク後の変換結果がマスク前と一致しません")
+    return problems
+
+
+def _conversions() -> List[Tuple[str, str, dict, Callable[[dict], object]]]:
+    """(確認名, 呼び出し箇所, サンプルレスポンス, items の1件 → 実際のコードでの変換結果)"""
+    from fetch_engine import DETAIL_SHAPE, STATS_SHAPE
+    from live_poller import LIVE_FIELDS
+    from youtubedataapi import (YoutubeContentType, YoutubeVideoDetail, _apply_stats_refresh, _build_channel,
+                                _build_playlist, _build_playlist_member, _build_video_detail)
+
+    jst = ZoneInfo("Asia/Tokyo")
+    samples = _sample_responses()
+    # ライブ監視は配信中の動画を読む（終了時刻が無く、同時視聴者数がある）
+    live_video = copy.deepcopy(samples[DETAIL_SHAPE]["items"][0])
+    live_video["snippet"]["liveBroadcastContent"] = "live"
+    del live_video["liveStreamingDetails"]["actualEndTime"]
+
+    def live_fields(item: dict) -> dict:
+        detail = _build_video_detail(item, YoutubeContentType.LIVE, jst)
+        return {name: getattr(detail, name) for name in LIVE_FIELDS}
+
+    def stats_refresh(item: dict) -> YoutubeVideoDetail:
+        video = YoutubeVideoDetail(title="保存済み", video_id=item["id"], view_count=1, like_count=1, comment_count=1)
+        _apply_stats_refresh(video, item)
+        return video
+
+    return [
+        ("get_youtube_data のチャンネル", "channels", samples["channels"], _build_channel),
+        ("アップロードのページング", "playlist_items", samples["playlist_items"],
+         lambda item: item["contentDetails"]["videoId"]),
+        ("scan_playlist_members", "playlist_members", samples["playlist_members"],
+         lambda item: _build_playlist_member(item, 0, jst)),
+        ("get_youtube_data の再生リスト", "playlists", samples["playlists"], lambda item: _build_playlist(item, jst)),
+        ("動画詳細", DETAIL_SHAPE, samples[DETAIL_SHAPE],
+         lambda item: _build_video_detail(item, YoutubeContentType.LIVE, jst)),
+        ("ライブ監視の LIVE_FIELDS", DETAIL_SHAPE, {**samples[DETAIL_SHAPE], "items": [live_video]}, live_fields),
+        ("_apply_stats_refresh", STATS_SHAPE, samples[STATS_SHAPE], stats_refresh),
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+
+    problems = check_request_shapes()
+    for problem in problems:
+        print(f"NG: {problem}")
+    sys.exit(1 if problems else 0)
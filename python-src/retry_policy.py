@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+from typing import Callable, Optional
+import json
+import random
+import threading
+import time
+
+from sync_logging import get_logger
+
+logger = get_logger("retry")
+
+# 再試行するステータス（403 は理由が rateLimitExceeded 系のときだけ。quotaExceeded は再試行しない）
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+RETRYABLE_403_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5       # 初回を含む試行回数
+    base_delay: float = 1.0     # 1回目の再試行の最大待ち時間（秒）。以降は倍々
+    max_delay: float = 32.0
+
+    def backoff(self, attempt: int) -> float:
+        """attempt 回目（1始まり）の失敗後の待ち時間。full jitter で同時に再試行が集中しないようにする"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+class TokenBucket:
+    """
+    全スレッド共通のリクエストレート制限。rate 件/秒で補充され、最大 burst 件まで連続で送れる。
+    rate <= 0 なら制限しない。
+    """
+
+    def __init__(self, rate: float, burst: int = 10, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def retry_after_seconds(resp) -> Optional[float]:
+    """Retry-After ヘッダー（秒数のみ対応。日付形式は無視してバックオフに任せる）"""
+    value = resp.get("retry-after") if resp is not None else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(status: int, content: bytes) -> bool:
+    if status in RETRYABLE_STATUSES:
+        return True
+    if status == 403:
+        try:
+            errors = json.loads(content).get("error", {}).get("errors", [])
+        except (ValueError, AttributeError):
+            return False
+        return any(e.get("reason") in RETRYABLE_403_REASONS for e in errors)
+    return False
+
+
+class RetryingHttp:
+    """
+    一時的なエラー（429 / 5xx / レート制限の 403 / 接続エラー）を再試行する http ラッパー。
+    Retry-After があればその秒数、なければ jitter 付きの指数バックオフで待つ。
+    各試行の前に TokenBucket でレートを制限する。
+    最後の試行でも失敗したレスポンスはそのまま返し、googleapiclient が HttpError にする。
+    """
+
+    def __init__(self, http, policy: RetryPolicy, limiter: Optional[TokenBucket] = None,
+                 sleep: Callable[[float], None] = time.sleep):
+        self._http = http
+        self._policy = policy
+        self._limiter = limiter
+        self._sleep = sleep
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        attempt = 0
+        while True:
+            attempt += 1
+            if self._limiter:
+                self._limiter.acquire()
+            try:
+                resp, content = self._http.request(uri, method=method, body=body, headers=headers, **kwargs)
+            except OSError as e:  # 接続の切断・タイムアウトなど
+                if attempt >= self._policy.max_attempts:
+                    raise
+                delay = self._policy.backoff(attempt)
+                logger.warning("接続エラーのため %.1f 秒後に再試行します（%d/%d）: %s",
+                               delay, attempt, self._policy.max_attempts, e)
+                self._sleep(delay)
+                continue
+
+            if attempt >= self._policy.max_attempts or not is_retryable(resp.status, content):
+                return resp, content
+
+            delay = retry_after_seconds(resp)
+            if delay is None:
+                delay = self._policy.backoff(attempt)
+            delay = min(delay, self._policy.max_delay)
+            logger.warning("HTTP %d のため %.1f 秒後に再試行します（%d/%d）",
+                           resp.status, delay, attempt, self._policy.max_attempts)
+            self._sleep(delay)
+
+
+# プロセス全体で共有する再試行ポリシーとレート制限（main の引数で上書きする）
+default_retry_policy = RetryPolicy()
+request_limiter = TokenBucket(rate=0)
+
+
+def configure_retry(max_attempts: int, rate_per_sec: float, burst: int = 10):
+    global default_retry_policy, request_limiter
+    default_retry_policy = RetryPolicy(max_attempts=max(1, max_attempts))
+    request_limiter = TokenBucket(rate=rate_per_sec, burst=burst)
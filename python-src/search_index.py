@@ -0,0 +1,121 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+import unicodedata
+
+from pymongo import DeleteOne, UpdateOne
+
+from playlist_members import LEGACY_TITLES_FIELD, PLAYLIST_IDS_FIELD, playlist_title_map, video_playlist_titles
+from sync_logging import get_logger
+
+logger = get_logger("search_index")
+
+# n-gram → その n-gram を含む動画IDの一覧 {_id: gram, ids: [...]}
+NGRAMS_COLLECTION = "search_ngrams"
+# 動画ID → 索引に入れた正規化済みテキスト（次回の差分計算用）{_id: video_id, text: ...}
+STATE_COLLECTION = "search_index_state"
+
+# 日本語のタイトルは単語の区切りが無いので2文字単位で索引を作る（JS 側の lib/titleSearch.js と同じ）
+NGRAM_SIZE = 2
+
+
+def normalize_text(text: str) -> str:
+    """全角・半角と大文字・小文字をそろえる（JS 側は text.normalize('NFKC').toLowerCase()）"""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def ngrams(text: Optional[str]) -> Set[str]:
+    """正規化済みテキストの n-gram（空白を含むものは除く）"""
+    if not text:
+        return set()
+    return {
+        gram for gram in (text[i:i + NGRAM_SIZE] for i in range(len(text) - NGRAM_SIZE + 1))
+        if not any(ch.isspace() for ch in gram)
+    }
+
+
+def indexed_text(title: Optional[str], playlist_titles: Iterable[str]) -> str:
+    """動画1本分の検索対象（タイトルと所属再生リスト名）"""
+    return normalize_text("\n".join([title or "", *playlist_titles]))
+
+
+def update_search_index(
+    db,
+    chunk_size: int = 500,
+    playlist_titles: Optional[Dict[str, str]] = None,
+    video_ids: Optional[Iterable[str]] = None
+) -> Dict[str, int]:
+    """
+    videos のタイトル・所属再生リスト名から n-gram の転置索引を更新する。
+    再生リスト名は playlist_ids から引く（playlist_titles = 再生リストID → 名前。省略時は playlists から読む）。
+    前回索引に入れたテキストと比べ、変わった動画（と削除された動画）の n-gram だけを
+    $addToSet / $pullAll で書き換える。空になった n-gram は削除する。
+    video_ids を渡した場合は、その動画（タイトル・所属が変わった動画、名前が変わった再生リストの動画）の
+    テキストと状態だけを読んで比べる（videos に無ければ削除された動画として索引から外す）。
+    """
+    state_coll = db[STATE_COLLECTION]
+    ngrams_coll = db[NGRAMS_COLLECTION]
+
+    if playlist_titles is None:
+        playlist_titles = playlist_title_map(db)
+    projection = {"title": 1, PLAYLIST_IDS_FIELD: 1, LEGACY_TITLES_FIELD: 1}
+    if video_ids is None:
+        video_docs = db["videos"].find({}, projection)
+        state_docs = state_coll.find({}, {"text": 1})
+    else:
+        ids = sorted(set(video_ids))
+        video_docs = _find_by_ids(db["videos"], ids, projection, chunk_size)
+        state_docs = _find_by_ids(state_coll, ids, {"text": 1}, chunk_size)
+    current = {
+        doc["_id"]: indexed_text(doc.get("title"), video_playlist_titles(doc, playlist_titles))
+        for doc in video_docs
+    }
+    stored = {doc["_id"]: doc.get("text", "") for doc in state_docs}
+
+    added: Dict[str, List[str]] = defaultdict(list)
+    removed: Dict[str, List[str]] = defaultdict(list)
+    state_ops: List = []
+    for video_id, text in current.items():
+        old_text = stored.get(video_id)
+        if old_text == text:
+            continue
+        new_grams, old_grams = ngrams(text), ngrams(old_text)
+        for gram in new_grams - old_grams:
+            added[gram].append(video_id)
+        for gram in old_grams - new_grams:
+            removed[gram].append(video_id)
+        state_ops.append(UpdateOne({"_id": video_id}, {"$set": {"text": text}}, upsert=True))
+    for video_id in stored.keys() - current.keys():
+        for gram in ngrams(stored[video_id]):
+            removed[gram].append(video_id)
+        state_ops.append(DeleteOne({"_id": video_id}))
+
+    posting_ops = [
+        UpdateOne({"_id": gram}, {"$addToSet": {"ids": {"$each": ids}}}, upsert=True)
+        for gram, ids in added.items()
+    ] + [
+        UpdateOne({"_id": gram}, {"$pullAll": {"ids": ids}})
+        for gram, ids in removed.items()
+    ]
+    # 索引を先に書き、状態は最後に書く（途中で失敗しても次回に同じ差分をやり直せる）
+    for i in range(0, len(posting_ops), chunk_size):
+        ngrams_coll.bulk_write(posting_ops[i:i + chunk_size], ordered=False)
+    emptied = 0
+    removed_grams = list(removed)
+    for i in range(0, len(removed_grams), chunk_size):
+        emptied += ngrams_coll.delete_many(
+            {"_id": {"$in": removed_grams[i:i + chunk_size]}, "ids": {"$size": 0}}
+        ).deleted_count
+    for i in range(0, len(state_ops), chunk_size):
+        state_coll.bulk_write(state_ops[i:i + chunk_size], ordered=False)
+
+    return {
+        "videos": len(state_ops),
+        "grams_added": len(added),
+        "grams_removed": len(removed),
+        "grams_deleted": emptied,
+    }
+
+
+def _find_by_ids(coll, ids: List[str], projection: dict, chunk_size: int) -> Iterator[dict]:
+    for i in range(0, len(ids), chunk_size):
+        yield from coll.find({"_id": {"$in": ids[i:i + chunk_size]}}, projection)
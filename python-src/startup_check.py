@@ -0,0 +1,60 @@
+"""
+同期CLI（main.py）の起動コストを測るスクリプト。
+GitHub Actions で毎回コールドスタートするため、import だけで重いモジュールや
+ネットワークアクセスが入り込んでいないかを確認する。
+
+    python startup_check.py [--budget_ms 400]
+
+import 中に読み込まれてはいけないモジュールが見つかるか、import 時間が予算を超えると終了コード 1。
+"""
+from typing import Dict, List, Tuple
+import argparse
+import os
+import subprocess
+import sys
+
+# main の import 時点では読み込まない（必要になった経路でだけ読み込む）モジュール
+FORBIDDEN_AT_IMPORT = ("googleapiclient.discovery", "httplib2", "pandas", "requests")
+
+
+def measure_import(module: str = "main") -> Tuple[float, Dict[str, int]]:
+    """新しいプロセスで module を import し、合計時間（ms）とモジュールごとの累積時間（µs）を返す"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=here, capture_output=True, text=True, check=True
+    )
+    cumulative: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        # "import time: self [us] | cumulative | imported package"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative_us = cumulative_us.strip()
+        if not cumulative_us.isdigit():
+            continue  # 見出し行
+        cumulative[name.strip()] = int(cumulative_us)
+    return cumulative.get(module, 0) / 1000, cumulative
+
+
+def check_startup(budget_ms: float, module: str = "main") -> List[str]:
+    total_ms, cumulative = measure_import(module)
+    print(f"import {module}: {total_ms:.1f} ms（予算 {budget_ms:.0f} ms）")
+    for name, us in sorted(cumulative.items(), key=lambda kv: kv[1], reverse=True)[:10]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    problems = [f"import 時に {name} が読み込まれています" for name in FORBIDDEN_AT_IMPORT if name in cumulative]
+    if total_ms > budget_ms:
+        problems.append(f"import 時間が予算を超えています: {total_ms:.1f} ms > {budget_ms:.0f} ms")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="main.py の import 時間と読み込むモジュールを確認する")
+    parser.add_argument("--budget_ms", "-b", type=float, default=400, help="import 時間の上限（ミリ秒）")
+    args = parser.parse_args()
+
+    problems = check_startup(args.budget_ms)
+    for problem in problems:
+        print(f"NG: {problem}")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,145 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+import hashlib
+import json
+import os
+
+from read_models import PAGES_COLLECTION, PLAYLIST_LISTS_COLLECTION, SUMMARIES_COLLECTION
+from sync_logging import get_logger
+
+logger = get_logger("static_export")
+
+# 静的サイト（wrangler.jsonc でリポジトリ直下を配信）から読む JSON の置き場所
+#   manifest.json                論理名 → 中身のハッシュ付きファイル名（短いキャッシュ）
+#   shards/<論理名>.<hash>.json  中身が変わるとファイル名が変わる（長期キャッシュ可）
+# 圧縮は配信側（Cloudflare）が行うので、.gz / .br は作らない。
+# 書き出したファイルはリポジトリにコミットせず、GitHub Actions のキャッシュで引き継いで wrangler deploy で配置する
+MANIFEST_NAME = "manifest.json"
+SHARDS_DIR = "shards"
+HASH_LENGTH = 12
+
+# 読み取り用コレクションの内部フィールド（静的ファイルには載せない）
+INTERNAL_FIELDS = ("content_hash", "last_updated")
+
+
+@dataclass
+class ExportStats:
+    shards: int = 0
+    written: int = 0            # 中身が変わって書き出したもの
+    unchanged: int = 0
+    removed: int = 0
+    bytes_written: int = 0      # 書き出した JSON の合計
+
+    def summary(self) -> str:
+        return (f"静的スナップショット: {self.shards} 件中 書き出し {self.written} / 変更なし {self.unchanged} / "
+                f"削除 {self.removed}（{self.bytes_written / 1024:.1f} KB）")
+
+
+def _json_default(value):
+    """Mongo の日時は API（res.json）と同じ UTC の ISO 形式（ミリ秒 + Z）にする"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat(timespec="milliseconds") + "Z"
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"JSON に変換できない値です: {type(value).__name__}")
+
+
+def encode_shard(content) -> bytes:
+    """キーを並べた一意な JSON（同じ内容なら同じバイト列 = 同じハッシュ）"""
+    return json.dumps(content, ensure_ascii=False, sort_keys=True, separators=(",", ":"),
+                      default=_json_default).encode("utf-8")
+
+
+def _public(doc: dict) -> dict:
+    return {key: value for key, value in doc.items() if key not in INTERNAL_FIELDS}
+
+
+def iter_shards(db) -> Iterator[Tuple[str, object]]:
+    """読み取り用コレクション（read_models.py）から (論理名, 中身) を作る"""
+    summaries = [_public(doc) for doc in db[SUMMARIES_COLLECTION].find().sort("_id", 1)]
+    yield "summary", {"channels": summaries}
+
+    for doc in db[PAGES_COLLECTION].find():
+        yield f"pages/{doc['category']}/{doc['sort_by']}/{doc['page']}", _public(doc)
+
+    # 再生リストのファイル名は名前ではなく ID（playlist_video_lists の _id。名前は変わりうるし、記号を含む）
+    lists = {doc["_id"]: doc for doc in db[PLAYLIST_LISTS_COLLECTION].find()}
+    index = []
+    for pl in db["playlists"].find({}, {"title": 1, "video_count": 1, "thumbnails": 1, "published_at": 1}) \
+            .sort("published_at", -1):
+        doc = lists.get(pl["_id"])
+        if doc is None:
+            continue
+        name = f"playlists/{pl['_id']}"
+        index.append({
+            "playlist_id": pl["_id"],
+            "title": pl.get("title", ""),
+            "video_count": pl.get("video_count", 0),
+            "thumbnails": pl.get("thumbnails", ""),
+            "published_at": pl.get("published_at"),
+            "total_videos": doc.get("total_videos", 0),
+            "shard": name,
+        })
+        yield name, _public(doc)
+    yield "playlists/index", {"playlists": index}
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_manifest(out_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(out_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("shards", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def export_static_snapshot(db, out_dir: str, now: Optional[datetime] = None) -> ExportStats:
+    """
+    読み取り用コレクションを、中身のハッシュをファイル名に含む JSON として out_dir に書き出す。
+    同じハッシュのファイルが既にあるもの（中身が変わっていないもの）は書き直さない。
+    manifest.json は論理名 → ファイル名が変わったときだけ書き直し、
+    今回と前回の manifest のどちらからも参照されないファイルを削除する
+    （古い manifest を読んだ閲覧者が直後に消されたファイルを引かないよう、1世代は残す）。
+    """
+    stats = ExportStats()
+    previous = _read_manifest(out_dir)
+
+    shards: Dict[str, str] = {}
+    for name, content in iter_shards(db):
+        data = encode_shard(content)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        rel_path = f"{SHARDS_DIR}/{name}.{digest}.json"
+        path = os.path.join(out_dir, rel_path)
+        stats.shards += 1
+        shards[name] = rel_path
+        if os.path.exists(path):
+            stats.unchanged += 1
+            continue
+        _write_atomic(path, data)
+        stats.written += 1
+        stats.bytes_written += len(data)
+
+    if shards != previous:
+        manifest = encode_shard({"generated_at": now or datetime.now(timezone.utc), "shards": shards})
+        _write_atomic(os.path.join(out_dir, MANIFEST_NAME), manifest)
+
+    keep = set(shards.values()) | set(previous.values())
+    shards_root = os.path.join(out_dir, SHARDS_DIR)
+    for directory, _, files in os.walk(shards_root):
+        for filename in files:
+            rel_path = os.path.relpath(os.path.join(directory, filename), out_dir).replace(os.sep, "/")
+            # 以前書き出していた .gz / .br もここで消える
+            if rel_path not in keep:
+                os.remove(os.path.join(directory, filename))
+                stats.removed += 1
+    return stats
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from pymongo import InsertOne
+from pymongo.errors import PyMongoError
+
+from mongo_writer import ensure_timeseries_collection
+from sync_logging import get_logger
+
+logger = get_logger("stats_history")
+
+# 履歴として残す videos のフィールド
+STATS_FIELDS = ("view_count", "like_count", "comment_count")
+
+# 同期ごとのスナップショット（時系列コレクション。meta = {video_id, channel_id}）
+HISTORY_COLLECTION = "video_stats_history"
+# 動画×日（JST）ごとの最後の値（rollup_daily_stats で作る）
+DAILY_COLLECTION = "video_stats_daily"
+
+# 生のスナップショットを残す日数（それより古いものは日次の集計だけ残る）
+RAW_RETENTION_DAYS = 90
+
+JST = ZoneInfo("Asia/Tokyo")
+
+
+def ensure_stats_history(db):
+    """履歴の時系列コレクションと、「動画Xの直近N日」を引くためのインデックスを用意する"""
+    coll = ensure_timeseries_collection(
+        db, HISTORY_COLLECTION, "at", "meta",
+        granularity="hours", expire_after_seconds=RAW_RETENTION_DAYS * 86400
+    )
+    coll.create_index([("meta.video_id", 1), ("at", -1)])
+    db[DAILY_COLLECTION].create_index([("video_id", 1), ("day", -1)])
+    db[DAILY_COLLECTION].create_index([("channel_id", 1), ("day", -1)])
+    return coll
+
+
+class StatsHistoryRecorder:
+    """
+    write_docs_in_chunks の on_changes に渡し、再生数・高評価数・コメント数のどれかが変わった動画
+    （新規を含む）だけ、その時点の3つの値をスナップショットとして追記する。
+    1回の同期のスナップショットはすべて同じ時刻にそろえる。
+    """
+
+    def __init__(self, db, channel_id: str, at: Optional[datetime] = None):
+        self._coll = ensure_stats_history(db)
+        self._channel_id = channel_id
+        self._at = at or datetime.now(timezone.utc)
+        self.recorded = 0
+
+    def __call__(self, changes: List[Tuple[dict, dict]]):
+        snapshots = [
+            InsertOne({
+                "at": self._at,
+                "meta": {"video_id": doc["_id"], "channel_id": self._channel_id},
+                **{field: doc.get(field, 0) for field in STATS_FIELDS},
+            })
+            for doc, changed in changes
+            if any(field in changed for field in STATS_FIELDS)
+        ]
+        if not snapshots:
+            return
+        try:
+            self._coll.bulk_write(snapshots, ordered=False)
+            self.recorded += len(snapshots)
+        except PyMongoError as e:
+            # 履歴の書き込みに失敗しても動画の保存は続ける
+            logger.warning("統計の履歴を書き込めませんでした（%d 件）: %s", len(snapshots), e)
+
+
+def rollup_daily_stats(db, days: int = 3, now: Optional[datetime] = None) -> int:
+    """
+    直近 days 日分（今日を含む）のスナップショットを、動画×日（JST）ごとの最後の値にまとめて
+    video_stats_daily に保存する。集計はサーバー側で行い、同じ日を何度まとめ直しても結果は同じ。
+    生のスナップショットは RAW_RETENTION_DAYS 日でサーバーが自動削除する。
+    まとめた動画×日の件数を返す。
+    """
+    ensure_stats_history(db)
+    now = (now or datetime.now(timezone.utc)).astimezone(JST)
+    first_day = (now - timedelta(days=max(1, days) - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    last_values = {field: {"$last": f"${field}"} for field in STATS_FIELDS}
+    db[HISTORY_COLLECTION].aggregate([
+        {"$match": {"at": {"$gte": first_day.astimezone(timezone.utc)}}},
+        {"$sort": {"at": 1}},
+        {"$group": {
+            "_id": {
+                "video_id": "$meta.video_id",
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$at", "timezone": "Asia/Tokyo"}},
+            },
+            "channel_id": {"$last": "$meta.channel_id"},
+            "at": {"$last": "$at"},
+            "samples": {"$sum": 1},
+            **last_values,
+        }},
+        {"$project": {
+            "_id": {"$concat": ["$_id.video_id", ":", "$_id.day"]},
+            "video_id": "$_id.video_id",
+            "day": "$_id.day",
+            "channel_id": 1,
+            "at": 1,
+            "samples": 1,
+            **{field: 1 for field in STATS_FIELDS},
+        }},
+        {"$merge": {"into": DAILY_COLLECTION, "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ])
+    return db[DAILY_COLLECTION].count_documents({"day": {"$gte": first_day.strftime("%Y-%m-%d")}})
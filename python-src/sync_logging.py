@@ -0,0 +1,108 @@
+from datetime import datetime, timezone
+from typing import Optional
+import json
+import logging
+import sys
+import threading
+
+ROOT_LOGGER_NAME = "ytsync"
+
+_setup_lock = threading.Lock()
+_configured = False
+
+
+class JsonLineFormatter(logging.Formatter):
+    """1レコード1行のJSON。extra={"fields": {...}} で渡した値はそのままキーとして出力する"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage().strip(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def configure_logging(level: str = "INFO", json_path: Optional[str] = None):
+    """
+    コンソール（標準出力、メッセージのみ）と、任意でJSON Lines ファイルへの出力を設定する。
+    何度呼んでも前回の設定を置き換えるだけ。
+    """
+    global _configured
+    with _setup_lock:
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+            handler.close()
+
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(console)
+
+        if json_path:
+            json_handler = logging.FileHandler(json_path, encoding="utf-8")
+            json_handler.setFormatter(JsonLineFormatter())
+            root.addHandler(json_handler)
+
+        root.setLevel(getattr(logging, level.upper(), logging.INFO))
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    ytsync.<name> のロガー。configure_logging() を呼ぶ前に使われた場合は
+    INFO 以上を標準出力に出す既定の設定にする（モジュール単体で使ったときも従来の print と同じ見え方）。
+    """
+    if not _configured:
+        configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+class ProgressCounter:
+    """
+    ループの進捗を every 件ごとに1行だけ出す（1件ごとのログの代わり）。
+    複数スレッドから advance() してよい。
+    """
+
+    def __init__(self, logger: logging.Logger, label: str, total: Optional[int] = None,
+                 every: int = 100, level: int = logging.INFO):
+        self._logger = logger
+        self._label = label
+        self._total = total
+        self._every = max(1, every)
+        self._level = level
+        self._count = 0
+        self._lock = threading.Lock()
+        self._enabled = logger.isEnabledFor(level)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def advance(self, n: int = 1):
+        with self._lock:
+            before = self._count
+            self._count += n
+            crossed = self._count // self._every != before // self._every
+            count = self._count
+        if crossed and self._enabled:
+            self._log(count)
+
+    def done(self):
+        if self._enabled and self._count % self._every:
+            self._log(self._count)
+
+    def _log(self, count: int):
+        fields = {"progress": self._label, "count": count}
+        if self._total is not None:
+            fields["total"] = self._total
+            self._logger.log(self._level, "%s: %d / %d", self._label, count, self._total, extra={"fields": fields})
+        else:
+            self._logger.log(self._level, "%s: %d", self._label, count, extra={"fields": fields})
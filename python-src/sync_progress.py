@@ -0,0 +1,112 @@
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+import threading
+
+from sync_logging import get_logger
+
+logger = get_logger("sync_progress")
+
+# フル同期の途中経過（1件 = 1チャンネル）
+# {_id: channel_id, started_at, updated_at,
+#  playlists: {playlistId: {cursor: 次のページトークン, ids: [集めた動画ID], done: bool, head: 先頭の動画ID}}}
+PROGRESS_COLLECTION = "sync_progress"
+# 取得済みの videos().list の項目（1件 = 1回の問い合わせ = 最大50動画）{channel_id, shape, items, saved_at}
+PROGRESS_ITEMS_COLLECTION = "sync_progress_items"
+
+# これより古い途中経過は使わない（ページトークンや取得済みの項目が古くなりすぎるため）
+RESUME_MAX_AGE = timedelta(days=7)
+
+
+def ensure_progress_indexes(db):
+    """
+    途中経過のインデックス。中断したまま再開されなかった途中経過は RESUME_MAX_AGE を過ぎたら
+    TTL インデックスで MongoDB が削除する（最後まで終わった同期は clear() で削除する）。
+    """
+    ttl = int(RESUME_MAX_AGE.total_seconds())
+    db[PROGRESS_COLLECTION].create_index("updated_at", expireAfterSeconds=ttl)
+    db[PROGRESS_ITEMS_COLLECTION].create_index("channel_id")
+    db[PROGRESS_ITEMS_COLLECTION].create_index("saved_at", expireAfterSeconds=ttl)
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def find_resumable_progress(db, channel_id: str, now: Optional[datetime] = None) -> Optional[dict]:
+    """続きから再開できる途中経過（無い・古すぎる場合は None）"""
+    doc = db[PROGRESS_COLLECTION].find_one({"_id": channel_id})
+    if doc is None:
+        return None
+    now = now or datetime.now(timezone.utc)
+    updated_at = _aware(doc.get("updated_at") or doc.get("started_at"))
+    if updated_at is None or now - updated_at > RESUME_MAX_AGE:
+        logger.info("[%s] 途中経過が古いため使いません（最終更新: %s）", channel_id, updated_at)
+        return None
+    return doc
+
+
+class FetchProgress:
+    """
+    fetch_uploads_concurrently の途中経過（プレイリストごとのページトークン・集めた動画ID・
+    取得済みの動画詳細）をページ / バッチごとに MongoDB へ保存する。
+    resume=True で保存済みの途中経過があれば読み込み、続きから取得できるようにする
+    （取得済みのページ・バッチはもう一度問い合わせない）。無ければ新しく記録を始める。
+    取得した結果の保存まで終わったら clear() で削除する（保存に失敗した場合は残し、再開時にそのまま保存し直す）。
+    """
+
+    def __init__(self, db, channel_id: str, resume: bool = False, now: Optional[datetime] = None):
+        self._progress = db[PROGRESS_COLLECTION]
+        self._items = db[PROGRESS_ITEMS_COLLECTION]
+        self._channel_id = channel_id
+        self._lock = threading.Lock()
+        self.playlists: Dict[str, dict] = {}
+        self.items: Dict[str, Dict[str, dict]] = {}
+        self.resumed = False
+
+        now = now or datetime.now(timezone.utc)
+        doc = find_resumable_progress(db, channel_id, now) if resume else None
+        if doc is not None:
+            self.playlists = doc.get("playlists", {})
+            for batch_doc in self._items.find({"channel_id": channel_id}, {"shape": 1, "items": 1}):
+                shape_items = self.items.setdefault(batch_doc["shape"], {})
+                for item in batch_doc.get("items", []):
+                    shape_items[item["id"]] = item
+            self.resumed = True
+            logger.info("[%s] 前回の途中経過から再開します（開始: %s / 集めた動画ID %d 件 / 取得済みの詳細 %d 件）",
+                        channel_id, doc.get("started_at"), sum(len(s.get("ids", [])) for s in self.playlists.values()),
+                        sum(len(items) for items in self.items.values()))
+            return
+
+        self.clear()
+        self._progress.insert_one({"_id": channel_id, "started_at": now, "updated_at": now, "playlists": {}})
+
+    def playlist_state(self, playlist_id: str) -> Optional[dict]:
+        return self.playlists.get(playlist_id)
+
+    def fetched_items(self, shape: str) -> Dict[str, dict]:
+        return self.items.get(shape, {})
+
+    def save_page(self, playlist_id: str, cursor: Optional[str], page_ids: List[str], done: bool,
+                  head: Optional[str]):
+        """1ページ分の結果を追記する（動画IDは $push で足すので、ページごとに全件を送り直さない）"""
+        key = f"playlists.{playlist_id}"
+        with self._lock:
+            self._progress.update_one({"_id": self._channel_id}, {
+                "$set": {f"{key}.cursor": cursor, f"{key}.done": done, f"{key}.head": head,
+                         "updated_at": datetime.now(timezone.utc)},
+                "$push": {f"{key}.ids": {"$each": page_ids}},
+            })
+
+    def save_items(self, shape: str, items: List[dict]):
+        """videos().list の1バッチ分の項目を1件のドキュメントとして保存する（動画ごとには書かない）"""
+        if not items:
+            return
+        self._items.insert_one({"channel_id": self._channel_id, "shape": shape, "items": items,
+                                "saved_at": datetime.now(timezone.utc)})
+
+    def clear(self):
+        """途中経過を削除する（同期が最後まで終わったとき・新しく始めるとき）"""
+        self._progress.delete_one({"_id": self._channel_id})
+        self._items.delete_many({"channel_id": self._channel_id})
@@ -0,0 +1,249 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import io
+import os
+import threading
+import urllib.error
+import urllib.request
+
+from pymongo import UpdateOne
+
+from mongo_writer import channel_scope
+from sync_logging import get_logger
+
+logger = get_logger("thumbnails")
+
+# 一覧のカード用に作る幅（px）と形式（Pillow が対応しているものだけ作る）
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_FORMATS = {
+    "avif": {"format": "AVIF", "quality": 50},
+    "webp": {"format": "WEBP", "quality": 72, "method": 6},
+}
+
+# videos に記録するフィールド
+#   thumbnail_variants: {"webp": {"320": "ab/abcd…-320.webp", …}, "avif": {…}}
+#                       （Pillow が無い環境では {"original": "ab/abcd….jpg"}。パスは保存先ディレクトリからの相対パス）
+#   thumbnail_source:   変換元の thumbnail_url
+#   thumbnail_etag / thumbnail_last_modified: 取得したときの ETag / Last-Modified（条件付き GET 用）
+#   thumbnail_checked_at: 最後に取得・確認した日時
+VARIANTS_FIELD = "thumbnail_variants"
+SOURCE_FIELD = "thumbnail_source"
+DIGEST_FIELD = "thumbnail_sha256"
+ETAG_FIELD = "thumbnail_etag"
+LAST_MODIFIED_FIELD = "thumbnail_last_modified"
+CHECKED_AT_FIELD = "thumbnail_checked_at"
+
+# thumbnail_url が同じでも画像が差し替えられていないか確かめる間隔
+# （条件付き GET。変わっていなければ 304 が返り、画像は受け取らない）
+RECHECK_INTERVAL = timedelta(days=7)
+
+FETCH_TIMEOUT_SEC = 10
+MAX_THUMBNAIL_BYTES = 5 * 1024 * 1024
+USER_AGENT = "belmond-fansite-sync/1.0"
+
+
+@dataclass
+class ThumbnailStats:
+    candidates: int = 0     # thumbnail_url が変わった・未変換・確認の時期が来た動画
+    fetched: int = 0
+    not_modified: int = 0   # 条件付き GET で 304（変わっていない）だったもの
+    encoded: int = 0        # 変換したもの（同じ画像が既に保存先にあれば変換しない）
+    failed: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    updated_ids: List[str] = field(default_factory=list)   # 保存したサムネイルを記録し直した動画
+
+    def summary(self) -> str:
+        return (f"サムネイル: 対象 {self.candidates} 本 / 取得 {self.fetched} / 変更なし {self.not_modified} / "
+                f"変換 {self.encoded} / 失敗 {self.failed}"
+                f"（{self.bytes_in / 1024:.0f} KB → {self.bytes_out / 1024:.0f} KB）")
+
+
+def _pillow():
+    """Pillow はあれば使う（無ければ元の JPEG をそのまま保存する）"""
+    try:
+        from PIL import Image, features
+    except ImportError:
+        return None, []
+    formats = [name for name in THUMBNAIL_FORMATS if features.check(name)]
+    return Image, formats
+
+
+class ThumbnailStore:
+    """画像の sha256 をファイル名にした保存先（同じ画像は動画が違っても1つだけ）"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.image, self.formats = _pillow()
+
+    def _write(self, rel_path: str, data: bytes):
+        path = os.path.join(self.directory, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def variants_for(self, digest: str) -> Dict[str, Dict[str, str]]:
+        prefix = f"{digest[:2]}/{digest}"
+        if not self.formats:
+            return {"original": f"{prefix}.jpg"}
+        return {
+            name: {str(width): f"{prefix}-{width}.{name}" for width in THUMBNAIL_WIDTHS}
+            for name in self.formats
+        }
+
+    def exists(self, variants) -> bool:
+        """記録したパス（variants_for の形）のファイルがすべて保存先にあるか"""
+        paths = [variants] if isinstance(variants, str) else [
+            path for value in variants.values()
+            for path in ([value] if isinstance(value, str) else value.values())
+        ]
+        return all(os.path.exists(os.path.join(self.directory, path)) for path in paths)
+
+    def save(self, data: bytes) -> Tuple[str, Dict[str, Dict[str, str]], int]:
+        """画像を保存して (sha256, 変換結果のパス, 書き込んだバイト数) を返す。既にあれば書かない"""
+        digest = hashlib.sha256(data).hexdigest()
+        variants = self.variants_for(digest)
+        if self.exists(variants):
+            return digest, variants, 0
+        if not self.formats:
+            self._write(variants["original"], data)
+            return digest, variants, len(data)
+
+        written = 0
+        with self.image.open(io.BytesIO(data)) as source:
+            source = source.convert("RGB")
+            for name in self.formats:
+                options = THUMBNAIL_FORMATS[name]
+                for width in THUMBNAIL_WIDTHS:
+                    # 元より大きくはしない
+                    w = min(width, source.width)
+                    resized = source.resize((w, round(source.height * w / source.width)), self.image.LANCZOS)
+                    buf = io.BytesIO()
+                    resized.save(buf, **options)
+                    self._write(variants[name][str(width)], buf.getvalue())
+                    written += buf.tell()
+        return digest, variants, written
+
+
+def _fetch(url: str, timeout: float, etag: Optional[str] = None,
+           last_modified: Optional[str] = None) -> Optional[Tuple[bytes, Dict[str, Optional[str]]]]:
+    """
+    画像と検証用ヘッダー（ETag / Last-Modified）を返す。
+    etag / last_modified を渡すと条件付き GET にし、変わっていなければ（304）None を返す。
+    """
+    headers = {"User-Agent": USER_AGENT}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            data = resp.read(MAX_THUMBNAIL_BYTES + 1)
+            validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+    if len(data) > MAX_THUMBNAIL_BYTES:
+        raise ValueError(f"サムネイルが大きすぎます（{MAX_THUMBNAIL_BYTES} バイト超）")
+    return data, validators
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def mirror_thumbnails(
+    db,
+    store_dir: str,
+    channel_id: Optional[str] = None,
+    workers: int = 8,
+    chunk_size: int = 500,
+    timeout: float = FETCH_TIMEOUT_SEC,
+    recheck_interval: timedelta = RECHECK_INTERVAL,
+    now: Optional[datetime] = None
+) -> ThumbnailStats:
+    """
+    thumbnail_url が前回変換したもの（thumbnail_source）と違う動画のサムネイルを取得し、
+    幅ごとの WebP / AVIF を store_dir に保存して、パスを videos に記録する。
+    記録したファイルが store_dir に無い動画も取得し直す。
+    URL が同じでも recheck_interval ごとに条件付き GET（ETag / Last-Modified）で確かめ、
+    差し替えられていれば作り直す（変わっていなければ確認日時だけ更新する）。
+    取得・変換は workers 本までの並列で行う。失敗した動画は記録せず、次回もう一度取得する。
+    """
+    store = ThumbnailStore(store_dir)
+    stats = ThumbnailStats()
+    videos_coll = db["videos"]
+    now = now or datetime.now(timezone.utc)
+    query = {**(channel_scope(channel_id) if channel_id else {}), "thumbnail_url": {"$nin": [None, ""]}}
+    projection = {"thumbnail_url": 1, SOURCE_FIELD: 1, VARIANTS_FIELD: 1,
+                  ETAG_FIELD: 1, LAST_MODIFIED_FIELD: 1, CHECKED_AT_FIELD: 1}
+    expected_kind = set(store.formats) or {"original"}
+    # (ドキュメント, 条件付き GET にするか)
+    candidates: List[Tuple[dict, bool]] = []
+    for doc in videos_coll.find(query, projection):
+        variants = doc.get(VARIANTS_FIELD) or {}
+        # Pillow の有無・対応形式が変わった場合や、記録したファイルが保存先に無い場合
+        # （保存先を作り直した・配置前に失われたなど）も取得し直す
+        if doc.get(SOURCE_FIELD) != doc["thumbnail_url"] or set(variants) != expected_kind \
+                or not store.exists(variants):
+            candidates.append((doc, False))
+            continue
+        checked_at = _aware(doc.get(CHECKED_AT_FIELD))
+        if checked_at is None or now - checked_at >= recheck_interval:
+            candidates.append((doc, True))
+    stats.candidates = len(candidates)
+    if not candidates:
+        return stats
+    lock = threading.Lock()
+
+    def mirror_one(candidate: Tuple[dict, bool]) -> Optional[UpdateOne]:
+        doc, conditional = candidate
+        url = doc["thumbnail_url"]
+        try:
+            fetched = _fetch(url, timeout, doc.get(ETAG_FIELD), doc.get(LAST_MODIFIED_FIELD)) if conditional \
+                else _fetch(url, timeout)
+            if fetched is None:
+                with lock:
+                    stats.not_modified += 1
+                return UpdateOne({"_id": doc["_id"]}, {"$set": {CHECKED_AT_FIELD: now}})
+            data, validators = fetched
+            digest, variants, written = store.save(data)
+        except Exception as e:
+            with lock:
+                stats.failed += 1
+            logger.warning("%s のサムネイルを保存できませんでした（%s）: %s", doc["_id"], url, e)
+            return None
+        with lock:
+            stats.fetched += 1
+            stats.bytes_in += len(data)
+            stats.bytes_out += written
+            stats.encoded += 1 if written else 0
+            stats.updated_ids.append(doc["_id"])
+        return UpdateOne(
+            {"_id": doc["_id"]},
+            {"$set": {VARIANTS_FIELD: variants, SOURCE_FIELD: url, DIGEST_FIELD: digest,
+                      ETAG_FIELD: validators["etag"], LAST_MODIFIED_FIELD: validators["last_modified"],
+                      CHECKED_AT_FIELD: now}}
+        )
+
+    operations: List[UpdateOne] = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for op in executor.map(mirror_one, candidates):
+            if op is None:
+                continue
+            operations.append(op)
+            if len(operations) >= chunk_size:
+                videos_coll.bulk_write(operations, ordered=False)
+                operations = []
+    if operations:
+        videos_coll.bulk_write(operations, ordered=False)
+    return stats
@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+from zoneinfo import ZoneInfo
+import re
+
+JST = ZoneInfo("Asia/Tokyo")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ONE_MS = timedelta(milliseconds=1)
+
+# YouTube の duration は日〜秒だけ（PT1H2M3S / P1DT2H / P0D）。年・月を含むものは isodate に任せる
+_DURATION_RE = re.compile(
+    r"P(?:(?P<w>\d+)W)?(?:(?P<d>\d+)D)?(?:T(?:(?P<h>\d+)H)?(?:(?P<m>\d+)M)?(?:(?P<s>\d+(?:\.\d+)?)S)?)?"
+)
+_FRACTION_RE = re.compile(r"\.(\d+)")
+
+
+def parse_rfc3339(value: Optional[str]) -> Optional[datetime]:
+    """
+    YouTube API の日時（2025-03-01T12:34:56Z など）を UTC の aware datetime にする。
+    通常の形式は datetime.fromisoformat（C実装）でそのまま読み、
+    読めない形式（7桁以上の小数秒、オフセットの重複など）だけ整形してから読み直す。
+    オフセットの無い値は UTC とみなす。読めなければ None。
+    """
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        dt = _parse_irregular(value)
+        if dt is None:
+            return None
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def _parse_irregular(value: str) -> Optional[datetime]:
+    text = value.strip().replace("Z", "+00:00")
+    while text.endswith("+00:00+00:00"):
+        text = text[:-6]
+    # 小数秒はマイクロ秒（6桁）までにそろえる
+    text = _FRACTION_RE.sub(lambda m: "." + m.group(1)[:6].ljust(6, "0"), text, count=1)
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def parse_jst(value: Optional[str], tz: ZoneInfo = JST) -> Optional[datetime]:
+    """API の日時文字列を JST（tz）の aware datetime にする。表示・保存用の変換はここだけで行う"""
+    dt = parse_rfc3339(value)
+    return dt.astimezone(tz) if dt is not None else None
+
+
+def to_epoch_ms(dt: datetime) -> int:
+    """aware datetime（naive は UTC とみなす）を UTC エポックミリ秒にする"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // _ONE_MS
+
+
+def epoch_ms_to_jst(value: int) -> datetime:
+    return (_EPOCH + value * _ONE_MS).astimezone(JST)
+
+
+@lru_cache(maxsize=4096)
+def parse_duration_seconds(value: str) -> Optional[float]:
+    """
+    ISO 8601 の duration を秒にする。同じ文字列（PT0S や定番の尺）が繰り返し出てくるので結果をキャッシュする。
+    読めなければ None。
+    """
+    match = _DURATION_RE.fullmatch(value)
+    if match and value not in ("P", "PT") and not value.endswith("T"):
+        w, d, h, m, s = match.group("w", "d", "h", "m", "s")
+        return float(
+            (int(w) * 604800 if w else 0)
+            + (int(d) * 86400 if d else 0)
+            + (int(h) * 3600 if h else 0)
+            + (int(m) * 60 if m else 0)
+        ) + (float(s) if s else 0.0)
+    try:
+        import isodate
+        return isodate.parse_duration(value).total_seconds()
+    except Exception:
+        return None
+
+
+def _benchmark(count: int = 50_000, repeat: int = 5):
+    """
+    従来の変換（fromisoformat + replace / isodate）との比較。
+    1回だけの計測はぶれが大きい（同じ環境でも 1.3〜2.4 倍）ので、repeat 回のうち最速の値で比べる。
+    最速値どうしの比は多くの実行でおよそ 1.8〜2.0 倍。
+    timeparse 側は毎回 duration の LRU キャッシュを空にしてから計測する。
+    """
+    import random
+    import time
+
+    import isodate
+
+    base = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    stamps = [(base + timedelta(seconds=random.randrange(5 * 365 * 86400))).strftime("%Y-%m-%dT%H:%M:%SZ")
+              for _ in range(count * 4)]
+    durations = [f"PT{random.randrange(4)}H{random.randrange(60)}M{random.randrange(60)}S" for _ in range(count)]
+
+    def old():
+        for s in stamps:
+            datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(JST)
+        for d in durations:
+            isodate.parse_duration(d).total_seconds()
+
+    def new():
+        for s in stamps:
+            parse_jst(s)
+        for d in durations:
+            parse_duration_seconds(d)
+
+    for s in stamps[:1000]:
+        assert parse_jst(s) == datetime.fromisoformat(s.replace("Z", "+00:00")).astimezone(JST)
+    for d in durations[:1000]:
+        assert parse_duration_seconds(d) == isodate.parse_duration(d).total_seconds()
+
+    results = {}
+    for name, fn in [("従来", old), ("timeparse", new)]:
+        timings = []
+        for _ in range(repeat):
+            parse_duration_seconds.cache_clear()
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+    print(f"動画 {count} 本分（日時 {len(stamps)} 件 + duration {len(durations)} 件、{repeat} 回中の最速）")
+    for name, sec in results.items():
+        print(f"  {name:10s}: {sec:.3f} 秒")
+    print(f"  速度比: {results['従来'] / results['timeparse']:.1f} 倍")
+
+
+if __name__ == "__main__":
+    _benchmark()
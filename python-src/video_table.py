@@ -0,0 +1,331 @@
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from timeparse import JST, epoch_ms_to_jst, to_epoch_ms
+from youtubedataapi import Weekday, YoutubeContentType, YoutubeVideoDetail
+
+# 欠損値（None）の表現
+_NO_TIME = -(2 ** 63)
+_NO_INT = -1
+
+# サムネイルURLはほぼこの形式なので、末尾のファイル名だけをコード化して持つ
+_THUMBNAIL_PREFIX = "https://i.ytimg.com/vi/"
+
+_CATEGORIES: List[YoutubeContentType] = list(YoutubeContentType)
+_CATEGORY_CODES: Dict[YoutubeContentType, int] = {c: i for i, c in enumerate(_CATEGORIES)}
+_WEEKDAYS: List[Weekday] = list(Weekday)
+
+
+def _to_epoch_ms(dt: Optional[datetime]) -> int:
+    if dt is None:
+        return _NO_TIME
+    return to_epoch_ms(dt)
+
+
+def _from_epoch_ms(value: int) -> Optional[datetime]:
+    if value == _NO_TIME:
+        return None
+    return epoch_ms_to_jst(value)
+
+
+class _Interner:
+    """同じ値を1つのコードにまとめる（live_status や再生リストの組み合わせなど）"""
+
+    def __init__(self):
+        self.values: List = []
+        self._codes: Dict = {}
+
+    def code(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self._codes[value] = code
+        return code
+
+
+class VideoTable:
+    """
+    YoutubeVideoDetail のリストの代わりに使う列指向の動画ストア。
+    数値・日時は array の列（日時はUTCエポックのミリ秒）、カテゴリ・曜日・live_status・
+    所属再生リストはコード化して持つ。1行は VideoRow として YoutubeVideoDetail と同じ属性で読み書きできる。
+    """
+
+    _TIME_COLUMNS = ("published_at", "scheduled_start_time", "actual_start_time", "actual_end_time")
+    _OPTIONAL_INT_COLUMNS = ("view_count", "like_count", "comment_count", "concurrent_viewers")
+    _INT_COLUMNS = ("consecutive_broadcast_days", "same_day_broadcast_count", "days_since_last_broadcast")
+    _BOOL_COLUMNS = ("is_live_now", "was_broadcast_yesterday", "is_holiday")
+
+    def __init__(self):
+        self.video_id: List[str] = []
+        self.title: List[str] = []
+        self.thumbnail = array("I")
+        self.duration_sec = array("d")
+        self.category = array("b")
+        self.weekday = array("b")
+        self.live_status = array("H")
+        self.playlists = array("I")
+        for name in self._TIME_COLUMNS + self._OPTIONAL_INT_COLUMNS:
+            setattr(self, name, array("q"))
+        for name in self._INT_COLUMNS:
+            setattr(self, name, array("i"))
+        for name in self._BOOL_COLUMNS:
+            setattr(self, name, array("b"))
+
+        self._live_statuses = _Interner()
+        self._thumbnails = _Interner()
+        self._playlist_sets = _Interner()
+        self._index: Dict[str, int] = {}
+
+    @classmethod
+    def from_details(cls, videos: Iterable) -> "VideoTable":
+        """YoutubeVideoDetail（または同じ属性を持つオブジェクト）の列から作る。ジェネレータでもよい"""
+        table = cls()
+        for video in videos:
+            table.append(video)
+        return table
+
+    def append(self, video) -> "VideoRow":
+        i = len(self.video_id)
+        self._index[video.video_id] = i
+        self.video_id.append(video.video_id)
+        self.title.append(video.title)
+        self.thumbnail.append(self._thumbnails.code(_pack_thumbnail(video.video_id, video.thumbnail_url)))
+        self.duration_sec.append(float(video.duration_sec or 0.0))
+        self.category.append(_CATEGORY_CODES[video.content_category or YoutubeContentType.UNKNOWN])
+        self.weekday.append(video.weekday.value if video.weekday is not None else _NO_INT)
+        self.live_status.append(self._live_statuses.code(video.live_status))
+        self.playlists.append(self._playlist_sets.code(tuple(video.playlist_titles)))
+        for name in self._TIME_COLUMNS:
+            getattr(self, name).append(_to_epoch_ms(getattr(video, name)))
+        for name in self._OPTIONAL_INT_COLUMNS:
+            value = getattr(video, name)
+            getattr(self, name).append(_NO_INT if value is None else int(value))
+        for name in self._INT_COLUMNS:
+            getattr(self, name).append(int(getattr(video, name)))
+        for name in self._BOOL_COLUMNS:
+            getattr(self, name).append(1 if getattr(video, name) else 0)
+        return VideoRow(self, i)
+
+    def __len__(self) -> int:
+        return len(self.video_id)
+
+    def __iter__(self) -> Iterator["VideoRow"]:
+        for i in range(len(self.video_id)):
+            yield VideoRow(self, i)
+
+    def __getitem__(self, i: int) -> "VideoRow":
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return VideoRow(self, i)
+
+    def get(self, video_id: str) -> Optional["VideoRow"]:
+        i = self._index.get(video_id)
+        return None if i is None else VideoRow(self, i)
+
+    def to_details(self) -> List[YoutubeVideoDetail]:
+        return [row.to_detail() for row in self]
+
+
+def _pack_thumbnail(video_id: str, url: Optional[str]) -> Optional[str]:
+    """i.ytimg.com の標準形式なら末尾のファイル名だけにする（それ以外はURLのまま）"""
+    prefix = f"{_THUMBNAIL_PREFIX}{video_id}/"
+    if url and url.startswith(prefix) and "/" not in url[len(prefix):]:
+        return url[len(prefix):]
+    return url
+
+
+def _unpack_thumbnail(video_id: str, packed: Optional[str]) -> Optional[str]:
+    if packed and "/" not in packed:
+        return f"{_THUMBNAIL_PREFIX}{video_id}/{packed}"
+    return packed
+
+
+def _time_property(name: str):
+    def getter(self):
+        return _from_epoch_ms(getattr(self._table, name)[self._i])
+
+    def setter(self, value):
+        getattr(self._table, name)[self._i] = _to_epoch_ms(value)
+    return property(getter, setter)
+
+
+def _optional_int_property(name: str):
+    def getter(self):
+        value = getattr(self._table, name)[self._i]
+        return None if value == _NO_INT else value
+
+    def setter(self, value):
+        getattr(self._table, name)[self._i] = _NO_INT if value is None else int(value)
+    return property(getter, setter)
+
+
+def _plain_property(name: str, to_python=lambda v: v, to_column=lambda v: v):
+    def getter(self):
+        return to_python(getattr(self._table, name)[self._i])
+
+    def setter(self, value):
+        getattr(self._table, name)[self._i] = to_column(value)
+    return property(getter, setter)
+
+
+class VideoRow:
+    """VideoTable の1行。YoutubeVideoDetail と同じ属性名で読み書きできる軽量ビュー"""
+
+    __slots__ = ("_table", "_i")
+
+    def __init__(self, table: VideoTable, i: int):
+        self._table = table
+        self._i = i
+
+    video_id = _plain_property("video_id")
+    title = _plain_property("title")
+    duration_sec = _plain_property("duration_sec", to_column=lambda v: float(v or 0.0))
+
+    published_at = _time_property("published_at")
+    scheduled_start_time = _time_property("scheduled_start_time")
+    actual_start_time = _time_property("actual_start_time")
+    actual_end_time = _time_property("actual_end_time")
+
+    view_count = _optional_int_property("view_count")
+    like_count = _optional_int_property("like_count")
+    comment_count = _optional_int_property("comment_count")
+    concurrent_viewers = _optional_int_property("concurrent_viewers")
+
+    consecutive_broadcast_days = _plain_property("consecutive_broadcast_days")
+    same_day_broadcast_count = _plain_property("same_day_broadcast_count")
+    days_since_last_broadcast = _plain_property("days_since_last_broadcast")
+
+    is_live_now = _plain_property("is_live_now", bool, lambda v: 1 if v else 0)
+    was_broadcast_yesterday = _plain_property("was_broadcast_yesterday", bool, lambda v: 1 if v else 0)
+    is_holiday = _plain_property("is_holiday", bool, lambda v: 1 if v else 0)
+
+    @property
+    def content_category(self) -> YoutubeContentType:
+        return _CATEGORIES[self._table.category[self._i]]
+
+    @content_category.setter
+    def content_category(self, value: YoutubeContentType):
+        self._table.category[self._i] = _CATEGORY_CODES[value or YoutubeContentType.UNKNOWN]
+
+    @property
+    def weekday(self) -> Optional[Weekday]:
+        code = self._table.weekday[self._i]
+        return None if code == _NO_INT else _WEEKDAYS[code]
+
+    @weekday.setter
+    def weekday(self, value: Optional[Weekday]):
+        self._table.weekday[self._i] = _NO_INT if value is None else value.value
+
+    @property
+    def thumbnail_url(self) -> Optional[str]:
+        return _unpack_thumbnail(self.video_id, self._table._thumbnails.values[self._table.thumbnail[self._i]])
+
+    @thumbnail_url.setter
+    def thumbnail_url(self, value: Optional[str]):
+        self._table.thumbnail[self._i] = self._table._thumbnails.code(_pack_thumbnail(self.video_id, value))
+
+    @property
+    def live_status(self) -> str:
+        return self._table._live_statuses.values[self._table.live_status[self._i]]
+
+    @live_status.setter
+    def live_status(self, value: str):
+        self._table.live_status[self._i] = self._table._live_statuses.code(value)
+
+    @property
+    def playlist_titles(self) -> List[str]:
+        return list(self._table._playlist_sets.values[self._table.playlists[self._i]])
+
+    @playlist_titles.setter
+    def playlist_titles(self, value: List[str]):
+        self._table.playlists[self._i] = self._table._playlist_sets.code(tuple(value))
+
+    @property
+    def duration(self) -> Optional[timedelta]:
+        start, end = self.actual_start_time, self.actual_end_time
+        return end - start if start and end else None
+
+    @property
+    def url(self) -> str:
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
+    def to_detail(self) -> YoutubeVideoDetail:
+        return YoutubeVideoDetail(
+            title=self.title,
+            video_id=self.video_id,
+            published_at=self.published_at,
+            view_count=self.view_count,
+            like_count=self.like_count,
+            comment_count=self.comment_count,
+            is_live_now=self.is_live_now,
+            live_status=self.live_status,
+            scheduled_start_time=self.scheduled_start_time,
+            actual_start_time=self.actual_start_time,
+            actual_end_time=self.actual_end_time,
+            concurrent_viewers=self.concurrent_viewers,
+            duration=self.duration,
+            duration_sec=self.duration_sec,
+            content_category=self.content_category,
+            was_broadcast_yesterday=self.was_broadcast_yesterday,
+            weekday=self.weekday,
+            is_holiday=self.is_holiday,
+            consecutive_broadcast_days=self.consecutive_broadcast_days,
+            same_day_broadcast_count=self.same_day_broadcast_count,
+            days_since_last_broadcast=self.days_since_last_broadcast,
+            thumbnail_url=self.thumbnail_url,
+            playlist_titles=self.playlist_titles,
+        )
+
+    def __repr__(self) -> str:
+        return f"VideoRow({self.video_id!r}, {self.title!r})"
+
+
+def benchmark_memory(count: int = 20000) -> Tuple[int, int]:
+    """同じ内容の dataclass リストと VideoTable の確保メモリ（バイト）を比較する"""
+    import tracemalloc
+
+    base = datetime(2020, 1, 1, tzinfo=JST)
+    playlist_sets = [[], ["歌枠"], ["歌枠", "コラボ"], ["ゲーム実況"]]
+
+    def make(i: int) -> YoutubeVideoDetail:
+        published = base + timedelta(hours=7 * i)
+        return YoutubeVideoDetail(
+            title=f"テスト動画 {i}",
+            video_id=f"vid{i:08d}",
+            published_at=published,
+            view_count=i * 13,
+            like_count=i,
+            comment_count=i // 3,
+            live_status="none",
+            scheduled_start_time=published,
+            actual_start_time=published,
+            actual_end_time=published + timedelta(hours=2),
+            duration_sec=7200.0,
+            content_category=_CATEGORIES[i % 3],
+            weekday=Weekday(published.weekday()),
+            thumbnail_url=f"https://i.ytimg.com/vi/vid{i:08d}/maxresdefault.jpg",
+            playlist_titles=list(playlist_sets[i % len(playlist_sets)]),
+        )
+
+    tracemalloc.start()
+    details = [make(i) for i in range(count)]
+    detail_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    table = VideoTable.from_details(make(i) for i in range(count))
+    table_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del details, table
+    return detail_bytes, table_bytes
+
+
+if __name__ == "__main__":
+    detail_bytes, table_bytes = benchmark_memory()
+    print(f"dataclass リスト: {detail_bytes / 1024 / 1024:.1f} MB")
+    print(f"VideoTable      : {table_bytes / 1024 / 1024:.1f} MB（{detail_bytes / max(table_bytes, 1):.1f} 倍小さい）")
@@ -1,45 +1,31 @@
 from dataclasses import dataclass, field
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from enum import Enum
 from datetime import datetime, date, timedelta
-from typing import List, Optional, Set, Tuple
+from typing import TYPE_CHECKING, List, Optional, Set, Tuple
 from zoneinfo import ZoneInfo
-from collections import defaultdict
-import requests
-import pandas as pd
-import io
-import isodate
-
-# ── グローバルキャッシュ（変更なし） ──
-HOLIDAYS_CACHE: Set[date] = set()
-_HOLIDAYS_LOADED = False
-
-def load_japanese_holidays_once():
-    global HOLIDAYS_CACHE, _HOLIDAYS_LOADED
-    if _HOLIDAYS_LOADED:
-        return
-    url = "https://www8.cao.go.jp/chosei/shukujitsu/syukujitsu.csv"
-    try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        df = pd.read_csv(io.StringIO(resp.text), encoding="shift-jis")
-        date_col, name_col = df.columns[0], df.columns[1]
-        for _, row in df.iterrows():
-            date_str = row[date_col].strip()
-            try:
-                ymd = [int(x) for x in date_str.split("/")]
-                if len(ymd) == 3:
-                    HOLIDAYS_CACHE.add(date(ymd[0], ymd[1], ymd[2]))
-            except:
-                pass
-        print(f"内閣府祝日データをロード完了: {len(HOLIDAYS_CACHE)}件")
-        _HOLIDAYS_LOADED = True
-    except Exception as e:
-        print(f"祝日CSV取得エラー: {e}")
-        _HOLIDAYS_LOADED = True
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+from fetch_engine import QuotaBudget, QuotaExceededError, fetch_uploads_concurrently, get_client_pool
+from http_cache import ResponseCache
+from jp_holidays import japanese_holidays
+from instrumentation import run_metrics
+from request_masks import REQUEST_SHAPES
+from sync_logging import ProgressCounter, get_logger
+from timeparse import parse_duration_seconds, parse_jst
+
+if TYPE_CHECKING:
+    from sync_progress import FetchProgress
+
+logger = get_logger("youtube")
 
-load_japanese_holidays_once()
+# 1件ごとのログの代わりに進捗を出す間隔（件数）
+PROGRESS_EVERY = 500
+
+# 祝日カレンダーは最初の問い合わせ時に読み込む（import 時にネットワークへ出ない）
+HOLIDAYS_CACHE = japanese_holidays
 
 
 class YoutubeOrder(Enum):
@@ -117,6 +103,14 @@ class YoutubeVideoDetail:
     def url(self) -> str:
         return f"https://www.youtube.com/watch?v={self.video_id}"
 
+@dataclass
+class PlaylistMember:
+    """再生リストの1項目（playlistItems の position と、再生リストに追加された日時）"""
+    video_id: str
+    position: int
+    added_at: Optional[datetime] = None
+
+
 @dataclass
 class YoutubePlayData:
     title: str = ""
@@ -124,6 +118,24 @@ class YoutubePlayData:
     video_count: int = 0
     published_at: Optional[datetime] = None
     thumbnails : str = ""
+    etag: str = ""
+
+    # scan_playlist_members の走査結果（前回走査時の etag / 動画数と所属動画ID）
+    scanned_etag: str = ""
+    scanned_video_count: Optional[int] = None
+    member_video_ids: List[str] = field(default_factory=list)
+    # 今回の実行で走査し直した場合 True（保存対象の判定用。DBには保存しない）
+    member_scan_updated: bool = False
+    # 走査し直した場合の所属（位置・追加日時。playlist_members に保存する）
+    members: List[PlaylistMember] = field(default_factory=list)
+
+    def is_member_scan_fresh(self) -> bool:
+        """前回の走査結果がそのまま使えるか（etag と動画数が変わっていない）"""
+        return (
+            bool(self.scanned_etag)
+            and self.scanned_etag == self.etag
+            and self.scanned_video_count == self.video_count
+        )
 
 
 @dataclass
@@ -135,14 +147,165 @@ class YoutubeDataFind:
     LiveID: str = ""
     Order: YoutubeOrder = YoutubeOrder.DATE
     MaxResults: int = 200
+    # 並列取得のワーカー数（プレイリストのページングと videos().list を同じプールで実行）
+    Workers: int = 4
+    # True の場合、動画を YoutubeVideoDetail のリストではなく列指向の VideoTable で返す
+    AsTable: bool = False
+    # YouTube API のレスポンスキャッシュ（ETag / If-None-Match）。None ならキャッシュしない
+    Cache: Optional[ResponseCache] = None
+    # 複数チャンネルで共有する API クォータ予算。None なら制限しない
+    Budget: Optional[QuotaBudget] = None
+
+    # 差分同期: True の場合 KnownVideos（MongoDBに保存済みの動画）を起点に、
+    # 新着動画の詳細と再取得時期が来た動画の統計だけを取得する
+    Incremental: bool = False
+    KnownVideos: List[YoutubeVideoDetail] = field(default_factory=list)
+    # ティア名 → 前回統計を再取得した時刻（チェックポイントから読み込む）
+    TierRefreshedAt: dict = field(default_factory=dict)
+    # 取得後に書き込まれる同期チェックポイント（channels コレクションに保存する）
+    Checkpoint: dict = field(default_factory=dict)
+    # フル同期の途中経過（ページトークン・集めた動画ID・取得済みの詳細）を保存・復元する。None なら保存しない
+    Progress: Optional["FetchProgress"] = None
+
+
+# 差分同期時の統計再取得スケジュール（ティア名, 公開からの経過時間の上限, 再取得間隔）
+# 再取得時刻はティア単位でチェックポイントに記録する（動画ごとに持つと毎回全ドキュメントが更新扱いになるため）
+STATS_REFRESH_TIERS: List[Tuple[str, Optional[timedelta], timedelta]] = [
+    ("recent",  timedelta(days=2),  timedelta(0)),         # 公開2日以内: 毎回
+    ("weeks",   timedelta(days=14), timedelta(hours=3)),   # 2週間以内: 3時間ごと
+    ("months",  timedelta(days=90), timedelta(hours=24)),  # 3ヶ月以内: 1日ごと
+    ("archive", None,               timedelta(days=7)),    # それ以前: 1週間ごと
+]
+
+
+def stats_refresh_tier(video: YoutubeVideoDetail, now: datetime) -> str:
+    """動画の公開からの経過時間で統計再取得のティアを決める"""
+    if not video.published_at:
+        return STATS_REFRESH_TIERS[0][0]
+    age = now - video.published_at
+    for name, max_age, _ in STATS_REFRESH_TIERS:
+        if max_age is None or age <= max_age:
+            return name
+    return STATS_REFRESH_TIERS[-1][0]
+
+
+def due_stats_refresh_tiers(tier_refreshed_at: dict, now: datetime) -> Set[str]:
+    """前回の再取得から間隔が経過したティア名の集合"""
+    due = set()
+    for name, _, interval in STATS_REFRESH_TIERS:
+        last = tier_refreshed_at.get(name)
+        if last is None or now - last >= interval:
+            due.add(name)
+    return due
+
+
+def _build_video_detail(item: dict, category: YoutubeContentType, jst: ZoneInfo) -> YoutubeVideoDetail:
+    """videos().list のレスポンス1件を YoutubeVideoDetail に変換"""
+    snip = item["snippet"]
+    stats = item.get("statistics", {})
+    live = item.get("liveStreamingDetails", {})
+    content = item.get("contentDetails", {})
+
+    published_at = parse_jst(snip.get("publishedAt"), jst)
+
+    duration_sec = 0
+    if "duration" in content:
+        duration_sec = parse_duration_seconds(content["duration"]) or 0
+
+    sched_start = parse_jst(live.get("scheduledStartTime"), jst)
+    act_start = parse_jst(live.get("actualStartTime"), jst)
+    act_end = None
+    if not act_start:
+        act_start = published_at
+    if not sched_start:
+        sched_start = act_start
+    if not published_at:
+        published_at = act_start
+    if "actualEndTime" in live:
+        act_end = parse_jst(live["actualEndTime"], jst)
+        published_at = act_end
+
+    thumbnails = snip.get("thumbnails", {})
+    thumbnail_url = None
+
+    # 優先順位をつけて選ぶ（おすすめはこの順番）
+    for quality in ["maxres", "high", "standard", "medium", "default"]:
+        if quality in thumbnails:
+            thumbnail_url = thumbnails[quality]["url"]
+            break
+
+    detail = YoutubeVideoDetail(
+        title=snip["title"],
+        video_id=item["id"],
+        published_at=published_at,
+        view_count=int(stats.get("viewCount", 0)) if stats.get("viewCount") else None,
+        like_count=int(stats.get("likeCount", 0)) if stats.get("likeCount") else None,
+        comment_count=int(stats.get("commentCount", 0)) if stats.get("commentCount") else None,
+        is_live_now=bool(live.get("concurrentViewers")),
+        live_status=snip.get("liveBroadcastContent", "none"),
+        scheduled_start_time=sched_start,
+        actual_start_time=act_start,
+        actual_end_time=act_end,
+        concurrent_viewers=int(live["concurrentViewers"]) if live.get("concurrentViewers") else None,
+        duration_sec=duration_sec,
+        content_category=category,   # ← ここでEnumを設定
+        thumbnail_url=thumbnail_url
+    )
+
+    if detail.actual_start_time and detail.actual_end_time:
+        detail.duration = detail.actual_end_time - detail.actual_start_time
+
+    return detail
+
+
+def _apply_stats_refresh(video: YoutubeVideoDetail, item: dict):
+    """statistics だけの軽量レスポンス（video_stats）で既存動画の統計を上書き"""
+    stats = item.get("statistics", {})
+    video.view_count = int(stats["viewCount"]) if stats.get("viewCount") else video.view_count
+    video.like_count = int(stats["likeCount"]) if stats.get("likeCount") else video.like_count
+    video.comment_count = int(stats["commentCount"]) if stats.get("commentCount") else video.comment_count
+
+
+def _build_channel(item: dict) -> Tuple[YoutubeUser, str]:
+    """channels().list の1件から (チャンネル情報, 通常アップロードのプレイリストID)"""
+    user = YoutubeUser(name=item["snippet"]["title"], followers=item["statistics"]["subscriberCount"])
+    return user, item["contentDetails"]["relatedPlaylists"]["uploads"]
+
+
+def _build_playlist(item: dict, jst: ZoneInfo) -> YoutubePlayData:
+    """playlists().list の1件を YoutubePlayData にする"""
+    published_at = None
+    if pub_str := item["snippet"].get("publishedAt"):
+        published_at = parse_jst(pub_str, jst)
+        if published_at is None:
+            logger.warning("publishedAt パース失敗（スキップ）: %s", pub_str)
+    thumbnails = item["snippet"].get("thumbnails")
+    return YoutubePlayData(
+        title=item["snippet"]["title"],
+        playlist_id=item["id"],
+        video_count=item["contentDetails"]["itemCount"],
+        published_at=published_at,
+        thumbnails=thumbnails["high"]["url"] if thumbnails and thumbnails.get("high") else "",
+        etag=item.get("etag", "")
+    )
+
+
+def _build_playlist_member(item: dict, default_position: int, jst: ZoneInfo) -> PlaylistMember:
+    """playlistItems().list（playlist_members）の1件。position が無ければ default_position"""
+    snip = item.get("snippet", {})
+    return PlaylistMember(
+        video_id=item["contentDetails"]["videoId"],
+        position=snip.get("position", default_position),
+        added_at=parse_jst(snip.get("publishedAt"), jst)
+    )
 
 
 def get_youtube_data(findData: YoutubeDataFind) -> tuple[YoutubeUser,List[YoutubeVideoDetail],List[YoutubePlayData]]:
     if not findData.Api:
-        print("APIキーが設定されていません。")
+        logger.error("APIキーが設定されていません。")
         return []
     if not findData.ChannelId:
-        print("チャンネルIDが設定されていません。")
+        logger.error("チャンネルIDが設定されていません。")
         return []
 
     # プレイリストID生成（元のロジックそのまま）
@@ -150,28 +313,23 @@ def get_youtube_data(findData: YoutubeDataFind) -> tuple[YoutubeUser,List[Youtub
     findData.VideoID = findData.ChannelId.replace("UC", "UULF", 1)
     findData.LiveID  = findData.ChannelId.replace("UC", "UULV", 1)
 
-    youtube = build('youtube', 'v3', developerKey=findData.Api)
+    client_pool = get_client_pool(findData.Api, findData.Cache, findData.Budget)
+    youtube = client_pool.get()
     jst = ZoneInfo("Asia/Tokyo")
 
     try:
-        youtubeuser = YoutubeUser()
-        
         # 1. チャンネル情報取得 → 通常アップロードplaylist
-        channel_resp = youtube.channels().list(
-            part="contentDetails,statistics,snippet",
-            id=findData.ChannelId
-        ).execute()
+        with run_metrics.phase("channel_lookup"):
+            channel_resp = youtube.channels().list(
+                id=findData.ChannelId,
+                **REQUEST_SHAPES["channels"]
+            ).execute()
 
         if not channel_resp.get("items"):
-            print("チャンネルが見つかりません")
+            logger.warning("チャンネルが見つかりません")
             return None,[],[]
 
-        subscriber_count = channel_resp['items'][0]['statistics']['subscriberCount']
-        channel_title = channel_resp['items'][0]['snippet']['title']
-        uploads_normal = channel_resp["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
-        
-        youtubeuser.followers = subscriber_count
-        youtubeuser.name = channel_title
+        youtubeuser, uploads_normal = _build_channel(channel_resp["items"][0])
 
         # 対象プレイリスト（全部取得する方針）
         target_playlists = {
@@ -180,136 +338,120 @@ def get_youtube_data(findData: YoutubeDataFind) -> tuple[YoutubeUser,List[Youtub
             YoutubeContentType.LIVE:         findData.LiveID,
         }
 
-        # 2. 全プレイリストから動画ID収集
+        # 2. 全プレイリストから動画ID収集 + 3. 詳細バッチ取得
+        # 3つのプレイリストを並列にページングし、IDが50件たまるごとに videos().list を先行実行する
+        # 差分同期では既知の動画IDに到達した時点でそのプレイリストのページングを打ち切る
+        known_by_id: dict[str, YoutubeVideoDetail] = {}
+        if findData.Incremental:
+            known_by_id = {v.video_id: v for v in findData.KnownVideos}
+
+        # 差分同期: 配信中/予定の動画は詳細ごと取り直し、それ以外は再取得時期が来たものだけ統計を取る
+        now = datetime.now(jst)
+        due_tiers = due_stats_refresh_tiers(findData.TierRefreshedAt, now) if findData.Incremental else {
+            name for name, _, _ in STATS_REFRESH_TIERS
+        }
+        live_known_ids: List[str] = []
+        refresh_ids: List[str] = []
+        for vid, known in known_by_id.items():
+            if known.live_status in ("live", "upcoming"):
+                live_known_ids.append(vid)
+            elif stats_refresh_tier(known, now) in due_tiers:
+                refresh_ids.append(vid)
+
+        uploads_start = time.perf_counter()
+        fetched = fetch_uploads_concurrently(
+            client_pool,
+            list(target_playlists.items()),
+            stop_ids=set(known_by_id),
+            max_results=findData.MaxResults,
+            extra_detail_ids=live_known_ids,
+            stats_only_ids=refresh_ids,
+            workers=findData.Workers,
+            progress=findData.Progress
+        )
+        run_metrics.record_phase("fetch_uploads", time.perf_counter() - uploads_start)
+
+        # プレイリスト定義順に連結（逐次実行時と同じ順序・同じカテゴリ割り当てになる）
         video_ids: List[str] = []
         video_to_category: dict[str, YoutubeContentType] = {}  # videoId → カテゴリ
-
-        fetched_count = 0
-        next_page_token: Optional[str] = None
-
-        for category, playlist_id in target_playlists.items():
-            next_page_token = None
-            while True:
-                try:
-                    if findData.MaxResults > 0 and fetched_count >= findData.MaxResults:
-                        break
-
-                    responce = youtube.playlistItems().list(
-                        part="snippet,contentDetails",
-                        playlistId=playlist_id,
-                        maxResults=50,
-                        pageToken=next_page_token
-                    )
-
-                    if not responce:
-                        print(f"プレイリストの取得に失敗しました: {playlist_id}")
-                        break
-                    pl_resp = responce.execute()
-
-                    for item in pl_resp.get("items", []):
-                        if findData.MaxResults > 0 and fetched_count >= findData.MaxResults:
-                            break
-                        vid = item["contentDetails"]["videoId"]
-                        video_ids.append(vid)
-                        video_to_category[vid] = category   # ← ここで紐付け
-                        fetched_count += 1
-
-                    next_page_token = pl_resp.get("nextPageToken")
-                    if not next_page_token:
-                        break
-                except HttpError as e:
-                    print(f"プレイリスト取得中にエラー発生: {e}")
+        for category, ids in fetched.playlist_video_ids.items():
+            for vid in ids:
+                if findData.MaxResults > 0 and len(video_ids) >= findData.MaxResults:
                     break
+                video_ids.append(vid)
+                video_to_category[vid] = category   # ← ここで紐付け
 
-        if not video_ids:
+        if not video_ids and not known_by_id:
             return None,[],[]
 
         # 重複除去（稀に同じ動画が複数プレイリストに入る可能性を考慮）
         video_ids = list(dict.fromkeys(video_ids))
+        for vid in live_known_ids:
+            if vid not in video_to_category:
+                video_ids.append(vid)
+                video_to_category[vid] = known_by_id[vid].content_category
 
-        # 3. 詳細バッチ取得（ほぼ元のロジックそのまま）
         videos: List[YoutubeVideoDetail] = []
-        for i in range(0, len(video_ids), 50):
-            batch = video_ids[i:i+50]
-            vid_resp = youtube.videos().list(
-                part="snippet,statistics,liveStreamingDetails,contentDetails",
-                id=",".join(batch)
-            ).execute()
-
-            for item in vid_resp.get("items", []):
-                snip = item["snippet"]
-                stats = item.get("statistics", {})
-                live = item.get("liveStreamingDetails", {})
-                content = item.get("contentDetails", {})
-                
-
-                    
-
-                published_at = None
-                if pub_str := snip.get("publishedAt"):
-                    dt_utc = datetime.fromisoformat(pub_str.replace("Z", "+00:00"))
-                    published_at = dt_utc.astimezone(jst)
-
-                duration_sec = 0
-                if "duration" in content:
-                    try:
-                        duration_sec = isodate.parse_duration(content["duration"]).total_seconds()
-                    except:
-                        pass
-
-                sched_start = act_start = act_end = None
-                if "scheduledStartTime" in live:
-                    sched_start = datetime.fromisoformat(live["scheduledStartTime"].replace("Z", "+00:00")).astimezone(jst)
-                if "actualStartTime" in live:
-                    act_start = datetime.fromisoformat(live["actualStartTime"].replace("Z", "+00:00")).astimezone(jst)
-                if not act_start:
-                    act_start = published_at
-                if not sched_start:
-                    sched_start = act_start
-                if not published_at:
-                    published_at = act_start
-                if "actualEndTime" in live:
-                    act_end = datetime.fromisoformat(live["actualEndTime"].replace("Z", "+00:00")).astimezone(jst)
-                    published_at = act_end
-                    
-                thumbnails = snip.get("thumbnails", {})
-                thumbnail_url = None
-
-                # 優先順位をつけて選ぶ（おすすめはこの順番）
-                for quality in ["maxres", "high", "standard", "medium", "default"]:
-                    if quality in thumbnails:
-                        thumbnail_url = thumbnails[quality]["url"]
-                        break
-
-                
-
-                # カテゴリをプレイリスト由来で決定
-                category = video_to_category.get(item["id"], YoutubeContentType.UNKNOWN)
-
-
-                detail = YoutubeVideoDetail(
-                    title=snip["title"],
-                    video_id=item["id"],
-                    published_at=published_at,
-                    view_count=int(stats.get("viewCount", 0)) if stats.get("viewCount") else None,
-                    like_count=int(stats.get("likeCount", 0)) if stats.get("likeCount") else None,
-                    comment_count=int(stats.get("commentCount", 0)) if stats.get("commentCount") else None,
-                    is_live_now=bool(live.get("concurrentViewers")),
-                    live_status=snip.get("liveBroadcastContent", "none"),
-                    scheduled_start_time=sched_start,
-                    actual_start_time=act_start,
-                    actual_end_time=act_end,
-                    concurrent_viewers=int(live["concurrentViewers"]) if live.get("concurrentViewers") else None,
-                    duration_sec=duration_sec,
-                    content_category=category,   # ← ここでEnumを設定
-                    thumbnail_url=thumbnail_url
-                )
-
-                if detail.actual_start_time and detail.actual_end_time:
-                    detail.duration = detail.actual_end_time - detail.actual_start_time
-
-                videos.append(detail)
-                print(f"取得動画: {detail.title} (ID: {detail.video_id}, カテゴリ: {detail.content_category.value})")
+        progress = ProgressCounter(logger, "取得動画", total=len(video_ids), every=PROGRESS_EVERY)
+        log_each_video = logger.isEnabledFor(logging.DEBUG)
+        for vid in video_ids:
+            item = fetched.detail_items.get(vid)
+            if item is None:
+                continue
+            # カテゴリをプレイリスト由来で決定
+            category = video_to_category.get(vid, YoutubeContentType.UNKNOWN)
+            detail = _build_video_detail(item, category, jst)
+
+            known = known_by_id.get(detail.video_id)
+            if known:
+                detail.playlist_titles = known.playlist_titles
+
+            videos.append(detail)
+            if log_each_video:
+                logger.debug("取得動画: %s (ID: %s, カテゴリ: %s)",
+                             detail.title, detail.video_id, detail.content_category.value)
+            progress.advance()
+        progress.done()
+
+        # 差分同期: レスポンスに含まれない動画は削除/非公開とみなして除外する
+        # （取得に失敗したバッチの動画は保存済みの内容のまま残す）
+        failed_ids = set(fetched.failed_video_ids)
+        removed_ids: Set[str] = {
+            vid for vid in live_known_ids if vid not in fetched.detail_items and vid not in failed_ids
+        }
+        for vid in fetched.stats_requested:
+            item = fetched.stats_items.get(vid)
+            if item is None:
+                if vid not in failed_ids:
+                    removed_ids.add(vid)
+            else:
+                _apply_stats_refresh(known_by_id[vid], item)
+
+        if findData.Incremental:
+            fetched_ids = {v.video_id for v in videos}
+            videos.extend(
+                v for vid, v in known_by_id.items()
+                if vid not in fetched_ids and vid not in removed_ids
+            )
+            logger.info("差分同期: 新着/配信 %d 本、統計更新 %d 本、除外 %d 本",
+                        len(fetched_ids), len(refresh_ids), len(removed_ids))
+
+        findData.Checkpoint = {
+            "mode": "incremental" if findData.Incremental else "full",
+            "synced_at": now,
+            "playlist_heads": fetched.playlist_heads,
+            "detail_fetched_count": len(video_ids),
+            "stats_refreshed_count": len(refresh_ids),
+            "tier_refreshed_at": {**findData.TierRefreshedAt, **{name: now for name in due_tiers}},
+            # True の場合は取得が欠けているので、保存時に不要データの削除をしない
+            "partial": bool(fetched.failed_playlists or fetched.failed_video_ids),
+        }
+        if fetched.failed_playlists:
+            logger.warning("一部のプレイリストを取得できませんでした（%s）。今回は削除を行いません",
+                           ", ".join(fetched.failed_playlists))
+        if fetched.failed_video_ids:
+            logger.warning("動画 %d 本の詳細・統計を取得できませんでした。今回は削除を行いません",
+                           len(fetched.failed_video_ids))
 
         videos = [v for v in videos if v.published_at]
         videos.sort(key=lambda v: v.published_at, reverse=True)
@@ -317,53 +459,19 @@ def get_youtube_data(findData: YoutubeDataFind) -> tuple[YoutubeUser,List[Youtub
         if not videos:
             return youtubeuser,[]
 
-        # 4. 祝日判定（変更なし）
-        for v in videos:
-            if v.published_at:
-                v.is_holiday = v.published_at.date() in HOLIDAYS_CACHE
-
-        # 5. 日付グループ & 追加計算（元のロジックそのまま）
-        daily_groups: defaultdict[date, List[YoutubeVideoDetail]] = defaultdict(list)
-        for v in videos:
-            day = v.published_at.date()
-            daily_groups[day].append(v)
-
-        sorted_days = sorted(daily_groups.keys(), reverse=True)
-
-        consecutive_counts: dict[date, int] = {}
-        prev_day: Optional[date] = None
-        streak = 0
-        for day in sorted_days:
-            if prev_day and (prev_day - day) == timedelta(days=1):
-                streak += 1
-            else:
-                streak = 1
-            consecutive_counts[day] = streak
-            prev_day = day
-
-        for day, group in daily_groups.items():
-            group.sort(key=lambda v: v.published_at)
-            for idx, v in enumerate(group, 1):
-                v.same_day_broadcast_count = idx
-                v.weekday = Weekday(v.published_at.weekday())
-                v.consecutive_broadcast_days = consecutive_counts[day]
-                yesterday = day - timedelta(days=1)
-                v.was_broadcast_yesterday = yesterday in daily_groups
-
-                cur_idx = sorted_days.index(day)
-                if cur_idx + 1 < len(sorted_days):
-                    prev = sorted_days[cur_idx + 1]
-                    v.days_since_last_broadcast = (day - prev).days - 1
-                else:
-                    v.days_since_last_broadcast = 0
-
-        print(f"取得完了: {len(videos)} 本（全プレイリスト対象 / 祝日キャッシュ使用）")
-        print("次はプレイリストを取得します...")
+        # 4. 祝日判定 & 5. 日付グループ単位の傾向分析（analytics.compute_broadcast_patterns）
+        from analytics import compute_broadcast_patterns
+        with run_metrics.phase("analysis"):
+            compute_broadcast_patterns(videos, HOLIDAYS_CACHE)
+
+        logger.info("取得完了: %d 本（全プレイリスト対象 / 祝日キャッシュ使用）", len(videos))
+        logger.info("次はプレイリストを取得します...")
         
+        listing_start = time.perf_counter()
         request = youtube.playlists().list(
-        part="snippet,contentDetails,status",  # statusで公開/非公開もわかる
         channelId=findData.ChannelId,
-        maxResults=50
+        maxResults=50,
+        **REQUEST_SHAPES["playlists"]  # statusで公開/非公開もわかる
         )
         youtubePlayList : List[YoutubePlayData] = []
 
@@ -376,134 +484,110 @@ def get_youtube_data(findData: YoutubeDataFind) -> tuple[YoutubeUser,List[Youtub
                     continue
                 if item["status"]["privacyStatus"] != "public":
                     continue
-                published_at = None
-                if pub_str := item["snippet"].get("publishedAt"):
-                    # Z を +00:00 に統一
-                    pub_str = pub_str.replace("Z", "+00:00")
-
-                    # 重複したオフセットを削除（+00:00+00:00 → +00:00）
-                    while pub_str.endswith('+00:00+00:00'):
-                        pub_str = pub_str[:-6]  # 末尾6文字削除
-
-                    # 小数点以下があれば削除（前回のケース対応）
-                    if '.' in pub_str:
-                        parts = pub_str.split('.')
-                        pub_str = parts[0] + pub_str[-6:]  # オフセット部分だけ残す
-
-                    try:
-                        published_at = datetime.fromisoformat(pub_str).astimezone(jst)
-                    except ValueError as e:
-                        print(f"publishedAt パース失敗（スキップまたはデフォルト）: {pub_str} → {e}")
-                        # 最終フォールバック：オフセットなしで試す
-                        try:
-                            clean_str = pub_str.replace("+00:00", "")
-                            published_at = datetime.fromisoformat(clean_str).replace(tzinfo=jst)
-                        except:
-                            published_at = None  # どうしようもない場合はNone
-                
-                youtubePlayList.append(YoutubePlayData(
-                    title=item["snippet"]["title"],
-                    playlist_id=item["id"],
-                    video_count=item["contentDetails"]["itemCount"],
-                    published_at=published_at if item["snippet"].get("publishedAt") else None,
-                    thumbnails=item["snippet"]["thumbnails"]["high"]["url"] if item["snippet"].get("thumbnails") and item["snippet"]["thumbnails"].get("high") else ""
-                ))
-                print(f"取得プレイリスト: {item['snippet']['title']} (動画数: {item['contentDetails']['itemCount']})")
+                youtubePlayList.append(_build_playlist(item, jst))
+                logger.debug("取得プレイリスト: %s (動画数: %s)", item["snippet"]["title"], item["contentDetails"]["itemCount"])
             request = youtube.playlists().list_next(request, response)
+        run_metrics.record_phase("playlist_listing", time.perf_counter() - listing_start)
+        logger.info("取得プレイリスト: %d 件", len(youtubePlayList))
         
 
         
+        if findData.AsTable:
+            from video_table import VideoTable
+            videos = VideoTable.from_details(videos)
+
         return youtubeuser,videos,youtubePlayList
 
     except HttpError as e:
-        print(f"YouTube APIエラー: {e}")
+        logger.error("YouTube APIエラー: %s", e)
         return None,[]
+    except QuotaExceededError:
+        # 呼び出し側（run_channels）が以降のチャンネルを止めて原因を表示できるようにそのまま投げる
+        raise
     except Exception as e:
-        print(f"エラー: {e}")
+        logger.error("エラー: %s", e)
         return None,[],[]
     
-def match_videos_to_playlists(
-    videos: List[YoutubeVideoDetail],
+def scan_playlist_members(
     playlists: List[YoutubePlayData],
-    api_key: str,                     # ← APIキーだけ渡す
+    api_key: str,
     max_results_per_playlist: int = 0,  # 0 = 無制限
-    verbose: bool = True
-) -> List[YoutubeVideoDetail]:
+    verbose: bool = True,
+    workers: int = 4,
+    cache: Optional[ResponseCache] = None,
+    budget: Optional[QuotaBudget] = None
+) -> int:
     """
-    カスタム再生リストと動画をマッチング。
-    関数内でYouTube APIを再度buildして接続する。
+    内容が変わった再生リストだけを並列に走査し、走査結果（members / member_video_ids）を
+    各 YoutubePlayData に書き戻す（member_scan_updated=True のものを保存すればよい）。
+    動画は読まない。走査し直した再生リストの数を返す。
     """
     if not api_key:
         raise ValueError("APIキーがありません")
 
     if not playlists:
         if verbose:
-            print("カスタム再生リストが空 → スキップ")
-        return videos
-
-    if not videos:
-        if verbose:
-            print("動画リストが空 → スキップ")
-        return videos
-
-    # ここで関数内で新しくクライアントを作成
-    youtube = build('youtube', 'v3', developerKey=api_key)
-    print("マッチング用にYouTube APIクライアントを新規作成しました")
-
-    video_to_titles = defaultdict(list)  # videoId → [タイトル, ...]
+            logger.info("カスタム再生リストが空 → スキップ")
+        return 0
 
-    total_pl = len(playlists)
-    for idx, pl in enumerate(playlists, 1):
-        pl_id = pl.playlist_id
-        pl_title = pl.title
-        if verbose:
-            print(f"  [{idx}/{total_pl}] {pl_title} ({pl.video_count}本) 走査中...")
+    # 前回の走査から video_count / etag が変わっていない再生リストは保存済みの所属IDを再利用し、
+    # 残りだけをワーカープールで並列に走査する（クライアントはスレッドごとに作成）
+    client_pool = get_client_pool(api_key, cache, budget)
+    jst = ZoneInfo("Asia/Tokyo")
 
-        fetched = 0
+    def scan_playlist(pl: YoutubePlayData) -> Optional[List[PlaylistMember]]:
+        youtube = client_pool.get()
+        members: List[PlaylistMember] = []
         page_token = None
-
         while True:
             try:
                 req = youtube.playlistItems().list(
-                    part="contentDetails",
-                    playlistId=pl_id,
+                    playlistId=pl.playlist_id,
                     maxResults=50,
-                    pageToken=page_token
+                    pageToken=page_token,
+                    **REQUEST_SHAPES["playlist_members"]
                 )
-                resp = req.execute()
+                with run_metrics.phase("playlist_member_paging"):
+                    resp = req.execute()
 
                 for item in resp.get("items", []):
-                    if max_results_per_playlist > 0 and fetched >= max_results_per_playlist:
+                    if max_results_per_playlist > 0 and len(members) >= max_results_per_playlist:
                         break
-                    vid = item["contentDetails"]["videoId"]
-                    if pl_title not in video_to_titles[vid]:
-                        video_to_titles[vid].append(pl_title)
-                    fetched += 1
+                    members.append(_build_playlist_member(item, len(members), jst))
 
                 page_token = resp.get("nextPageToken")
                 if not page_token:
-                    break
+                    return members
 
             except HttpError as e:
-                print(f"    {pl_title} でエラー: {e}")
-                break
+                logger.warning("    %s でエラー: %s", pl.title, e)
+                return None
             except Exception as e:
-                print(f"    {pl_title} で予期せぬエラー: {e}")
-                break
-
-    # マッチング反映
-    matched = 0
-    for v in videos:
-        titles = video_to_titles.get(v.video_id, [])
-        if titles:
-            v.playlist_titles = sorted(set(titles))  # 重複除去 & ソート
-            matched += 1
+                logger.warning("    %s で予期せぬエラー: %s", pl.title, e)
+                return None
 
+    to_scan = [pl for pl in playlists if not pl.is_member_scan_fresh()]
     if verbose:
-        print(f"\nマッチング完了: {matched} / {len(videos)} 本 がカスタム再生リストに所属")
-        if matched > 0:
-            example = next((v for v in videos if v.playlist_titles), None)
-            if example:
-                print(f"例: {example.title} → {', '.join(example.playlist_titles)}")
-
-    return videos
\ No newline at end of file
+        logger.info("再生リスト %d 件中 %d 件を走査します（残りは前回の結果を再利用）", len(playlists), len(to_scan))
+
+    matching_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = [(pl, executor.submit(scan_playlist, pl)) for pl in to_scan]
+        total_pl = len(futures)
+        progress = ProgressCounter(logger, "再生リスト走査", total=total_pl, every=20,
+                                   level=logging.INFO if verbose else logging.DEBUG)
+        for idx, (pl, future) in enumerate(futures, 1):
+            members = future.result()
+            progress.advance()
+            if members is None:
+                # 失敗した再生リストは前回の結果を使い、次回もう一度走査する
+                continue
+            pl.members = members
+            pl.member_video_ids = [m.video_id for m in members]
+            pl.scanned_etag = pl.etag
+            pl.scanned_video_count = pl.video_count
+            pl.member_scan_updated = True
+            logger.debug("  [%d/%d] %s (%s本) 走査完了: %d 本", idx, total_pl, pl.title, pl.video_count, len(members))
+        progress.done()
+    run_metrics.record_phase("playlist_matching", time.perf_counter() - matching_start)
+    return sum(1 for pl in to_scan if pl.member_scan_updated)